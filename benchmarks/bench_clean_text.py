@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Check clean_texts/clean_series against clean_text and time all three.
+
+Run from the repository root:  python benchmarks/bench_clean_text.py
+
+The corpus is the CrisisMMD processed-data splits plus the raw Bluesky dumps in
+tweet_analysis_app/public/json, which still carry emoji, URLs and mentions.
+"""
+import glob
+import json
+import os
+import time
+
+import pandas as pd
+
+from corpus import REPO_DIR, load_crisismmd_texts
+from text_cleaning import clean_series, clean_text, clean_texts
+
+
+def load_raw_bluesky_texts():
+    texts = []
+    for path in sorted(glob.glob(os.path.join(REPO_DIR, "tweet_analysis_app", "public", "json", "*.json"))):
+        with open(path, encoding="utf-8") as json_file:
+            texts.extend(post["tweet_text"] for post in json.load(json_file))
+    return texts
+
+
+# pandas may hold a missing value as NaN rather than None
+def as_list(series):
+    return [None if pd.isna(value) else value for value in series]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    texts = load_crisismmd_texts() + load_raw_bluesky_texts()
+    series = pd.Series(texts)
+    print(f"{len(texts)} texts\n")
+
+    expected, baseline = timed(lambda: as_list(series.apply(clean_text)))
+    batch, batch_time = timed(lambda: clean_texts(texts))
+    vectorized, vectorized_time = timed(lambda: as_list(clean_series(series)))
+
+    assert batch == expected, "clean_texts output differs from clean_text"
+    assert vectorized == expected, "clean_series output differs from clean_text"
+
+    print(f"{'method':<28} {'seconds':>8} {'speedup':>8}")
+    print(f"{'Series.apply(clean_text)':<28} {baseline:>8.3f} {1:>7.1f}x")
+    print(f"{'clean_texts':<28} {batch_time:>8.3f} {baseline / batch_time:>7.1f}x")
+    print(f"{'clean_series':<28} {vectorized_time:>8.3f} {baseline / vectorized_time:>7.1f}x")
+    print("\nOutputs identical to clean_text.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Geocoder requests for a day of enrichment with the geocode cache alone vs the offline gazetteer in front of it.
+
+Run from the repository root:
+    python benchmarks/bench_gazetteer.py [--records 500] [--dump state/gazetteer/cities15000.txt]
+
+Geocodes bench_geocode_cache's Zipf-distributed day of LLM-extracted locations
+twice: through the geocode cache and a mock Nominatim, then with the gazetteer
+resolving first. Also reports the index's build time, memory and microseconds
+per lookup. Without --dump it indexes a generated GeoNames-format file of
+--places cities (the size of cities15000.txt by default) that contains the
+benchmark's places among random ones.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from corpus import GEN_AI_DIR  # noqa: F401  (puts gen_ai_research on sys.path)
+from bench_geocode_cache import PLACES, make_day
+from mock_geocoder import MockGeocoder
+
+# (latitude, longitude, population) of bench_geocode_cache's places
+CITIES = {
+    "Los Angeles": (34.05223, -118.24368, 3898747), "Houston": (29.76328, -95.36327, 2304580),
+    "Miami": (25.77427, -80.19366, 442241), "New Orleans": (29.95465, -90.07507, 383997),
+    "Tampa": (27.94752, -82.45843, 384959), "Sacramento": (38.58157, -121.4944, 524943),
+    "San Juan": (18.46633, -66.10572, 342259), "Asheville": (35.60095, -82.55402, 94589),
+    "Phoenix": (33.44838, -112.07404, 1608139), "Oklahoma City": (35.46756, -97.51643, 681054),
+    "Joplin": (37.08423, -94.51328, 51762), "Charleston": (32.77657, -79.93092, 150227),
+    "Naples": (26.14234, -81.79596, 19115), "Paradise": (39.75961, -121.62192, 26218),
+    "Lahaina": (20.87429, -156.67663, 12702), "Des Moines": (41.60054, -93.60911, 214133),
+    "Memphis": (35.14953, -90.04898, 633104), "Savannah": (32.08354, -81.09983, 147780),
+    "Boulder": (40.01499, -105.27055, 108250), "Anchorage": (61.21806, -149.90028, 291247),
+}
+# (code, name, latitude, longitude) of the admin regions the generated cities are spread over
+REGIONS = [
+    ("US.CA", "California", 36.8, -119.4), ("US.TX", "Texas", 31.0, -99.0), ("US.FL", "Florida", 28.0, -81.7),
+    ("US.LA", "Louisiana", 31.0, -92.0), ("US.PR", "Puerto Rico", 18.2, -66.5), ("US.NC", "North Carolina", 35.5, -79.4),
+    ("US.AZ", "Arizona", 34.3, -111.7), ("US.OK", "Oklahoma", 35.6, -97.5), ("US.MO", "Missouri", 38.5, -92.5),
+    ("US.SC", "South Carolina", 33.9, -80.9), ("US.HI", "Hawaii", 20.8, -156.3), ("US.IA", "Iowa", 42.0, -93.5),
+    ("US.TN", "Tennessee", 35.9, -86.4), ("US.GA", "Georgia", 32.7, -83.4), ("US.CO", "Colorado", 39.0, -105.5),
+    ("US.AK", "Alaska", 64.0, -150.0), ("US.KY", "Kentucky", 37.5, -85.3), ("US.WV", "West Virginia", 38.6, -80.6),
+    ("JP.40", "Tokyo", 35.7, 139.7), ("TR.34", "Istanbul", 41.0, 28.9), ("MA.07", "Marrakesh-Safi", 31.6, -8.0),
+    ("IN.13", "Kerala", 10.4, 76.3), ("IN.16", "Maharashtra", 19.4, 75.6), ("LK.36", "Western", 6.9, 80.0),
+    ("GB.ENG", "England", 52.5, -1.5), ("CA.08", "Ontario", 44.5, -79.5), ("FR.11", "Ile-de-France", 48.7, 2.5),
+]
+COUNTRIES = {"US": "United States", "JP": "Japan", "TR": "Turkey", "MA": "Morocco", "IN": "India",
+             "LK": "Sri Lanka", "GB": "United Kingdom", "CA": "Canada", "FR": "France"}
+SYLLABLES = ["ka", "lo", "min", "ter", "san", "vil", "bor", "ash", "wood", "dale", "ri", "ton", "ford",
+             "ham", "ber", "mont", "el", "pra", "ven", "cas", "port", "lin", "gro", "sto"]
+
+
+def geonames_row(geoname_id, name, latitude, longitude, country, admin1, population, alternates=(),
+                 feature_class="P", feature_code="PPL"):
+    return "\t".join([
+        str(geoname_id), name, name, ",".join(alternates), f"{latitude:.5f}", f"{longitude:.5f}",
+        feature_class, feature_code, country, "", admin1, "", "", "", str(population), "", "0", "", "2024-01-01",
+    ])
+
+
+def write_dump(directory, places, seed=0):
+    # cities15000.txt, admin1CodesASCII.txt and countryInfo.txt in GeoNames' formats
+    rng = random.Random(seed)
+    codes = {state: code for code, state, _, _ in REGIONS}
+    rows = []
+    for city, _, state in PLACES:
+        latitude, longitude, population = CITIES[city]
+        rows.append((city, latitude, longitude, codes[state], population, [f"City of {city}"]))
+    for code, name, latitude, longitude in REGIONS:
+        for _ in range(places // len(REGIONS)):
+            city = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+            alternates = ["".join(rng.choice(SYLLABLES) for _ in range(3)).title() for _ in range(rng.randint(0, 5))]
+            rows.append((city, latitude + rng.uniform(-2, 2), longitude + rng.uniform(-2, 2), code,
+                         int(rng.lognormvariate(10.5, 1.0)), alternates))
+    with open(os.path.join(directory, "cities15000.txt"), "w", encoding="utf-8") as dump:
+        for geoname_id, (city, latitude, longitude, code, population, alternates) in enumerate(rows, start=1):
+            country, admin1 = code.split(".")
+            dump.write(geonames_row(geoname_id, city, latitude, longitude, country, admin1, population, alternates) + "\n")
+    with open(os.path.join(directory, "admin1CodesASCII.txt"), "w", encoding="utf-8") as admin1_file:
+        for code, name, _, _ in REGIONS:
+            admin1_file.write(f"{code}\t{name}\t{name}\t0\n")
+    with open(os.path.join(directory, "countryInfo.txt"), "w", encoding="utf-8") as country_file:
+        country_file.write("#ISO\tISO3\tISO-Numeric\tfips\tCountry\tCapital\tArea(in sq km)\tPopulation\n")
+        for iso, name in COUNTRIES.items():
+            country_file.write(f"{iso}\t\t\t\t{name}\t\t\t0\n")
+    return os.path.join(directory, "cities15000.txt")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=500, help="records to geocode")
+    parser.add_argument("--dump", help="GeoNames dump to index instead of a generated one")
+    parser.add_argument("--places", type=int, default=26000, help="cities in the generated dump")
+    args = parser.parse_args()
+
+    os.environ["GEOCODE_CACHE_FILE"] = ""
+    os.environ["GAZETTEER_FILE"] = ""
+    os.environ["LLM_CACHE_FILE"] = ""
+    os.environ["JOB_LEDGER_FILE"] = ""
+    import multiprocessing_genai as genai
+    from gazetteer import Gazetteer
+    from geocache import GeocodeCache
+
+    day = make_day(random.Random(0), args.records)
+    genai.NOMINATIM_DELAY = 0.0
+    with tempfile.TemporaryDirectory() as state_dir:
+        path = args.dump or write_dump(state_dir, args.places)
+        start = time.perf_counter()
+        gazetteer = Gazetteer(path)
+        build_seconds = time.perf_counter() - start
+        tracemalloc.start()  # a second build, so tracing does not slow the timed one
+        index = Gazetteer(path)
+        index_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del index
+        stats = gazetteer.stats()
+        print(f"Indexed {stats['names']} names of {stats['places']} places in {build_seconds:.2f}s, "
+              f"{index_bytes / 2 ** 20:.1f} MiB")
+
+        start = time.perf_counter()
+        for location in day:
+            gazetteer.resolve(location)
+        per_lookup = (time.perf_counter() - start) / len(day)
+        print(f"{gazetteer.stats()['hit_rate']:.1%} of {len(day)} records resolved offline, "
+              f"{per_lookup * 1e6:.0f} us per lookup")
+
+        print(f"\n{'run':>10} {'requests':>9} {'seconds':>8}")
+        for name in ("cache", "gazetteer"):
+            genai.gazetteer = gazetteer if name == "gazetteer" else None
+            genai.geocode_cache = GeocodeCache(os.path.join(state_dir, f"geocode-{name}.sqlite"))
+            with MockGeocoder(miss_rate=0.1) as geocoder:
+                genai.NOMINATIM_URL = geocoder.url
+                start = time.perf_counter()
+                for location in day:
+                    genai.geocode(location)
+                elapsed = time.perf_counter() - start
+                print(f"{name:>10} {geocoder.requests:>9} {elapsed:>8.2f}")
+            genai.geocode_cache.close()
+
+
+if __name__ == "__main__":
+    main()
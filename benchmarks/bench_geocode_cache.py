@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Geocoder requests and politeness sleep for two days of enrichment, with and without the cache.
+
+Run from the repository root:  python benchmarks/bench_geocode_cache.py [--records 500] [--delay 1.0]
+
+Builds each day's LLM-extracted locations by drawing Zipf-distributed places
+(a few places dominate a disaster day) and writing each one the way the model
+varies it: case, state codes, trailing punctuation. Geocodes both days with
+multiprocessing_genai.geocode against a mock Nominatim. The sleep after each
+real request is not actually taken; it is added up from NOMINATIM_DELAY.
+"""
+import argparse
+import os
+import random
+import tempfile
+
+from corpus import GEN_AI_DIR  # noqa: F401  (puts gen_ai_research on sys.path)
+from mock_geocoder import MockGeocoder
+
+PLACES = [
+    ("Los Angeles", "CA", "California"), ("Houston", "TX", "Texas"), ("Miami", "FL", "Florida"),
+    ("New Orleans", "LA", "Louisiana"), ("Tampa", "FL", "Florida"), ("Sacramento", "CA", "California"),
+    ("San Juan", "PR", "Puerto Rico"), ("Asheville", "NC", "North Carolina"), ("Phoenix", "AZ", "Arizona"),
+    ("Oklahoma City", "OK", "Oklahoma"), ("Joplin", "MO", "Missouri"), ("Charleston", "SC", "South Carolina"),
+    ("Naples", "FL", "Florida"), ("Paradise", "CA", "California"), ("Lahaina", "HI", "Hawaii"),
+    ("Des Moines", "IA", "Iowa"), ("Memphis", "TN", "Tennessee"), ("Savannah", "GA", "Georgia"),
+    ("Boulder", "CO", "Colorado"), ("Anchorage", "AK", "Alaska"),
+]
+REGIONS = ["California", "Texas", "Florida", "Puerto Rico", "Kentucky", "Japan", "Turkey", "Morocco",
+           "Kerala, India", "Sri Lanka", "Not Specified"]
+
+
+def spellings(rng, place):
+    city, code, state = place
+    return rng.choice([
+        f"{city}, {state}", f"{city}, {code}", f"{city.lower()}, {code.lower()}", f"{city.upper()}, {code}.",
+        f"{city},  {state}", f"{city}, {state}, USA", city,
+    ])
+
+
+def make_day(rng, records):
+    weights = [1 / (rank + 1) for rank in range(len(PLACES) + len(REGIONS))]
+    day = []
+    for _ in range(records):
+        index = rng.choices(range(len(weights)), weights)[0]
+        day.append(spellings(rng, PLACES[index]) if index < len(PLACES) else REGIONS[index - len(PLACES)])
+    return day
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=500, help="records to geocode per day")
+    parser.add_argument("--delay", type=float, default=1.0, help="NOMINATIM_DELAY after each real request")
+    args = parser.parse_args()
+
+    os.environ["GEOCODE_CACHE_FILE"] = ""
+    os.environ["GAZETTEER_FILE"] = ""
+    os.environ["LLM_CACHE_FILE"] = ""
+    os.environ["JOB_LEDGER_FILE"] = ""
+    import multiprocessing_genai as genai
+    from geocache import GeocodeCache, normalize_location
+
+    rng = random.Random(0)
+    days = [make_day(rng, args.records), make_day(rng, args.records)]
+    print(f"{args.records} records a day, {len(set(days[0]))} distinct strings on day 1, "
+          f"{len({normalize_location(name) for name in days[0]})} distinct after normalising")
+    print(f"\n{'run':>8} {'day':>4} {'requests':>9} {'sleep s':>8} {'hit rate':>9}")
+
+    genai.NOMINATIM_DELAY = 0.0
+    with tempfile.TemporaryDirectory() as state_dir:
+        for name in ("uncached", "cached"):
+            genai.geocode_cache = GeocodeCache(os.path.join(state_dir, "geocode.sqlite")) if name == "cached" else None
+            for number, day in enumerate(days, start=1):
+                with MockGeocoder(miss_rate=0.1) as geocoder:
+                    genai.NOMINATIM_URL = geocoder.url
+                    before = genai.geocode_cache.stats() if genai.geocode_cache else None
+                    for location in day:
+                        genai.geocode(location)
+                    hit_rate = "-"
+                    if before is not None:
+                        stats = genai.geocode_cache.stats()
+                        hits = stats["hits"] + stats["negative_hits"] - before["hits"] - before["negative_hits"]
+                        lookups = hits + stats["misses"] - before["misses"]
+                        hit_rate = f"{hits / lookups:.1%}"
+                    print(f"{name:>8} {number:>4} {geocoder.requests:>9} {geocoder.requests * args.delay:>8.0f} {hit_rate:>9}")
+            if genai.geocode_cache is not None:
+                genai.geocode_cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Guard the cold-start cost of `import data` with `python -X importtime`.
+
+Run from the repository root:  python benchmarks/bench_import_time.py [budget_ms]
+
+Exits non-zero if importing data.py pulls in a heavy dependency eagerly, needs
+Supabase credentials, or takes longer than the budget (median of 5 runs).
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+from corpus import REPO_DIR
+
+MODULE = "data"
+# Built on first use, never at import time
+LAZY_MODULES = ("pandas", "requests", "supabase", "vaderSentiment", "emoji", "dotenv", "numpy")
+DEFAULT_BUDGET_MS = 100.0
+
+
+def import_profile():
+    # Import with no credentials and return {module: cumulative_us} for MODULE and what it imported
+    env = {k: v for k, v in os.environ.items() if k not in ("SUPABASE_URL", "SUPABASE_KEY")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {MODULE}"],
+        cwd=REPO_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {MODULE} failed:\n{result.stderr[-2000:]}")
+    # Children are printed (indented) before their parent, so the lines between the
+    # previous top-level entry and MODULE's own line are MODULE's import subtree
+    subtree = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, raw_name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        name = raw_name.strip()
+        subtree[name] = int(cumulative)
+        if raw_name.startswith("  ", 1):
+            continue  # nested import
+        if name == MODULE:
+            return subtree
+        subtree = {}
+    sys.exit(f"{MODULE} not found in -X importtime output")
+
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_MS
+    runs = [import_profile() for _ in range(5)]
+    timings = [run[MODULE] / 1000 for run in runs]
+    median_ms = statistics.median(timings)
+
+    eager = sorted({name for name in runs[-1] if name.split(".")[0] in LAZY_MODULES})
+    heaviest = sorted(runs[-1].items(), key=lambda item: item[1], reverse=True)[:8]
+
+    print(f"import {MODULE}: median {median_ms:.1f} ms over {len(timings)} runs (budget {budget_ms:.0f} ms)")
+    print("heaviest imports (cumulative):")
+    for name, micros in heaviest:
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if eager:
+        print(f"FAIL: imported eagerly: {', '.join(eager[:10])}")
+        failed = True
+    if median_ms > budget_ms:
+        print(f"FAIL: import time {median_ms:.1f} ms exceeds budget {budget_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
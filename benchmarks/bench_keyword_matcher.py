@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Compare KeywordMatcher with the per-keyword substring scans it replaced.
+
+Run from the repository root:  python benchmarks/bench_keyword_matcher.py
+
+The processed CrisisMMD text has the "#" stripped from hashtags, so compound
+tags like "hurricaneharvey" only match as substrings there; most of the
+reported differences come from that and from infix hits such as "fire" in
+"wildfires".
+"""
+import time
+
+from corpus import load_crisismmd_texts, load_keywords
+from keyword_matcher import KeywordMatcher
+
+
+def substring_match(text, disaster_keywords, crisis_keywords):
+    return (
+        [word for word in disaster_keywords if word in text],
+        [word for word in crisis_keywords if word in text],
+    )
+
+
+# Grow a keyword list to `factor` times its size with distinct, realistic-length entries
+def scale_keywords(keywords, factor):
+    scaled = list(keywords)
+    for i in range(1, factor):
+        scaled.extend(f"{word}{i}" for word in keywords)
+    return scaled
+
+
+def time_per_post(fn, texts):
+    start = time.perf_counter()
+    for text in texts:
+        fn(text)
+    return (time.perf_counter() - start) / len(texts) * 1e6
+
+
+def main():
+    texts = [text.lower() for text in load_crisismmd_texts()]
+    disaster_keywords = load_keywords("disaster_words.txt")
+    crisis_keywords = load_keywords("crisis_words.txt")
+    print(f"{len(texts)} CrisisMMD posts, {len(disaster_keywords) + len(crisis_keywords)} base keywords\n")
+
+    print(f"{'scale':>6} {'keywords':>9} {'substring us/post':>18} {'matcher us/post':>16} {'speedup':>8}")
+    for factor in (1, 10, 100):
+        disaster = scale_keywords(disaster_keywords, factor)
+        crisis = scale_keywords(crisis_keywords, factor)
+        matcher = KeywordMatcher({"disaster": disaster, "crisis": crisis})
+
+        old = time_per_post(lambda text: substring_match(text, disaster, crisis), texts)
+        new = time_per_post(matcher.match, texts)
+        print(f"{factor:>5}x {len(disaster) + len(crisis):>9} {old:>18.1f} {new:>16.1f} {old / new:>7.1f}x")
+
+    # How often whole-word matching changes the result (e.g. "fire" inside "firefox")
+    matcher = KeywordMatcher({"disaster": disaster_keywords, "crisis": crisis_keywords})
+    differing = 0
+    for text in texts:
+        matches = matcher.match(text)
+        if (matches["disaster"], matches["crisis"]) != substring_match(text, disaster_keywords, crisis_keywords):
+            differing += 1
+    print(f"\nPosts whose matches differ from substring matching: {differing} ({differing / len(texts):.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Latency of cached vs uncached generate_json calls, and the hit rate on CrisisMMD.
+
+Run from the repository root:  python benchmarks/bench_llm_cache.py [--latency 0.05] [--limit 1000]
+
+Sends a genuine-disaster prompt for each CrisisMMD test tweet through
+OllamaClient with an LLMCache in front of a mock Ollama server. The first pass
+misses and pays the generation; a second pass (a re-run after a crash, or a
+re-run of the day) is answered from the cache. Also checks that LRU eviction
+keeps the cache at its size bound.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from pydantic import BaseModel
+
+from corpus import load_crisismmd_texts
+from llm import Model, OllamaClient
+from llm_cache import LLMCache
+from mock_ollama import MockOllama
+
+
+class ClassifyDisaster(BaseModel):
+    genuine_disaster: bool
+
+
+def timed_pass(client, prompts):
+    latencies = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        client.generate_json(prompt=prompt, schema=ClassifyDisaster)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def describe(name, latencies, cache, before):
+    hits, misses = cache.hits - before[0], cache.misses - before[1]
+    print(f"{name:>12} {len(latencies):>6} {hits:>6} {misses:>6} {sum(latencies):>9.2f} "
+          f"{statistics.median(latencies) * 1e6:>12,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per generation on the mock server")
+    parser.add_argument("--limit", type=int, default=1000, help="CrisisMMD test tweets to send")
+    args = parser.parse_args()
+
+    prompts = [f"Determine whether the following tweet genuinely reports a natural disaster.\nTweet: {text}"
+               for text in load_crisismmd_texts("*informative*test*")[:args.limit]]
+
+    with MockOllama(latency=args.latency, parallel=1) as server, tempfile.TemporaryDirectory() as directory:
+        cache = LLMCache(os.path.join(directory, "llm_cache.sqlite"))
+        client = OllamaClient(Model.LLAMA_3_2, url=server.url, cache=cache)
+        print(f"{len(prompts)} prompts, {args.latency}s per generation\n")
+        print(f"{'pass':>12} {'calls':>6} {'hits':>6} {'misses':>6} {'seconds':>9} {'median us':>12}")
+
+        before = (cache.hits, cache.misses)
+        describe("cold", timed_pass(client, prompts), cache, before)
+        before = (cache.hits, cache.misses)
+        describe("re-run", timed_pass(client, prompts), cache, before)
+        print(f"\nServer requests: {server.requests}; {cache.stats()}")
+
+        # LRU bound: a cache smaller than the working set stays at its limit
+        small = LLMCache(os.path.join(directory, "small.sqlite"), max_entries=100)
+        timed_pass(OllamaClient(Model.LLAMA_3_2, url=server.url, cache=small), prompts[:300])
+        print(f"Cache bounded at 100 entries after 300 prompts: {small.stats()['entries']} entries")
+
+
+if __name__ == "__main__":
+    main()
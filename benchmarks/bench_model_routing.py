@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Classification throughput with every prompt on one large model vs routed by task.
+
+Run from the repository root:  python benchmarks/bench_model_routing.py [--tweets 200] [--slowdown 3]
+
+Classifies CrisisMMD tweets (sequential mode, fast severity) through
+classify_all against a mock Ollama that serves llama3.2 at the base latency and
+mistral-nemo `--slowdown` times slower. Compared:
+  large     every prompt on mistral-nemo
+  routed    the default OLLAMA_ROUTES: gate and type/location on llama3.2, severity on mistral-nemo
+  fallback  the default routes against a server without mistral-nemo, so severity falls back to llama3.2
+Prints tweets/s and the client's per-model calls, failures, fallbacks, latency and tokens.
+"""
+import argparse
+import contextlib
+import io
+import os
+import time
+
+from corpus import GEN_AI_DIR  # noqa: F401  (puts gen_ai_research on sys.path)
+from mock_ollama import MockOllama
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tweets", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per llama3.2 generation")
+    parser.add_argument("--slowdown", type=float, default=3.0, help="how much slower mistral-nemo is")
+    parser.add_argument("--parallel", type=int, default=4, help="generation slots on the mock server")
+    args = parser.parse_args()
+
+    os.environ["LLM_CACHE_FILE"] = ""
+    os.environ["JOB_LEDGER_FILE"] = ""
+    import multiprocessing_genai as genai
+    from llm import Model, OllamaClient, parse_routes
+    from prefilter import load_split
+    from scheduler import AIMDLimiter
+
+    genai.prefilter = None
+    genai.CLASSIFY_MODE, genai.SEVERITY_MODE = "sequential", "fast"
+    texts, _ = load_split("test")
+    tweets = [genai.Tweet(str(i), "2025-01-01T00:00:00", text) for i, text in enumerate(texts[:args.tweets])]
+    large = "genuine=mistral-nemo;disaster=mistral-nemo;severity=mistral-nemo"
+    runs = (
+        ("large", large, {"llama3.2": 1.0, "mistral-nemo": args.slowdown}),
+        ("routed", None, {"llama3.2": 1.0, "mistral-nemo": args.slowdown}),
+        ("fallback", None, {"llama3.2": 1.0}),
+    )
+    print(f"{len(tweets)} tweets; llama3.2 {args.latency}s per call, mistral-nemo {args.slowdown}x slower, "
+          f"{args.parallel} slots")
+
+    for name, spec, models in runs:
+        routes = parse_routes(spec) if spec else genai.MODEL_ROUTES
+        with MockOllama(latency=args.latency, parallel=args.parallel, models=models) as server:
+            genai.limiter = AIMDLimiter(maximum=64)
+            genai.client = OllamaClient(Model.LLAMA_3_2, url=server.url, pool_size=64, limiter=genai.limiter,
+                                        routes=routes, max_retries=0)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):  # classify_tweet prints every step
+                stats = genai.classify_all(tweets, workers=64, sink=lambda results: None)
+            elapsed = time.perf_counter() - start
+        print(f"\n{name}: {stats.completed} tweets in {elapsed:.1f}s = {stats.completed / elapsed:.1f} tweets/s "
+              f"({stats.failed} failed)")
+        print(f"{'model':>14} {'calls':>6} {'failures':>9} {'fallbacks':>10} {'mean s':>7} {'prompt tok':>11} {'compl tok':>10}")
+        for model, counts in genai.client.model_stats().items():
+            print(f"{model:>14} {counts['calls']:>6} {counts['failures']:>9} {counts['fallbacks']:>10} "
+                  f"{counts['mean_seconds']:>7.2f} {counts['prompt_tokens']:>11} {counts['completion_tokens']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Throughput and duplicate rate of the near-duplicate stage on CrisisMMD text.
+
+Run from the repository root:  python benchmarks/bench_near_dedup.py
+
+CrisisMMD repeats a tweet once per attached image and is full of retweets, so a
+large share of its rows are (near-)duplicates. Peak memory is measured with
+tracemalloc to show the effect of the bounded signature window.
+"""
+import random
+import time
+import tracemalloc
+
+from corpus import load_crisismmd_texts
+from near_dedup import NearDuplicateDetector
+from text_cleaning import clean_texts
+
+
+def run(texts, threshold, max_items):
+    # Timed run, then a second traced run for peak memory (tracing slows everything down)
+    detector = NearDuplicateDetector(threshold=threshold, max_items=max_items)
+    start = time.perf_counter()
+    results = [detector.check(i, text) for i, text in enumerate(texts)]
+    elapsed = time.perf_counter() - start
+
+    traced = NearDuplicateDetector(threshold=threshold, max_items=max_items)
+    tracemalloc.start()
+    for i, text in enumerate(texts):
+        traced.check(i, text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return detector, results, elapsed, peak
+
+
+def main():
+    texts = [text for text in clean_texts(load_crisismmd_texts()) if text]
+    print(f"{len(texts)} cleaned CrisisMMD posts\n")
+    print(f"{'threshold':>9} {'window':>8} {'bands x rows':>12} {'duplicates':>11} {'posts/s':>9} {'peak MiB':>9}")
+
+    for threshold, max_items in ((0.7, 100000), (0.8, 100000), (0.9, 100000), (0.8, 5000)):
+        detector, results, elapsed, peak = run(texts, threshold, max_items)
+        print(f"{threshold:>9} {max_items:>8} {f'{detector.bands} x {detector.rows}':>12} "
+              f"{detector.duplicates:>11} {len(texts) / elapsed:>9,.0f} {peak / 2**20:>9.1f}")
+
+    # A few sample pairs at the default threshold, for eyeballing
+    _, results, _, _ = run(texts, 0.8, 100000)
+    pairs = [(i, canonical) for i, canonical in enumerate(results) if canonical is not None and texts[i] != texts[canonical]]
+    print(f"\n{len(pairs)} duplicates are not exact copies; samples:")
+    for i, canonical in random.Random(0).sample(pairs, min(5, len(pairs))):
+        print(f"  {texts[i][:80]!r}\n    -> {texts[canonical][:80]!r}")
+
+
+if __name__ == "__main__":
+    main()
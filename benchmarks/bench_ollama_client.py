@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Classification-call throughput: forked processes with bare requests vs the pooled clients.
+
+Run from the repository root:  python benchmarks/bench_ollama_client.py [--calls 240] [--latency 0.25] [--parallel 32]
+
+The old path forked Pool(processes=5) and sent every call with a bare
+requests.post (a new TCP connection per call). The pooled OllamaClient shares
+one keep-alive session across threads, and AsyncOllamaClient sends them from
+one event loop over a pooled httpx.AsyncClient, without threads. Calls go to a mock Ollama server with `--parallel`
+generation slots, so the best possible rate is parallel / latency.
+"""
+import argparse
+import asyncio
+import os
+import time
+from multiprocessing import Pool
+
+import requests
+from pydantic import BaseModel
+
+from corpus import load_crisismmd_texts
+from llm import AsyncOllamaClient, Model, OllamaClient
+from mock_ollama import MockOllama
+
+
+class ClassifyDisaster(BaseModel):
+    genuine_disaster: bool
+
+
+def _bare_generate(args):
+    # What OllamaClient.generate_json did before: a new connection for every call
+    url, prompt = args
+    client = OllamaClient(Model.LLAMA_3_2, url=url)
+    payload = client._chat_payload(prompt, None, None, 0.1, 1.0, None)
+    payload["tools"] = client._convert_schema_to_toolset(ClassifyDisaster)
+    response = requests.post(url=f"{url}/v1/chat/completions", json=payload)
+    return response.ok
+
+
+def run_processes(url, prompts, processes=5):
+    with Pool(processes=processes) as pool:
+        return pool.map(_bare_generate, [(url, prompt) for prompt in prompts])
+
+
+def run_threads(url, prompts, in_flight):
+    from concurrent.futures import ThreadPoolExecutor
+
+    with OllamaClient(Model.LLAMA_3_2, url=url, pool_size=in_flight) as client, \
+            ThreadPoolExecutor(max_workers=in_flight) as executor:
+        return list(executor.map(lambda prompt: client.generate_json(prompt, ClassifyDisaster), prompts))
+
+
+def run_async(url, prompts, in_flight):
+    async def classify_all():
+        async with AsyncOllamaClient(Model.LLAMA_3_2, url=url, max_in_flight=in_flight) as client:
+            return await asyncio.gather(*(client.generate_json(prompt, ClassifyDisaster) for prompt in prompts))
+
+    return asyncio.run(classify_all())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=240)
+    parser.add_argument("--latency", type=float, default=0.25, help="seconds per generation on the mock server")
+    parser.add_argument("--parallel", type=int, default=32, help="generation slots on the mock server")
+    args = parser.parse_args()
+
+    prompts = [f"Is this tweet about a disaster? {text}" for text in load_crisismmd_texts("*test*")[:args.calls]]
+    ceiling = args.parallel / args.latency
+    print(f"{len(prompts)} calls, {args.latency}s per generation, {args.parallel} server slots "
+          f"(ceiling {ceiling:.0f} calls/s), {os.cpu_count()} CPU\n")
+    print(f"{'client':>28} {'seconds':>8} {'calls/s':>8} {'connections':>12}")
+
+    runs = [("Pool(5) + bare requests.post", lambda url: run_processes(url, prompts))]
+    for in_flight in (5, 16, 32):
+        runs.append((f"OllamaClient, {in_flight} threads", lambda url, n=in_flight: run_threads(url, prompts, n)))
+        runs.append((f"AsyncOllamaClient, {in_flight}", lambda url, n=in_flight: run_async(url, prompts, n)))
+
+    for name, run in runs:
+        with MockOllama(latency=args.latency, parallel=args.parallel) as server:
+            start = time.perf_counter()
+            results = run(server.url)
+            elapsed = time.perf_counter() - start
+            assert len(results) == len(prompts)
+            print(f"{name:>28} {elapsed:>8.2f} {len(prompts) / elapsed:>8.1f} {server.connections:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Peak memory and write time of the partitioned NDJSON output vs the old CSV + JSON dump.
+
+Run from the repository root:  python benchmarks/bench_output_store.py
+
+Synthetic days of posts (replayed public/json records spread over 24 hours) are
+written both ways. The old path builds a DataFrame and an indented JSON dump of
+the whole day, so its peak grows with the day; the partitioned writer takes
+records from a generator and its peak should stay flat. Then data.save_data
+itself (clean, dedup, write, and a sink per batch) is measured on the day as a
+list, the way run_batch calls it; the list is built before tracing starts, so
+the peak is what save_data adds. Also times reading one hour back versus
+loading the whole day's JSON.
+"""
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from corpus import REPO_DIR
+from output_store import PartitionedWriter, read_partition
+from stream import replay_source
+
+
+def synthetic_day(templates, count):
+    # `count` records spread evenly over one day, cycling through the templates
+    start = datetime(2025, 3, 1)
+    step = timedelta(days=1) / count
+    for i in range(count):
+        record = dict(templates[i % len(templates)])
+        record["tweet_id"] = str(i)
+        record["timestamp"] = (start + step * i).strftime("%Y-%m-%d %H:%M:%S")
+        yield record
+
+
+def old_dump(records, directory):
+    import pandas as pd
+
+    data = list(records)
+    df = pd.DataFrame(data)
+    df.to_csv(os.path.join(directory, "day.csv"), mode="w", index=False)
+    with open(os.path.join(directory, "day.json"), "w", encoding="utf-8") as json_file:
+        json.dump(data, json_file, indent=4)
+
+
+def partitioned(records, directory, compress=False):
+    with PartitionedWriter(directory, "raw", compress) as writer:
+        for record in records:
+            writer.write(record)
+
+
+def measure(fn, templates, count, *extra):
+    # Timed run, then a second traced run for peak memory (tracing slows everything down)
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        fn(synthetic_day(templates, count), directory, *extra)
+        elapsed = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as directory:
+        tracemalloc.start()
+        fn(synthetic_day(templates, count), directory, *extra)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def measure_save_data(templates, count, batch_size):
+    # Peak memory save_data adds on top of the day's list, and its time (tracing included)
+    import data
+
+    batches = []
+    day = list(synthetic_day(templates, count))
+    with tempfile.TemporaryDirectory() as directory:
+        tracemalloc.start()
+        start = time.perf_counter()
+        data.save_data(day, root=directory, sink=lambda batch: batches.append(len(batch)), batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak, len(batches)
+
+
+def main():
+    import pandas  # noqa: F401  (imported up front so its import isn't counted as peak memory)
+
+    templates = list(replay_source(os.path.join(REPO_DIR, "tweet_analysis_app", "public", "json", "*.json")))
+    print(f"{len(templates)} template records\n")
+    print(f"{'records':>8} {'writer':>14} {'seconds':>8} {'peak MiB':>9}")
+
+    for count in (10000, 50000, 200000):
+        for name, fn, extra in (("csv+json", old_dump, ()),
+                                ("ndjson", partitioned, ()),
+                                ("ndjson.gz", partitioned, (True,))):
+            elapsed, peak = measure(fn, templates, count, *extra)
+            print(f"{count:>8} {name:>14} {elapsed:>8.2f} {peak / 2**20:>9.1f}")
+
+    print(f"\n{'records':>8} {'save_data':>14} {'seconds':>8} {'peak MiB':>9} {'batches':>8}")
+    for count in (10000, 50000, 200000):
+        elapsed, peak, batches = measure_save_data(templates, count, 500)
+        print(f"{count:>8} {'batch 500':>14} {elapsed:>8.2f} {peak / 2**20:>9.1f} {batches:>8}")
+
+    # Reading one hour back, against loading the day's JSON dump
+    count = 200000
+    with tempfile.TemporaryDirectory() as directory:
+        old_dump(synthetic_day(templates, count), directory)
+        partitioned(synthetic_day(templates, count), directory)
+
+        start = time.perf_counter()
+        with open(os.path.join(directory, "day.json"), encoding="utf-8") as json_file:
+            hour = [r for r in json.load(json_file) if r["timestamp"].startswith("2025-03-01 12")]
+        whole_day = time.perf_counter() - start
+
+        start = time.perf_counter()
+        partition = list(read_partition(directory, "raw", "2025-03-01", "12"))
+        one_hour = time.perf_counter() - start
+    print(f"\nOne hour of a {count}-record day: {len(hour)} records from the JSON dump in {whole_day:.2f}s, "
+          f"{len(partition)} from its partition in {one_hour:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""End-to-end benchmark of the classification pipeline against local stand-ins.
+
+Run from the repository root:
+    python benchmarks/bench_pipeline.py [--tweets 200] [--modes sequential-fast combined] [--compare OLD.json]
+
+Seeds a mock Supabase (or, with --storage sqlite, a local SQLite file) with a
+day of CrisisMMD tweets, then runs what
+multiprocessing_genai.py's __main__ does for each classify mode (sequential
+with the fast or full severity prompt, or combined): stream the day's pages
+into classify_all's work queue against a mock Ollama, and enrich_location
+against a mock Nominatim. Reports tweets/s, p50/p95/p99 latency per stage (page
+fetch, LLM call, tweet, store batch, geocode lookup) and peak Python memory, measured in a
+second tracemalloc pass so tracing does not slow the timed one. Results are
+saved as JSON (default benchmarks/results/pipeline-<commit>.json); pass an
+earlier file with --compare to see the change.
+"""
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+from corpus import REPO_DIR, load_crisismmd_texts
+from latency import DISTRIBUTIONS, Latency
+from mock_geocoder import MockGeocoder
+from mock_ollama import MockOllama
+from mock_supabase import MockSupabase
+
+MODES = ("sequential-fast", "sequential-full", "combined")
+RUN_DATE = "2025-01-01"
+STAGES = ("fetch", "llm_call", "classify", "store", "geocode", "enrich")
+
+
+def make_rows(count):
+    texts = load_crisismmd_texts("*humanitarian*")
+    return [
+        {
+            "tweet_id": str(1000000 + i),
+            "timestamp": f"{RUN_DATE}T{i * 86399 // count // 3600:02d}:{i % 60:02d}:00+00:00",
+            "tweet_text": texts[i % len(texts)],
+            "matched_disaster_keywords": "flood",
+            "matched_crisis_keywords": "None",
+            "hashtags": "",
+            "post_url": f"https://bsky.app/profile/example.bsky.social/post/{i}",
+            "sentiment_score": 0.0,
+        }
+        for i in range(count)
+    ]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(samples):
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean": sum(samples) / len(samples),
+        "p50": percentile(samples, 0.5),
+        "p95": percentile(samples, 0.95),
+        "p99": percentile(samples, 0.99),
+        "total": sum(samples),
+    }
+
+
+def timed(function, samples):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+    return wrapper
+
+
+class StandIns:
+    """The three mock services for one run, seeded with the day's tweets."""
+
+    def __init__(self, args, rows):
+        self.ollama = MockOllama(
+            latency=Latency(args.llm_latency, args.distribution, seed=1),
+            token_latency=args.token_latency, parallel=args.parallel, max_queue=args.max_queue,
+        )
+        self.database = MockSupabase(latency=Latency(args.db_latency, args.distribution, seed=2))
+        self.geocoder = MockGeocoder(latency=Latency(args.geo_latency, args.distribution, seed=3), miss_rate=args.miss_rate)
+        self.database.table("bluesky_api_data").update({row["tweet_id"]: row for row in rows})
+
+    def __enter__(self):
+        for server in (self.ollama, self.database, self.geocoder):
+            server.start()
+        return self
+
+    def __exit__(self, *exc):
+        for server in (self.ollama, self.database, self.geocoder):
+            server.stop()
+
+
+def open_storage(args, mocks, rows, state_dir):
+    from storage import POSTS_TABLE, SQLiteStorage, SupabaseStorage
+
+    if args.storage == "supabase":
+        return SupabaseStorage(mocks.database.client())
+    storage = SQLiteStorage(os.path.join(state_dir, f"pipeline-{time.monotonic_ns()}.sqlite"))
+    storage.upsert(POSTS_TABLE, rows)
+    return storage
+
+
+def run_pipeline(genai, mode, args, rows, ledger_dir):
+    from geocache import GeocodeCache
+    from job_ledger import JobLedger
+    from llm import OllamaClient
+    from scheduler import AIMDLimiter
+
+    with StandIns(args, rows) as mocks:
+        storage = open_storage(args, mocks, rows, ledger_dir)
+        genai.NOMINATIM_URL = mocks.geocoder.url
+        genai.NOMINATIM_DELAY = args.geo_delay
+        genai.CLASSIFY_MODE, _, severity = mode.partition("-")
+        genai.SEVERITY_MODE = severity or "fast"
+        genai.limiter = AIMDLimiter(maximum=64)
+        genai.client = OllamaClient(genai.llm, url=mocks.ollama.url, pool_size=64, limiter=genai.limiter,
+                                    routes=genai.MODEL_ROUTES)
+        genai.ledger = JobLedger(os.path.join(ledger_dir, f"{mode}-{time.monotonic_ns()}.sqlite"))
+        genai.geocode_cache = GeocodeCache(os.path.join(ledger_dir, f"geocode-{mode}-{time.monotonic_ns()}.sqlite"))
+
+        samples = {stage: [] for stage in STAGES}
+        storage.scan_page = timed(storage.scan_page, samples["fetch"])
+        originals = {name: getattr(genai, name) for name in
+                     ("get_storage", "safe_generate_json", "classify_tweet", "store_results",
+                      "get_location_data", "enrich_location")}
+        genai.get_storage = lambda: storage
+        for name, stage in (("safe_generate_json", "llm_call"), ("classify_tweet", "classify"),
+                            ("store_results", "store"), ("get_location_data", "geocode"),
+                            ("enrich_location", "enrich")):
+            setattr(genai, name, timed(originals[name], samples[stage]))
+
+        try:
+            start = time.perf_counter()
+            with open(os.devnull, "w") as quiet, redirect_stdout(quiet):  # the pipeline prints every step
+                stats = genai.classify_all(genai.fetch_tweets(RUN_DATE, args.page_size), run_date=RUN_DATE)
+                classify_seconds = time.perf_counter() - start
+                genai.enrich_location(RUN_DATE)
+            wall = time.perf_counter() - start
+            geocode_stats = genai.geocode_cache.stats()
+        finally:
+            for name, function in originals.items():
+                setattr(genai, name, function)
+            genai.ledger.close()
+            genai.geocode_cache.close()
+            storage.close()
+
+        return {
+            "tweets": stats.submitted,
+            "classified": stats.completed,
+            "failed": stats.failed,
+            "wall_seconds": wall,
+            "tweets_per_second": stats.submitted / wall,
+            "classify_tweets_per_second": stats.completed / classify_seconds,
+            "llm_requests": mocks.ollama.requests,
+            "llm_rejected": mocks.ollama.rejected,
+            "prompt_tokens": mocks.ollama.prompt_tokens,
+            "completion_tokens": mocks.ollama.completion_tokens,
+            "geocode_requests": mocks.geocoder.requests,
+            "geocode_cache": geocode_stats,
+            "database_requests": mocks.database.requests,
+            "limiter": genai.limiter.stats(),
+            "stages": {stage: summarize(values) for stage, values in samples.items()},
+        }
+
+
+def peak_memory(genai, mode, args, rows, ledger_dir):
+    tracemalloc.start()
+    try:
+        run_pipeline(genai, mode, args, rows, ledger_dir)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_run(mode, run):
+    print(f"\n{mode}: {run['tweets']} tweets in {run['wall_seconds']:.1f}s = {run['tweets_per_second']:.1f} tweets/s "
+          f"(before geocoding {run['classify_tweets_per_second']:.1f}/s), {run['llm_requests']} LLM calls, "
+          f"{run['llm_rejected']} rejected, {run['prompt_tokens'] + run['completion_tokens']} tokens, "
+          f"peak memory {run['peak_memory_mib']:.1f} MiB")
+    print(f"{'stage':>10} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'total s':>8}")
+    for stage, summary in run["stages"].items():
+        if summary["count"]:
+            print(f"{stage:>10} {summary['count']:>6} {summary['p50'] * 1000:>8.1f} {summary['p95'] * 1000:>8.1f} "
+                  f"{summary['p99'] * 1000:>8.1f} {summary['total']:>8.2f}")
+
+
+def compare(baseline, results):
+    print(f"\nChange from {baseline['commit']} to {results['commit']}:")
+    for mode, run in results["runs"].items():
+        before = baseline["runs"].get(mode)
+        if before is None:
+            print(f"{mode:>10}: not in the baseline")
+            continue
+        change = run["tweets_per_second"] / before["tweets_per_second"] - 1
+        print(f"{mode:>10}: tweets/s {before['tweets_per_second']:.1f} -> {run['tweets_per_second']:.1f} ({change:+.0%}), "
+              f"peak memory {before['peak_memory_mib']:.1f} -> {run['peak_memory_mib']:.1f} MiB")
+        for stage, summary in run["stages"].items():
+            old = before["stages"].get(stage, {})
+            if summary["count"] and old.get("count"):
+                print(f"{'':>12}{stage:>10} p95 {old['p95'] * 1000:.1f} -> {summary['p95'] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tweets", type=int, default=200)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--distribution", default="lognormal", choices=DISTRIBUTIONS,
+                        help="latency distribution of every mock service")
+    parser.add_argument("--llm-latency", type=float, default=0.1, help="mean seconds per generation")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="seconds per completion token")
+    parser.add_argument("--parallel", type=int, default=8, help="generation slots on the mock Ollama")
+    parser.add_argument("--max-queue", type=int, default=16, help="waiting requests before the mock Ollama answers 503")
+    parser.add_argument("--page-size", type=int, default=100, help="rows per page when fetching the day")
+    parser.add_argument("--storage", default="supabase", choices=["supabase", "sqlite"],
+                        help="pipeline tables in the mock Supabase or a local SQLite file")
+    parser.add_argument("--db-latency", type=float, default=0.02, help="mean seconds per Supabase request")
+    parser.add_argument("--geo-latency", type=float, default=0.05, help="mean seconds per geocoder request")
+    parser.add_argument("--miss-rate", type=float, default=0.1, help="share of locations the geocoder cannot find")
+    parser.add_argument("--geo-delay", type=float, default=0.0,
+                        help="NOMINATIM_DELAY between geocoded records (the pipeline's default is 1s)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", help="JSON results file (default benchmarks/results/pipeline-<commit>.json)")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    os.environ["LLM_CACHE_FILE"] = ""  # every run must reach the mock server
+    os.environ["JOB_LEDGER_FILE"] = ""  # each run gets its own ledger and geocode cache below
+    os.environ["GEOCODE_CACHE_FILE"] = ""
+    os.environ["GAZETTEER_FILE"] = ""
+    import multiprocessing_genai as genai
+    genai.prefilter = None
+
+    rows = make_rows(args.tweets)
+    results = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": vars(args),
+        "runs": {},
+    }
+    with tempfile.TemporaryDirectory() as ledger_dir:
+        for mode in args.modes:
+            run = run_pipeline(genai, mode, args, rows, ledger_dir)
+            run["peak_memory_mib"] = 0.0 if args.no_memory else peak_memory(genai, mode, args, rows, ledger_dir) / 2 ** 20
+            results["runs"][mode] = run
+            print_run(mode, run)
+
+    output = args.output or os.path.join(REPO_DIR, "benchmarks", "results", f"pipeline-{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"\nSaved {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            compare(json.load(baseline_file), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""LLM calls saved vs recall lost by the prefilter on the held-out CrisisMMD splits.
+
+Run from the repository root:  python benchmarks/bench_prefilter.py
+
+Trains the prefilter on the humanitarian train split and evaluates it on dev and
+test. Every tweet the prefilter skips saves its genuine-disaster LLM call; a
+skipped tweet whose label is disaster-relevant is recall lost. CrisisMMD tweets
+all come from disaster-event streams, so its negatives are harder than the
+metaphors and noise a Bluesky keyword search returns; expect more skips in
+production at the same recall.
+"""
+import time
+
+from corpus import GEN_AI_DIR  # noqa: F401  (puts gen_ai_research on sys.path)
+from prefilter import PrefilterModel, load_split
+
+THRESHOLDS = (0.02, 0.05, 0.1, 0.2, 0.3, 0.5)
+
+
+def report(name, probabilities, labels):
+    positives = int(labels.sum())
+    print(f"\n{name}: {len(labels)} tweets, {positives} disaster-relevant")
+    print(f"{'threshold':>9} {'calls saved':>12} {'recall lost':>12} {'relevant skipped':>17}")
+    for threshold in THRESHOLDS:
+        skipped = probabilities < threshold
+        lost = int((skipped & (labels == 1)).sum())
+        print(f"{threshold:>9} {skipped.sum():>6} ({skipped.mean():>4.0%}) {lost / positives:>12.1%} {lost:>17}")
+
+
+def main():
+    texts, labels = load_split("train")
+    start = time.perf_counter()
+    model = PrefilterModel.train(texts, labels)
+    print(f"Trained on {len(texts)} tweets in {time.perf_counter() - start:.1f}s")
+
+    for split in ("dev", "test"):
+        split_texts, split_labels = load_split(split)
+        start = time.perf_counter()
+        probabilities = model.predict_proba(split_texts)
+        elapsed = time.perf_counter() - start
+        report(split, probabilities, split_labels)
+        print(f"accuracy at 0.5: {((probabilities >= 0.5) == split_labels).mean():.1%}; "
+              f"{elapsed / len(split_texts) * 1e6:.0f} us per tweet")
+
+
+if __name__ == "__main__":
+    main()
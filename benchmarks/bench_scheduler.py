@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Daily classification run: fixed 99-row chunks with sleep(30) vs the adaptive work queue.
+
+Run from the repository root:  python benchmarks/bench_scheduler.py [--tweets 300] [--chunk-sleep 30]
+
+Classifies CrisisMMD tweets with the sequential classify_tweet against a mock
+Ollama server that runs `--parallel` generations at once and answers 503 once
+more than `--max-queue` requests are waiting, and stores results in a mock
+Supabase. Compared:
+  chunked  the old __main__ loop: 99-row windows, 5 workers, per-row upserts, sleep after each window
+  fixed    the work queue with a fixed 64 requests in flight (no limiter)
+  aimd     the work queue with the AIMD limiter (starts at 4, up to 64)
+"""
+import argparse
+import contextlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from corpus import GEN_AI_DIR  # noqa: F401  (puts gen_ai_research on sys.path)
+from mock_ollama import MockOllama
+from mock_supabase import MockSupabase
+from storage import SupabaseStorage
+
+
+def chunked(genai, tweets, supabase, chunk_sleep, on_store):
+    # The loop this replaces (with the Pool's 5 processes as 5 threads)
+    for start in range(0, len(tweets), 99):
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            results = list(executor.map(genai.classify_tweet, tweets[start:start + 99]))
+        for result in results:
+            if result:
+                supabase.table("multiprocessing_gen_ai_output").upsert(result).execute()
+                on_store(1)
+        time.sleep(chunk_sleep)
+
+
+def work_queue(genai, tweets, supabase, on_store):
+    storage = SupabaseStorage(supabase)
+
+    def sink(results):
+        genai.store_results(results, storage)
+        on_store(len(results))
+
+    return genai.classify_all(tweets, workers=64, sink=sink)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tweets", type=int, default=300)
+    parser.add_argument("--chunk-sleep", type=float, default=30.0)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per generation on the mock server")
+    parser.add_argument("--parallel", type=int, default=8, help="generation slots on the mock server")
+    parser.add_argument("--max-queue", type=int, default=16, help="waiting requests before the mock answers 503")
+    args = parser.parse_args()
+
+    os.environ["LLM_CACHE_FILE"] = ""
+    os.environ["JOB_LEDGER_FILE"] = ""
+    import multiprocessing_genai as genai
+    from llm import Model, OllamaClient
+    from prefilter import load_split
+    from scheduler import AIMDLimiter
+
+    genai.prefilter = None
+    texts, _ = load_split("test")
+    tweets = [genai.Tweet(str(i), "2025-01-01T00:00:00", text) for i, text in enumerate(texts[:args.tweets])]
+    print(f"{len(tweets)} tweets; mock Ollama {args.latency}s per call, {args.parallel} slots, "
+          f"503 beyond {args.max_queue} queued\n")
+    print(f"{'run':>8} {'seconds':>8} {'tweets/s':>9} {'first stored':>13} {'stored':>7} {'LLM calls':>10} {'503s':>6}")
+
+    for name in ("chunked", "fixed", "aimd"):
+        with MockOllama(latency=args.latency, parallel=args.parallel, max_queue=args.max_queue) as server, \
+                MockSupabase(latency=0.02) as database:
+            limiter = AIMDLimiter(maximum=64) if name == "aimd" else None
+            genai.limiter = limiter or AIMDLimiter(initial=64, maximum=64)  # only reported for "fixed"
+            genai.client = OllamaClient(Model.LLAMA_3_2, url=server.url, pool_size=64, limiter=limiter)
+            supabase = database.client()
+
+            stored = [0, None]
+            start = time.perf_counter()
+
+            def on_store(count):
+                stored[0] += count
+                if stored[1] is None:
+                    stored[1] = time.perf_counter() - start
+
+            with contextlib.redirect_stdout(io.StringIO()):  # classify_tweet prints every step
+                if name == "chunked":
+                    chunked(genai, tweets, supabase, args.chunk_sleep, on_store)
+                else:
+                    work_queue(genai, tweets, supabase, on_store)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>8} {elapsed:>8.1f} {len(tweets) / elapsed:>9.2f} {stored[1]:>12.1f}s {stored[0]:>7} "
+                  f"{server.requests:>10} {server.rejected:>6}")
+            if limiter is not None:
+                print(f"{'':>8} limiter: {limiter.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Replay the saved raw Bluesky dumps through the daemon pipeline offline.
+
+Run from the repository root:  python benchmarks/bench_stream_replay.py [queue_size] [sink_delay_ms]
+
+A non-zero sink delay simulates a slow database: the source should then be held
+back by the bounded queues instead of buffering the whole replay in memory.
+"""
+import sys
+import time
+
+from corpus import REPO_DIR  # noqa: F401  (puts the repository root on sys.path)
+import data
+from stream import replay_source, run_pipeline
+
+
+def main():
+    queue_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    sink_delay = (float(sys.argv[2]) if len(sys.argv) > 2 else 0.0) / 1000
+
+    def sink(batch):
+        if sink_delay:
+            time.sleep(sink_delay)
+
+    stages = [
+        ("match", lambda items: data.keyword_stage(items, from_post=False)),
+        ("clean", data.clean_stage),
+        ("dedup", lambda records: data.mark_near_duplicates(records, data.NearDuplicateDetector())),
+        ("sentiment", data.sentiment_stage),
+    ]
+    source = replay_source(f"{data.json_directory}/bluesky_raw_data_*.json")
+    start = time.perf_counter()
+    stats = run_pipeline(source, stages, sink, queue_size=queue_size, batch_size=200)
+    elapsed = time.perf_counter() - start
+
+    replayed = stats.counts["source"]
+    print(f"\n{replayed} posts replayed in {elapsed:.2f}s ({replayed / elapsed:,.0f} posts/s)")
+    print(f"stored: {stats.counts['sentiment']} in {stats.batches} batches")
+    print("max queue depth per step:", stats.max_depth)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Compare per-record upserts with the chunked bulk writer against a local
+PostgREST stand-in that counts requests.
+
+Run from the repository root:  python benchmarks/bench_supabase_upload.py [rows] [latency_ms]
+"""
+import sys
+import time
+
+from corpus import load_crisismmd_texts
+from bulk_upsert import upsert_records
+from mock_supabase import MockSupabase
+
+
+def make_records(count):
+    texts = load_crisismmd_texts()
+    return [
+        {
+            "tweet_id": str(1000000 + i),
+            "timestamp": "2025-04-15 06:06:39",
+            "tweet_text": texts[i % len(texts)].lower(),
+            "matched_disaster_keywords": "flood",
+            "matched_crisis_keywords": "None",
+            "hashtags": "",
+            "post_url": f"https://bsky.app/profile/example.bsky.social/post/{i}",
+            "sentiment_score": 0.0,
+        }
+        for i in range(count)
+    ]
+
+
+def per_record(client, records):
+    for record in records:
+        try:
+            client.table("bluesky_api_data").upsert(record, on_conflict="tweet_id").execute()
+        except Exception as e:
+            print(f"Insert failed for record {record['tweet_id']}: {e}")
+
+
+def run(label, fn, records, latency, reject=None):
+    with MockSupabase(latency=latency, reject=reject) as mock:
+        client = mock.client()
+        start = time.perf_counter()
+        fn(client, records)
+        elapsed = time.perf_counter() - start
+        stored = len(mock.table("bluesky_api_data"))
+    print(f"{label:<34} {mock.requests:>9} {stored:>7} {elapsed:>9.2f}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20.0) / 1000
+    records = make_records(count)
+    bad_ids = {records[7]["tweet_id"], records[1234 % count]["tweet_id"]}
+
+    print(f"{count} records, {latency * 1000:.0f} ms simulated round trip\n")
+    print(f"{'writer':<34} {'requests':>9} {'stored':>7} {'seconds':>9}")
+    run("per-record upsert", per_record, records, latency)
+    for chunk_size in (100, 500):
+        run(f"chunked upsert ({chunk_size}/request)",
+            lambda client, rows: upsert_records(client, "bluesky_api_data", rows, chunk_size=chunk_size),
+            records, latency)
+    run("chunked (500), 2 bad rows",
+        lambda client, rows: upsert_records(client, "bluesky_api_data", rows, chunk_size=500),
+        records, latency, reject=lambda row: row["tweet_id"] in bad_ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import csv
+import glob
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROCESSED_DATA_DIR = os.path.join(REPO_DIR, "processed-data")
+GEN_AI_DIR = os.path.join(REPO_DIR, "gen_ai_research")
+
+# Benchmarks import the ingestion modules from the repository root and the
+# classification modules from gen_ai_research/ (which import each other as siblings)
+for path in (GEN_AI_DIR, REPO_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+csv.field_size_limit(sys.maxsize)
+
+
+# Read the tweet_text column of every CrisisMMD split in processed-data/
+def load_crisismmd_texts(pattern="*"):
+    texts = []
+    for path in sorted(glob.glob(os.path.join(PROCESSED_DATA_DIR, pattern))):
+        delimiter = "\t" if path.endswith(".tsv") else ","
+        with open(path, newline="", encoding="utf-8") as data_file:
+            for row in csv.DictReader(data_file, delimiter=delimiter):
+                text = row.get("tweet_text")
+                if text:
+                    texts.append(text)
+    return texts
+
+
+def load_keywords(filename):
+    with open(os.path.join(REPO_DIR, filename), "r", encoding="utf-8") as keyword_file:
+        return [line.strip().lower() for line in keyword_file if line.strip()]
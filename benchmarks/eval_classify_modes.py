@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Compare the sequential (up to three calls) and combined (one call) classification modes.
+
+Run from the repository root:
+    python benchmarks/eval_classify_modes.py --url http://localhost:11434 [--limit 100]
+
+Each setup classifies the same CrisisMMD test tweets one at a time: sequential
+with the full (justified) severity prompt, sequential with the fast scores-only
+severity prompt, and combined. Reports latency per tweet, LLM calls,
+prompt/completion tokens, and how often each setup agrees with sequential/full
+on the genuine flag, disaster type, location and severity. Without --url
+a mock Ollama server is used (0.2s per call plus 1ms per prompt token and 20ms
+per completion token), which measures calls, tokens and latency but not
+agreement, since its answers are arbitrary.
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import time
+
+from corpus import GEN_AI_DIR  # noqa: F401  (puts gen_ai_research on sys.path)
+from mock_ollama import MockOllama
+
+
+def load_tweets(limit):
+    from multiprocessing_genai import Tweet
+    from prefilter import load_split
+
+    texts, _ = load_split("test")
+    return [Tweet(str(i), "2025-01-01T00:00:00", text) for i, text in enumerate(texts[:limit])]
+
+
+SETUPS = (("sequential", "full"), ("sequential", "fast"), ("combined", None))
+
+
+def run_mode(genai, tweets, mode, severity):
+    before = dict(genai.client.usage)
+    latencies, results = [], []
+    for tweet in tweets:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # classify_tweet prints every step
+            results.append(genai.classify_tweet(tweet, mode=mode, severity=severity))
+        latencies.append(time.perf_counter() - start)
+    usage = {key: genai.client.usage[key] - before[key] for key in before}
+    return results, latencies, usage
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def agreement(name, reference, other):
+    same = lambda key: sum(  # noqa: E731
+        str(a[key]).strip().lower() == str(b[key]).strip().lower() for a, b in zip(reference, other)
+    )
+    both_scored = [(float(a["severity_score"]), float(b["severity_score"])) for a, b in zip(reference, other)
+                   if a["severity_score"] != "None" and b["severity_score"] != "None"]
+    n = len(reference)
+    print(f"\n{name} vs sequential/full over {n} tweets: genuine {same('genuine_disaster') / n:.1%}, "
+          f"disaster type {same('disaster_type') / n:.1%}, location {same('location') / n:.1%}")
+    if both_scored:
+        mean_gap = statistics.mean(abs(a - b) for a, b in both_scored)
+        print(f"Severity scored by both on {len(both_scored)} tweets: mean absolute difference {mean_gap:.2f} (0-10 scale)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Ollama server to evaluate against (default: a mock server)")
+    parser.add_argument("--limit", type=int, default=100, help="CrisisMMD test tweets to classify")
+    args = parser.parse_args()
+
+    os.environ["LLM_CACHE_FILE"] = ""  # every call must reach the server
+    mock = None
+    if args.url:
+        os.environ["OLLAMA_URL"] = args.url
+    else:
+        mock = MockOllama(latency=0.2, prompt_token_latency=0.001, token_latency=0.02, parallel=1).start()
+        os.environ["OLLAMA_URL"] = mock.url
+
+    import multiprocessing_genai as genai
+    genai.prefilter = None  # every setup sees every tweet
+
+    tweets = load_tweets(args.limit)
+    outcomes = {}
+    print(f"\n{'setup':>15} {'tweets':>6} {'calls':>6} {'prompt tok':>11} {'compl tok':>10} "
+          f"{'mean s':>7} {'p50 s':>7} {'p95 s':>7} {'total s':>8}")
+    for mode, severity in SETUPS:
+        name = mode if severity is None else f"{mode}/{severity}"
+        results, latencies, usage = run_mode(genai, tweets, mode, severity)
+        outcomes[name] = results
+        print(f"{name:>15} {len(tweets):>6} {usage['requests']:>6} {usage['prompt_tokens']:>11} "
+              f"{usage['completion_tokens']:>10} {statistics.mean(latencies):>7.2f} {percentile(latencies, 0.5):>7.2f} "
+              f"{percentile(latencies, 0.95):>7.2f} {sum(latencies):>8.1f}")
+
+    if mock is None:
+        reference = outcomes.pop("sequential/full")
+        for name, results in outcomes.items():
+            agreement(name, reference, results)
+    else:
+        mock.stop()
+        print("\n(mock server: agreement needs a real model, pass --url)")
+
+
+if __name__ == "__main__":
+    main()
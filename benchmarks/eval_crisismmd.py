@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""Accuracy against CrisisMMD labels next to LLM cost, for each classification setup.
+
+Run from the repository root:
+    python benchmarks/eval_crisismmd.py --url http://localhost:11434 [--task humanitarian] [--split test]
+        [--modes sequential combined] [--severity fast full] [--models routed llama3.2 mistral] [--prefilter 0.05 0.1]
+        [--limit 500]
+
+Streams one labelled split through classify_tweet for every combination of
+mode, severity prompt (sequential mode only), model and prefilter threshold, and reports precision/recall/F1 of the
+genuine-disaster flag next to LLM requests and tokens per tweet, seconds per
+tweet and throughput, sorted by tokens so the rows read as an
+accuracy-versus-cost curve. Disaster types are checked against the event each
+tweet came from; on the damage task, mean severity is shown per damage label.
+
+Tasks and what counts as a genuine disaster report:
+  humanitarian  label_text is not not_humanitarian
+  informative   label_text is informative (from pre-processed-data/, the cleaned split has no negatives)
+  damage        label is severe_damage or mild_damage
+
+Each setup's outputs are appended to state/eval/<task>-<split>-<setup>.ndjson as
+they finish, so an interrupted evaluation resumes where it stopped and a
+finished one is re-scored without calling the model (--fresh starts over).
+A tweet whose classification raises is scored as not genuine and counted in
+the "fail" column; it is tried again when the evaluation resumes.
+The setup name includes the prompt hash, so editing a prompt starts a new
+file. Without --url a mock Ollama server is used, which measures cost but
+not accuracy, since its answers are arbitrary.
+"""
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from contextlib import redirect_stdout
+
+from corpus import PROCESSED_DATA_DIR, REPO_DIR
+from mock_ollama import MockOllama
+
+TASKS = ("humanitarian", "informative", "damage")
+MODES = ("sequential", "combined")
+EVAL_DIR = os.path.join(REPO_DIR, "state", "eval")
+PRE_PROCESSED_DATA_DIR = os.path.join(REPO_DIR, "pre-processed-data")
+# CrisisMMD event -> the disaster type classify_tweet should name
+EVENT_TYPES = {
+    "california_wildfires": "fire",
+    "hurricane_harvey": "hurricane",
+    "hurricane_irma": "hurricane",
+    "hurricane_maria": "hurricane",
+    "iraq_iran_earthquake": "earthquake",
+    "mexico_earthquake": "earthquake",
+    "srilanka_floods": "flood",
+}
+
+
+def _rows(path):
+    with open(path, newline="", encoding="utf-8") as data_file:
+        yield from csv.DictReader(data_file, delimiter="\t" if path.endswith(".tsv") else ",")
+
+
+def load_task(task, split):
+    # One example per tweet (CrisisMMD repeats a tweet for each of its images)
+    if task == "humanitarian":
+        rows = _rows(os.path.join(PROCESSED_DATA_DIR, f"cleaned_humanitarian_{split}.csv"))
+        positive = lambda row: row["label_text"] != "not_humanitarian"  # noqa: E731
+    elif task == "informative":
+        # The cleaned informative split keeps only the informative tweets, so read the labelled original
+        rows = _rows(os.path.join(PRE_PROCESSED_DATA_DIR, f"task_informative_text_img_{split}.tsv"))
+        positive = lambda row: row["label_text"] == "informative"  # noqa: E731
+    elif task == "damage":
+        rows = _rows(os.path.join(PROCESSED_DATA_DIR, f"task_damage_text_img_{split}_cleaned.tsv"))
+        positive = lambda row: row["label"] != "little_or_no_damage"  # noqa: E731
+    else:
+        raise ValueError(f"Unknown task {task!r}; expected one of {TASKS}")
+
+    examples, seen = [], set()
+    for row in rows:
+        if row["tweet_id"] in seen or not row["tweet_text"].strip():
+            continue
+        seen.add(row["tweet_id"])
+        examples.append({
+            "tweet_id": row["tweet_id"],
+            "text": row["tweet_text"],
+            "positive": positive(row),
+            "event": row["event_name"],
+            "label": row.get("label_text") or row.get("label"),
+        })
+    return examples
+
+
+class UsageMeter:
+    """Attributes the client's requests and tokens to the tweet each worker thread is classifying."""
+
+    def __init__(self, client):
+        self._local = threading.local()
+        record = client._record_usage
+
+        def record_usage(usage, model=None):
+            record(usage, model)
+            counts = getattr(self._local, "counts", None)
+            if counts is not None:
+                counts["requests"] += 1
+                counts["prompt_tokens"] += usage.get("prompt_tokens") or 0
+                counts["completion_tokens"] += usage.get("completion_tokens") or 0
+
+        client._record_usage = record_usage
+
+    def start(self):
+        self._local.counts = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def stop(self):
+        counts, self._local.counts = self._local.counts, None
+        return counts
+
+
+def read_outputs(path):
+    outputs = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as cache_file:
+            for line in cache_file:
+                if line.strip():
+                    record = json.loads(line)
+                    outputs[record["tweet_id"]] = record
+    return outputs
+
+
+def run_setup(genai, meter, examples, path, workers):
+    # Classify the examples not yet in `path` (or that failed there), appending each output as it finishes
+    from scheduler import run_work_queue
+
+    outputs = read_outputs(path)
+    todo = [example for example in examples
+            if example["tweet_id"] not in outputs or outputs[example["tweet_id"]].get("error")]
+    if not todo:
+        return outputs, None
+
+    def work(example):
+        meter.start()
+        start = time.perf_counter()
+        result, error = None, None
+        try:
+            result = genai.classify_tweet(genai.Tweet(example["tweet_id"], "", example["text"]))
+        except Exception as e:
+            # Kept as an output so it is scored (as not genuine) rather than silently left out
+            error = f"{type(e).__name__}: {e}"
+        seconds = time.perf_counter() - start
+        usage = meter.stop()
+        return {"tweet_id": example["tweet_id"], "result": result, "error": error, "seconds": seconds, **usage}
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as cache_file, open(os.devnull, "w") as quiet, redirect_stdout(quiet):
+        def sink(records):
+            for record in records:
+                cache_file.write(json.dumps(record) + "\n")
+                outputs[record["tweet_id"]] = record
+            cache_file.flush()
+
+        stats = run_work_queue(todo, work, sink, workers=workers, batch_size=10)
+    return outputs, stats
+
+
+def score(examples, outputs):
+    scored = [(example, outputs[example["tweet_id"]]) for example in examples if example["tweet_id"] in outputs]
+    # Tweets whose classification failed count as predicted not genuine
+    predicted = {example["tweet_id"]: bool(output["result"] and output["result"]["genuine_disaster"])
+                 for example, output in scored}
+    tp = sum(example["positive"] and predicted[example["tweet_id"]] for example, _ in scored)
+    fp = sum(not example["positive"] and predicted[example["tweet_id"]] for example, _ in scored)
+    fn = sum(example["positive"] and not predicted[example["tweet_id"]] for example, _ in scored)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    typed = [(example, output) for example, output in scored
+             if example["positive"] and predicted[example["tweet_id"]] and example["event"] in EVENT_TYPES]
+    type_hits = sum(EVENT_TYPES[example["event"]] in str(output["result"]["disaster_type"]).lower()
+                    for example, output in typed)
+    n = len(scored) or 1
+
+    severity = {}
+    for example, output in scored:
+        if output["result"] and output["result"]["severity_score"] not in ("None", None):
+            severity.setdefault(example["label"], []).append(float(output["result"]["severity_score"]))
+
+    return {
+        "tweets": len(scored),
+        "failed": sum(output["result"] is None for _, output in scored),
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "type_accuracy": type_hits / len(typed) if typed else None,
+        "requests_per_tweet": sum(output["requests"] for _, output in scored) / n,
+        "tokens_per_tweet": sum(output["prompt_tokens"] + output["completion_tokens"] for _, output in scored) / n,
+        "seconds_per_tweet": sum(output["seconds"] for _, output in scored) / n,
+        "severity_by_label": {label: sum(values) / len(values) for label, values in sorted(severity.items())},
+    }
+
+
+def main():
+    from llm import Model
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Ollama server to evaluate against (default: a mock server)")
+    parser.add_argument("--task", default="humanitarian", choices=TASKS)
+    parser.add_argument("--split", default="test", choices=("train", "dev", "test"))
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--severity", nargs="+", default=["fast"], choices=("fast", "full"),
+                        help="severity prompts to evaluate in sequential mode")
+    parser.add_argument("--models", nargs="+", default=["routed"],
+                        choices=["routed"] + [model.value for model in Model if model is not Model.MXBAI_LARGE],
+                        help="one model for every prompt, or \"routed\" for the OLLAMA_ROUTES model per task")
+    parser.add_argument("--prefilter", nargs="*", type=float, default=[],
+                        help="also evaluate with the prefilter at these thresholds (needs a trained model)")
+    parser.add_argument("--limit", type=int, help="only the first N tweets of the split")
+    parser.add_argument("--workers", type=int, default=4, help="tweets classified at once")
+    parser.add_argument("--fresh", action="store_true", help="discard cached outputs for these setups")
+    parser.add_argument("--output", help="also write the scores as JSON")
+    args = parser.parse_args()
+
+    os.environ["LLM_CACHE_FILE"] = ""  # outputs are cached per setup here instead, with their cost
+    os.environ["JOB_LEDGER_FILE"] = ""
+    os.environ["GEOCODE_CACHE_FILE"] = ""
+    mock = None
+    url = args.url
+    if url is None:
+        mock = MockOllama(latency=0.2, prompt_token_latency=0.001, token_latency=0.02, parallel=4).start()
+        url = mock.url
+
+    import multiprocessing_genai as genai
+    from llm import OllamaClient
+    from prefilter import PrefilterModel, Prefilter, PREFILTER_MODEL
+
+    prefilter_model = PrefilterModel.load(PREFILTER_MODEL) if args.prefilter else None
+    examples = load_task(args.task, args.split)[:args.limit]
+    print(f"{args.task}/{args.split}: {len(examples)} tweets, {sum(e['positive'] for e in examples)} genuine"
+          + ("" if args.url else " (mock server: cost only, accuracy needs --url)"))
+
+    scores = {}
+    for model in args.models:
+        routes = genai.MODEL_ROUTES if model == "routed" else None
+        genai.client = OllamaClient(genai.llm if routes else Model(model), url=url, pool_size=args.workers,
+                                    limiter=genai.limiter, routes=routes)
+        meter = UsageMeter(genai.client)
+        setups = [(mode, severity) for mode in args.modes
+                  for severity in (args.severity if mode == "sequential" else args.severity[:1])]
+        for mode, severity in setups:
+            genai.CLASSIFY_MODE = mode
+            genai.SEVERITY_MODE = severity
+            for threshold in [None] + args.prefilter:
+                genai.prefilter = None if threshold is None else Prefilter(prefilter_model, threshold)
+                setup = genai.pipeline_version(mode, severity) + ("" if threshold is None else f"/prefilter{threshold}")
+                name = ("mock-" if mock else "") + setup.replace("/", "-").replace(":", "_")
+                path = os.path.join(EVAL_DIR, f"{args.task}-{args.split}-{name}.ndjson")
+                if args.fresh and os.path.exists(path):
+                    os.remove(path)
+
+                outputs, stats = run_setup(genai, meter, examples, path, args.workers)
+                scores[setup] = score(examples, outputs)
+                if stats is not None:
+                    scores[setup]["tweets_per_second"] = stats.completed / stats.elapsed
+                    print(f"{setup}: classified {stats.summary()}")
+                else:
+                    print(f"{setup}: all outputs cached in {os.path.relpath(path, REPO_DIR)}")
+
+    width = max(len(setup) for setup in scores)
+    print(f"\n{'setup':<{width}} {'prec':>6} {'recall':>6} {'F1':>6} {'type':>6} {'fail':>5} {'req/tw':>7} "
+          f"{'tok/tw':>7} {'s/tw':>6} {'tw/s':>6}")
+    for setup, result in sorted(scores.items(), key=lambda item: item[1]["tokens_per_tweet"]):
+        type_accuracy = "-" if result["type_accuracy"] is None else f"{result['type_accuracy']:.1%}"
+        rate = result.get("tweets_per_second")
+        print(f"{setup:<{width}} {result['precision']:>6.1%} {result['recall']:>6.1%} {result['f1']:>6.1%} "
+              f"{type_accuracy:>6} {result['failed']:>5} {result['requests_per_tweet']:>7.2f} {result['tokens_per_tweet']:>7.0f} "
+              f"{result['seconds_per_tweet']:>6.2f} {'-' if rate is None else f'{rate:.2f}':>6}")
+        if args.task == "damage" and result["severity_by_label"]:
+            print(f"{'':<4}mean severity: " + ", ".join(
+                f"{label} {value:.1f}" for label, value in result["severity_by_label"].items()))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump({"task": args.task, "split": args.split, "mock": mock is not None, "scores": scores},
+                      output_file, indent=2)
+    if mock is not None:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
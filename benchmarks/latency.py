@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Latency distributions for the mock servers.
+
+A mock's `latency` can be a plain number of seconds or a Latency, which draws
+each request's delay from a seeded distribution with the given mean:
+  fixed        always the mean
+  uniform      between 0 and twice the mean
+  exponential  memoryless, like independent arrivals
+  lognormal    right-skewed with a long tail (`sigma` sets how long), like real GPU and API latencies
+"""
+import math
+import random
+import threading
+
+DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+class Latency:
+    def __init__(self, mean, distribution="fixed", sigma=0.5, seed=0):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {distribution!r}; expected one of {DISTRIBUTIONS}")
+        self.mean = mean
+        self.distribution = distribution
+        self.sigma = sigma
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if self.mean <= 0:
+            return 0.0
+        with self._lock:
+            if self.distribution == "uniform":
+                return self._random.uniform(0, 2 * self.mean)
+            if self.distribution == "exponential":
+                return self._random.expovariate(1 / self.mean)
+            if self.distribution == "lognormal":
+                # mu chosen so the distribution's mean is self.mean
+                return self._random.lognormvariate(math.log(self.mean) - self.sigma ** 2 / 2, self.sigma)
+        return self.mean
+
+    def __repr__(self):
+        return f"{self.distribution}({self.mean}s)"
+
+
+# The delay for one request from a number or a Latency
+def sample(latency):
+    return latency() if callable(latency) else latency
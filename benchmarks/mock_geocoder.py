@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""In-process stand-in for the Nominatim /search API used by benchmarks.
+
+Answers `/search?q=...&format=json&limit=1` with one place whose coordinates are
+derived from a hash of the query, so the same string always lands on the same
+point. A `miss_rate` share of queries (also picked by hash) find nothing, as
+do empty and "Not Specified" queries. `latency` is seconds per request, or a
+latency.Latency distribution. Requests and misses are counted.
+"""
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from latency import sample
+
+NOT_FOUND = {"", "none", "not specified"}
+
+
+def fake_place(query, miss_rate=0.0):
+    # A Nominatim-shaped result for `query`, or None if it is one of the misses
+    digest = hashlib.blake2b(query.strip().lower().encode("utf-8"), digest_size=8).digest()
+    if query.strip().lower() in NOT_FOUND or digest[0] / 256 < miss_rate:
+        return None
+    lat = int.from_bytes(digest[1:4], "big") / 2 ** 24 * 180 - 90
+    lon = int.from_bytes(digest[4:7], "big") / 2 ** 24 * 360 - 180
+    return {
+        "place_id": int.from_bytes(digest, "big") % 10 ** 9,
+        "lat": f"{lat:.7f}",
+        "lon": f"{lon:.7f}",
+        "display_name": query.strip(),
+        "class": "place",
+        "type": "city",
+    }
+
+
+class MockGeocoder:
+    def __init__(self, latency=0.0, miss_rate=0.1):
+        self.latency = latency
+        self.miss_rate = miss_rate
+        self.requests = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if not parsed.path.endswith("/search"):
+                    self._reply(404, {"error": f"unknown path {parsed.path}"})
+                    return
+                query = parse_qs(parsed.query).get("q", [""])[0]
+                if mock.latency:
+                    time.sleep(sample(mock.latency))
+                place = fake_place(query, mock.miss_rate)
+                with mock._lock:
+                    mock.requests += 1
+                    mock.misses += place is None
+                self._reply(200, [place] if place else [])
+
+        return Handler
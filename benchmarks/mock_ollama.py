@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""In-process stand-in for Ollama's OpenAI-compatible API used by benchmarks.
+
+Serves /v1/chat/completions (plain and tool-call responses) and /v1/embeddings
+over HTTP/1.1 keep-alive. Tool-call arguments are filled in from the requested
+schema, deterministically from a hash of the prompt. `latency` is the time one
+generation takes (seconds, or a latency.Latency distribution), plus
+`prompt_token_latency` per prompt token and `token_latency` per completion
+token; `parallel` is how many generations the server runs at once (Ollama's
+OLLAMA_NUM_PARALLEL) and further requests queue, up to `max_queue` waiting
+(OLLAMA_MAX_QUEUE) before the server answers 503. With `models` (name ->
+latency multiplier) only those models are served, each that much slower than
+the base latency, and any other model gets Ollama's 404 "not found".
+Requests, rejections, new connections and tokens are counted, and requests
+per model.
+"""
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from latency import sample
+
+DISASTER_TYPES = ["Flood", "Wildfire", "Hurricane", "Earthquake", "Tornado", "Not Specified"]
+LOCATIONS = ["Houston, Texas", "Los Angeles, California", "Sri Lanka", "Kerala, India", "Not Specified"]
+
+
+def _tokens(text):
+    # Rough token count: Ollama's tokenizers average a little over one token per word
+    return int(len(text.split()) * 1.3) + 1
+
+
+def fake_arguments(schema, prompt):
+    # Schema-shaped arguments chosen from a hash of the prompt, so repeats get the same answer
+    digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=8).digest()
+    arguments = {}
+    for index, (name, spec) in enumerate(schema.get("properties", {}).items()):
+        value = digest[index % len(digest)]
+        kind = spec.get("type")
+        if kind == "boolean":
+            arguments[name] = value % 3 != 0  # about two thirds "genuine"
+        elif kind == "integer":
+            arguments[name] = value % 11
+        elif kind == "number":
+            arguments[name] = round((value % 101) / 10, 1)
+        elif "justification" in name:
+            # About the length llama3.2 writes for a "concise justification"
+            arguments[name] = " ".join(["The tweet reports damage and disruption in the affected area."] * 4)
+        elif "location" in name:
+            arguments[name] = LOCATIONS[value % len(LOCATIONS)]
+        elif "type" in name:
+            arguments[name] = DISASTER_TYPES[value % len(DISASTER_TYPES)]
+        else:
+            arguments[name] = "Based on the tweet text."
+    return arguments
+
+
+class MockOllama:
+    def __init__(self, latency=0.0, parallel=4, token_latency=0.0, prompt_token_latency=0.0, max_queue=None,
+                 models=None):
+        self.latency = latency
+        self.models = models
+        self.token_latency = token_latency  # extra seconds per completion token
+        self.prompt_token_latency = prompt_token_latency  # extra seconds per prompt token
+        self.parallel = parallel
+        self.max_queue = max_queue
+        self.requests = 0
+        self.rejected = 0
+        self.active = 0  # generating or queued
+        self.connections = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.model_requests = {}
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(parallel)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _admit(self):
+        # False if the queue is full (the caller answers 503)
+        with self._lock:
+            if self.max_queue is not None and self.active >= self.parallel + self.max_queue:
+                self.rejected += 1
+                return False
+            self.active += 1
+            return True
+
+    def _generate(self, body):
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        prompt_tokens = _tokens(prompt)
+        tools = body.get("tools")
+        if tools:
+            function = tools[0]["function"]
+            arguments = json.dumps(fake_arguments(function["parameters"], prompt))
+            message = {
+                "role": "assistant",
+                "content": "",
+                "tool_calls": [{"id": "call_0", "type": "function",
+                                "function": {"name": function["name"], "arguments": arguments}}],
+            }
+            completion_tokens = _tokens(arguments)
+        else:
+            message = {"role": "assistant", "content": "ok"}
+            completion_tokens = 1
+        if body.get("max_tokens"):
+            completion_tokens = min(completion_tokens, body["max_tokens"])
+
+        slowdown = self.models.get(body.get("model"), 1.0) if self.models else 1.0
+        with self._slots:  # only `parallel` generations run at once
+            time.sleep(slowdown * (sample(self.latency) + self.prompt_token_latency * prompt_tokens
+                                   + self.token_latency * completion_tokens))
+        with self._lock:
+            self.active -= 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        return {
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tools else "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like Ollama
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with mock._lock:
+                    mock.connections += 1
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+                with mock._lock:
+                    mock.requests += 1
+                if self.path.endswith("/chat/completions"):
+                    model = body.get("model")
+                    with mock._lock:
+                        mock.model_requests[model] = mock.model_requests.get(model, 0) + 1
+                    if mock.models is not None and model not in mock.models:
+                        self._reply(404, {"error": f'model "{model}" not found, try pulling it first'})
+                    elif mock._admit():
+                        self._reply(200, mock._generate(body))
+                    else:
+                        self._reply(503, {"error": "server busy, please try again. maximum pending requests exceeded"})
+                elif self.path.endswith("/embeddings"):
+                    inputs = body.get("input") or []
+                    data = [{"object": "embedding", "index": i, "embedding": [0.0] * 8} for i in range(len(inputs))]
+                    self._reply(200, {"object": "list", "data": data})
+                else:
+                    self._reply(404, {"error": f"unknown path {self.path}"})
+
+        return Handler
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""In-process stand-in for the Supabase table API (PostgREST) used by benchmarks.
+
+Supports what the pipeline uses: upsert/insert (POST), select with eq/neq/gt/gte/
+lt/lte/is/in filters, order, offset and limit (GET), and filtered update (PATCH).
+Every request is counted, and an optional per-request latency (seconds, or a
+latency.Latency distribution) models the network round trip.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+from latency import sample
+
+
+def _coerce(value):
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _matches(row, column, expression):
+    op, _, raw = expression.partition(".")
+    value = row.get(column)
+    if op == "is":
+        return value is None if raw == "null" else str(value).lower() == raw
+    if op == "in":
+        options = {item.strip('"') for item in raw.strip("()").split(",")}
+        return str(value) in options
+    if value is None:
+        return op == "neq"
+    target = _coerce(raw)
+    if isinstance(target, str) or isinstance(value, str):
+        value, target = str(value), str(target)
+    return {
+        "eq": value == target,
+        "neq": value != target,
+        "gt": value > target,
+        "gte": value >= target,
+        "lt": value < target,
+        "lte": value <= target,
+    }[op]
+
+
+class MockSupabase:
+    def __init__(self, latency=0.0, reject=None, default_limit=None):
+        self.latency = latency
+        self.reject = reject  # predicate(row) -> True makes a write fail like a constraint error
+        self.default_limit = default_limit  # mimics the server's max-rows cap
+        self.tables = {}
+        self.requests = 0
+        self.rows_written = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def client(self):
+        from supabase import create_client
+        return create_client(self.url, "benchmark-key")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def table(self, name):
+        return self.tables.setdefault(name, {})
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _parse(self):
+                parsed = urlparse(self.path)
+                table = parsed.path.rsplit("/", 1)[-1]
+                params = parse_qsl(parsed.query, keep_blank_values=True)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                with mock._lock:
+                    mock.requests += 1
+                if mock.latency:
+                    time.sleep(sample(mock.latency))
+                return table, params, body
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _filtered(self, rows, params):
+                filters = [(k, v) for k, v in params if k not in ("select", "order", "limit", "offset", "on_conflict", "columns")]
+                return [row for row in rows if all(_matches(row, k, v) for k, v in filters)]
+
+            def do_POST(self):
+                table, params, body = self._parse()
+                rows = body if isinstance(body, list) else [body]
+                if mock.reject and any(mock.reject(row) for row in rows):
+                    self._reply(400, {"message": "rejected row", "code": "23514", "details": None, "hint": None})
+                    return
+                conflict = dict(params).get("on_conflict", "tweet_id")
+                with mock._lock:
+                    store = mock.table(table)
+                    for row in rows:
+                        key = str(row.get(conflict, len(store)))
+                        store[key] = {**store.get(key, {}), **row}
+                    mock.rows_written += len(rows)
+                self._reply(201, rows)
+
+            def do_GET(self):
+                table, params, _ = self._parse()
+                with mock._lock:
+                    rows = self._filtered(list(mock.table(table).values()), params)
+                options = dict(params)
+                if "order" in options:
+                    column, _, direction = options["order"].partition(".")
+                    rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=direction.startswith("desc"))
+                offset = int(options.get("offset", 0))
+                limit = int(options["limit"]) if "limit" in options else mock.default_limit
+                rows = rows[offset:offset + limit] if limit is not None else rows[offset:]
+                columns = options.get("select", "*")
+                if columns != "*":
+                    wanted = [column.strip() for column in columns.split(",")]
+                    rows = [{column: row.get(column) for column in wanted} for row in rows]
+                self._reply(200, rows)
+
+            def do_PATCH(self):
+                table, params, body = self._parse()
+                with mock._lock:
+                    rows = self._filtered(list(mock.table(table).values()), params)
+                    for row in rows:
+                        row.update(body)
+                    mock.rows_written += len(rows)
+                self._reply(200, rows)
+
+        return Handler
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import os
+
+DEFAULT_CHUNK_SIZE = int(os.getenv("SUPABASE_CHUNK_SIZE", "500"))
+
+
+# Keep the last record per conflict key: Postgres rejects an upsert that touches a row twice
+def _dedupe(records, on_conflict):
+    if not on_conflict:
+        return list(records)
+    by_key = {}
+    for record in records:
+        by_key[record.get(on_conflict)] = record
+    return list(by_key.values())
+
+
+def upsert_records(client, table, records, on_conflict="tweet_id", chunk_size=DEFAULT_CHUNK_SIZE):
+    """Upsert records in chunks, one request per chunk.
+
+    A chunk that fails is split in half and retried, down to single rows, so one
+    bad row only costs itself. Returns (rows_written, failed_records).
+    """
+    records = _dedupe(records, on_conflict)
+    written = 0
+    failed = []
+
+    def write(chunk):
+        nonlocal written
+        try:
+            query = client.table(table)
+            if on_conflict:
+                query.upsert(chunk, on_conflict=on_conflict).execute()
+            else:
+                query.upsert(chunk).execute()
+            written += len(chunk)
+        except Exception as e:
+            if len(chunk) == 1:
+                print(f"Insert failed for record {chunk[0].get(on_conflict, 'Unknown')}: {e}")
+                failed.append(chunk[0])
+                return
+            middle = len(chunk) // 2
+            write(chunk[:middle])
+            write(chunk[middle:])
+
+    for start in range(0, len(records), chunk_size):
+        write(records[start:start + chunk_size])
+
+    return written, failed
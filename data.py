@@ -1,31 +1,98 @@
 # -*- coding: utf-8 -*-
-import json
+"""Collect disaster-related Bluesky posts and store them in Supabase (or STORAGE_BACKEND).
+
+Importing this module is cheap: the storage backend, keyword matcher and
+sentiment analyzer are built on first use, and heavy libraries (pandas,
+requests, supabase) are imported inside the functions that need them. Time
+windows and output filenames are computed per run. Run `python data.py --help`
+for the command line.
+"""
+import argparse
 import os
 import re
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
-import emoji
-import pandas as pd
-import requests
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-from supabase import create_client, Client
-from dotenv import load_dotenv
+from bulk_upsert import DEFAULT_CHUNK_SIZE
+from near_dedup import NearDuplicateDetector, mark_near_duplicates
+from output_store import PartitionedWriter
+from sentiment import add_sentiment, get_scorer
+from storage import POSTS_TABLE, open_storage
+from stream import jetstream_source, polling_source, replay_source, run_pipeline
+from text_cleaning import clean_texts
+from watermarks import WatermarkStore, parse_indexed_at
 
-load_dotenv()
-SUPABASE_URL =  os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+current_dir = os.path.dirname(os.path.abspath(__file__))
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Directories for CSV and JSON (created when something is written to them)
+csv_directory = os.path.join(current_dir, "tweet_analysis_app", "public", "csv")
+json_directory = os.path.join(current_dir, "tweet_analysis_app", "public", "json")
 
-current_dir = os.path.dirname(os.path.abspath(__file__))
+# Date/hour-partitioned NDJSON output: "raw" holds records as fetched, "posts" the cleaned records
+output_directory = os.getenv("BLUESKY_OUTPUT_DIR", os.path.join(current_dir, "tweet_analysis_app", "public", "data"))
+OUTPUT_COMPRESS = os.getenv("BLUESKY_OUTPUT_COMPRESS", "0") == "1"
+
+# Data directories dictionary for easy reference
+data_dirs = {
+    'csv': csv_directory,
+    'json': json_directory,
+    'output': output_directory,
+}
+
+# Bluesky search endpoint (overridable for local testing)
+BLUESKY_SEARCH_URL = os.getenv("BLUESKY_SEARCH_URL", "https://api.bsky.app/xrpc/app.bsky.feed.searchposts")
+
+# Search pagination limits and per-keyword watermark state
+SEARCH_PAGE_SIZE = 100
+MAX_SEARCH_PAGES = int(os.getenv("BLUESKY_MAX_PAGES", "50"))
+SEARCH_WINDOW = timedelta(days=1)
+watermark_filename = os.getenv("BLUESKY_WATERMARK_FILE", os.path.join(current_dir, "state", "watermarks.json"))
+
+# bluesky_api_data columns stored as NULL rather than "" when empty
+NULLABLE_COLUMNS = {"duplicate_of"}
+
+_supabase = None
+_storage = None
+_keywords = None
+_keyword_matcher = None
+_init_lock = threading.Lock()
+
+
+# Supabase client, created on first use
+def get_supabase():
+    global _supabase
+    with _init_lock:
+        if _supabase is None:
+            from dotenv import load_dotenv
+            from supabase import create_client
+
+            load_dotenv()
+            SUPABASE_URL = os.getenv("SUPABASE_URL")
+            SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+            if not SUPABASE_URL or not SUPABASE_KEY:
+                raise ValueError(
+                    "Supabase credentials not found. Please create a .env file with "
+                    "SUPABASE_URL and SUPABASE_KEY variables or set them as environment variables."
+                )
+            _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        return _supabase
+
+
+# Storage backend for bluesky_api_data (STORAGE_BACKEND: Supabase or a local SQLite file), opened on first use
+def get_storage():
+    global _storage
+    if _storage is None:
+        storage = open_storage(get_supabase)  # outside the lock: get_supabase takes it
+        with _init_lock:
+            if _storage is None:
+                _storage = storage
+    return _storage
 
-# Load NLP tools
-analyzer = SentimentIntensityAnalyzer()
 
 # Load External Disaster Keyword List
 def load_disaster_words(filename="disaster_words.txt"):
-    current_dir = os.path.dirname(os.path.abspath(__file__))
     file_path = os.path.join(current_dir, filename)
     try:
         with open(file_path, "r", encoding="utf-8") as file:
@@ -39,7 +106,6 @@ def load_disaster_words(filename="disaster_words.txt"):
 
 # Load External Crisis Word List
 def load_crisis_words(filename="crisis_words.txt"):
-    current_dir = os.path.dirname(os.path.abspath(__file__))
     file_path = os.path.join(current_dir, filename)
     try:
         with open(file_path, "r", encoding="utf-8") as file:
@@ -51,191 +117,420 @@ def load_crisis_words(filename="crisis_words.txt"):
         return []
 
 
-disaster_keywords = load_disaster_words()
-crisis_keywords = load_crisis_words()
-
-# Directories for CSV and JSON 
-csv_directory = os.path.join(current_dir, "tweet_analysis_app", "public", "csv")
-json_directory = os.path.join(current_dir, "tweet_analysis_app", "public", "json")
+# Both keyword lists, loaded on first use: (disaster_keywords, crisis_keywords)
+def get_keywords():
+    global _keywords
+    with _init_lock:
+        if _keywords is None:
+            _keywords = (load_disaster_words(), load_crisis_words())
+        return _keywords
+
+
+# Compile both keyword lists into one matcher so each post is scanned once
+def get_keyword_matcher():
+    global _keyword_matcher
+    if _keyword_matcher is None:
+        from keyword_matcher import KeywordMatcher
+
+        disaster_keywords, crisis_keywords = get_keywords()
+        matcher = KeywordMatcher({"disaster": disaster_keywords, "crisis": crisis_keywords})
+        with _init_lock:
+            if _keyword_matcher is None:
+                _keyword_matcher = matcher
+    return _keyword_matcher
+
+
+# Start of the search window for a run that starts now
+def get_cutoff_time():
+    return datetime.utcnow() - SEARCH_WINDOW
+
+
+# Output filenames (MM-DD-YYYY) for a run on the given day
+def output_filenames(day=None):
+    current_date = (day or datetime.now()).strftime("%m-%d-%Y")
+    csv_filename = os.path.join(csv_directory, f"bluesky_disaster_data_{current_date}.csv")
+    json_filename = os.path.join(json_directory, f"bluesky_raw_data_{current_date}.json")
+    return csv_filename, json_filename
+
+
+# Lazy module attributes kept for callers that used the old import-time globals
+def __getattr__(name):
+    if name == "supabase":
+        return get_supabase()
+    if name == "disaster_keywords":
+        return get_keywords()[0]
+    if name == "crisis_keywords":
+        return get_keywords()[1]
+    if name == "keyword_matcher":
+        return get_keyword_matcher()
+    if name == "cutoff_time":
+        return get_cutoff_time()
+    if name in ("csv_filename", "json_filename"):
+        return output_filenames()[0 if name == "csv_filename" else 1]
+    if name in ("clean_text", "isEnglish"):
+        import text_cleaning
+        return getattr(text_cleaning, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Convert a search result (or Jetstream post) into an output record without keyword fields
+def post_to_record(post, post_timestamp=None):
+    author = post.get("author", {}).get("handle", "Unknown")
+    text = post.get("record", {}).get("text", "No content").lower()
+    raw_timestamp = post.get("indexedAt", "Unknown")
+
+    if post_timestamp is None:
+        post_timestamp = parse_indexed_at(raw_timestamp)
+    formatted_timestamp = post_timestamp.strftime("%Y-%m-%d %H:%M:%S") if post_timestamp else raw_timestamp
+
+    hashtags = " ".join([word for word in text.split() if word.startswith("#")])
+
+    # Extract tweet ID
+    post_uri = post.get("uri", "")
+    tweet_id = re.sub(r'\D', '', post_uri)[-20:]
+
+    post_url = f"https://bsky.app/profile/{author}/post/{post_uri.split('/')[-1]}"
+
+    return {
+        "tweet_id": tweet_id,
+        "timestamp": formatted_timestamp,
+        "tweet_text": text,
+        "matched_disaster_keywords": "None",
+        "matched_crisis_keywords": "None",
+        "hashtags": hashtags,
+        "post_url": post_url,
+        "sentiment_score": None,  # filled in by add_sentiment after dedup
+    }
+
+
+# Fill in the matched keyword fields; returns None if the record matches no keywords
+def match_keywords(record):
+    # Match keywords (whole words only, one pass for both lists)
+    matches = get_keyword_matcher().match(record["tweet_text"])
+    matched_disaster_words = matches["disaster"]
+    matched_crisis_words = matches["crisis"]
+
+    # Exclude tweets with no matched keywords
+    if not matched_disaster_words and not matched_crisis_words:
+        return None
 
-# Ensure directories exist
-for directory in [csv_directory, json_directory]:
-    os.makedirs(directory, exist_ok=True)
+    record["matched_disaster_keywords"] = ", ".join(matched_disaster_words) if matched_disaster_words else "None"
+    record["matched_crisis_keywords"] = ", ".join(matched_crisis_words) if matched_crisis_words else "None"
+    return record
 
-# Generate filenames with MM-DD-YYYY format
-current_date = datetime.now().strftime("%m-%d-%Y")
-csv_filename = os.path.join(csv_directory, f"bluesky_disaster_data_{current_date}.csv")
-json_filename = os.path.join(json_directory, f"bluesky_raw_data_{current_date}.json")
 
-# Calculate 24-hour time window
-cutoff_time = datetime.utcnow() - timedelta(days=1)
+# Build one output record from a search result, or None if it matches no keywords
+def build_post_record(post, post_timestamp=None):
+    return match_keywords(post_to_record(post, post_timestamp))
 
-# Data directories dictionary for easy reference
-data_dirs = {
-    'csv': csv_directory,
-    'json': json_directory,
-}
-    
-# Function to check if the string contains only English characters
-def isEnglish(s):
-    try:
-        s.encode(encoding='utf-8').decode('ascii')
-    except UnicodeDecodeError:
-        return False
-    else:
-        return True
 
-# Function to clean tweet text
-def clean_text(text):
-    try:
-        # First, check if the text is English using the isEnglish function
-        if not isEnglish(text):
-            # If it's not English, remove non-English characters
-            text = ''.join([char for char in text if char.isascii()])  # Remove non-ASCII characters
-
-        # Convert emojis to text
-        text = emoji.demojize(text, delimiters=("", " "))
-
-        # Remove URLs, mentions, and special characters
-        text = re.sub(r"http\S+|www\S+|https\S+", '', text, flags=re.MULTILINE)  # URLs
-        text = re.sub(r'@\w+', '', text)  # Mentions
-        text = re.sub(r'#\w+', '', text)  # Hashtags
-        text = re.sub(r'[^\w\s]', '', text)  # Special characters
-
-        # Standardize text: Lowercase, strip whitespace
-        text = text.lower().strip()
-
-        return text if text else None
-    except Exception as e:
-        print(f"Error cleaning text: {e}")
-        return None
+# Yield (post, timestamp) for one keyword's search results, newest first.
+# Walks the `latest`-sorted cursor pages until it reaches a post at or below the
+# keyword's watermark (or outside the 24-hour window on the first run). The
+# watermark only advances once every new page has been read: if MAX_SEARCH_PAGES
+# runs out first, it stays put so the next run reads the gap again.
+def iter_search_posts(keyword, fetcher=None, watermarks=None, cutoff_time=None):
+    import requests
 
+    url = BLUESKY_SEARCH_URL
+    cutoff_time = cutoff_time or get_cutoff_time()
+    watermark = watermarks.get(keyword) if watermarks is not None else None
+    params = {"q": keyword, "sort": "latest", "limit": SEARCH_PAGE_SIZE}
+    newest_seen = None
 
-# Function to fetch Bluesky posts
-def fetch_bluesky_posts(keyword):
-    url = f"https://api.bsky.app/xrpc/app.bsky.feed.searchposts?q={keyword}"
-    
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-
-        posts = data.get("posts", [])
-        results = []
-        
-        for post in posts:
-            author = post.get("author", {}).get("handle", "Unknown")
-            text = post.get("record", {}).get("text", "No content").lower()
-            raw_timestamp = post.get("indexedAt", "Unknown")
-            
-            # Convert and filter by timestamp (last 24 hours)
-            try:
-                post_timestamp = datetime.strptime(raw_timestamp, "%Y-%m-%dT%H:%M:%S.%fZ")
-                if post_timestamp < cutoff_time:
-                    continue  # Skip posts older than 24 hours
-                formatted_timestamp = post_timestamp.strftime("%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                formatted_timestamp = raw_timestamp
-
-            hashtags = " ".join([word for word in text.split() if word.startswith("#")])
-
-            # Extract tweet ID
-            post_uri = post.get("uri", "")
-            tweet_id = re.sub(r'\D', '', post_uri)[-20:]
-
-            post_url = f"https://bsky.app/profile/{author}/post/{post_uri.split('/')[-1]}"
-
-            # Extract sentiment score
-            sentiment_score = analyzer.polarity_scores(text)["compound"]
-
-            # Match keywords
-            matched_disaster_words = [word for word in disaster_keywords if word in text]
-            matched_crisis_words = [word for word in crisis_keywords if word in text]
-
-            # Exclude tweets with no matched keywords
-            if not matched_disaster_words and not matched_crisis_words:
-                continue
-
-            results.append({
-                "tweet_id": tweet_id,
-                "timestamp": formatted_timestamp,
-                "tweet_text": text,
-                "matched_disaster_keywords": ", ".join(matched_disaster_words) if matched_disaster_words else "None",
-                "matched_crisis_keywords": ", ".join(matched_crisis_words) if matched_crisis_words else "None",
-                "hashtags": hashtags,
-                "post_url": post_url,
-                "sentiment_score": sentiment_score,
-            })
-
-        return results
+        for _ in range(MAX_SEARCH_PAGES):
+            if fetcher is None:
+                response = requests.get(url, params=params, timeout=10)
+                response.raise_for_status()
+                data = response.json()
+            else:
+                data = fetcher.get_json(url, params=params)
+
+            posts = data.get("posts", [])
+            reached_seen = False
+
+            for post in posts:
+                # Filter by timestamp (last 24 hours, and newer than the watermark)
+                post_timestamp = parse_indexed_at(post.get("indexedAt"))
+                if post_timestamp is not None:
+                    if newest_seen is None or post_timestamp > newest_seen:
+                        newest_seen = post_timestamp
+                    if post_timestamp < cutoff_time or (watermark is not None and post_timestamp <= watermark):
+                        reached_seen = True
+                        continue
+
+                yield post, post_timestamp
+
+            cursor = data.get("cursor")
+            if reached_seen or not posts or not cursor:
+                break
+            params["cursor"] = cursor
+        else:
+            print(f"Stopped '{keyword}' after {MAX_SEARCH_PAGES} pages without reaching "
+                  f"{watermark or cutoff_time}; keeping its watermark so the next run covers the gap")
+            return
 
     except requests.exceptions.RequestException as e:
+        # Keep what was fetched but leave the watermark alone so the next run retries the gap
         print(f"Error fetching data: {e}")
-        return []
+        return
 
+    if watermarks is not None and newest_seen is not None:
+        watermarks.update(keyword, newest_seen)
 
-# Function to save data to CSV and JSON
-def save_data(data):
+
+# Function to fetch Bluesky posts
+def fetch_bluesky_posts(keyword, fetcher=None, watermarks=None, cutoff_time=None):
+    results = []
+    for post, post_timestamp in iter_search_posts(keyword, fetcher, watermarks, cutoff_time):
+        record = build_post_record(post, post_timestamp)
+        if record is not None:
+            results.append(record)
+    return results
+
+
+# Function to save data to the partitioned output
+# Raw records go to the "raw" dataset and cleaned ones to "posts"; the files are appended
+# to rather than rewritten. Records are cleaned, written and passed to `sink` (e.g.
+# upload_records) `batch_size` at a time, so besides the caller's list (sorted in place)
+# only one batch of cleaned records and the near-duplicate index are held. Returns the
+# number of cleaned records saved.
+def save_data(data, compress=OUTPUT_COMPRESS, root=None, sink=None, batch_size=DEFAULT_CHUNK_SIZE):
     if not data:
         print("No data to save.")
-        return
-
-    df = pd.DataFrame(data)
-
-    # Apply cleaning only for CSV, not JSON
-    df['tweet_text'] = df['tweet_text'].apply(clean_text)
+        return 0
+
+    root = root or output_directory
+    # Earliest first, so the canonical post of a near-duplicate cluster is the original
+    data.sort(key=lambda record: str(record.get("timestamp", "")))
+
+    def cleaned_records():
+        for start in range(0, len(data), batch_size):
+            records = data[start:start + batch_size]
+            for record, text in zip(records, clean_texts([record["tweet_text"] for record in records])):
+                raw_writer.write(record)  # raw data, no cleaning
+                if text is None:
+                    continue  # invalid or non-English data
+                yield dict(record, tweet_text=text)
+
+    batch = []
+    with PartitionedWriter(root, "raw", compress) as raw_writer, \
+            PartitionedWriter(root, "posts", compress) as posts_writer:
+        for record in mark_near_duplicates(cleaned_records(), NearDuplicateDetector()):
+            posts_writer.write(record)
+            batch.append(record)
+            if len(batch) >= batch_size:
+                if sink is not None:
+                    sink(batch)
+                batch = []
+        if batch and sink is not None:
+            sink(batch)
+
+    print(f"Saved {raw_writer.records_written} raw and {posts_writer.records_written} cleaned records to {root}")
+    return posts_writer.records_written
+
+# Upsert in-memory records into the storage backend in chunks
+def upload_records(records, chunk_size=DEFAULT_CHUNK_SIZE):
+    import pandas as pd
+
+    # Missing values are stored as "" except in columns where NULL carries meaning
+    clean_records = [
+        {k: ((None if k in NULLABLE_COLUMNS else "") if v is None or pd.isna(v) else v) for k, v in record.items()}
+        for record in records
+    ]
+    written, failed = get_storage().upsert(POSTS_TABLE, clean_records, on_conflict="tweet_id", chunk_size=chunk_size)
+    print(f"Uploaded {written} records to storage ({len(failed)} failed)")
+    return written, failed
+
+# The records of `records` that upload_records reported as failed (it returns cleaned copies)
+def failed_records(records, failed):
+    failed_ids = {str(record.get("tweet_id")) for record in failed}
+    return [record for record in records if str(record.get("tweet_id")) in failed_ids]
+
+# Upload a CSV file to the storage backend
+def upload_to_supabase(csv_path):
+    import pandas as pd
 
-    # Drop rows with None (invalid or non-English data)
-    df = df.dropna(subset=['tweet_text'])
+    df = pd.read_csv(csv_path)
+    return upload_records(df.to_dict(orient="records"))
 
-    if os.path.exists(csv_filename):
-        df.to_csv(csv_filename, mode='a', index=False, header=False)
-    else:
-        df.to_csv(csv_filename, mode='w', index=False)
+# Fetch every keyword concurrently; pacing comes from the fetcher's token bucket, not sleeps.
+# With `found_by`, maps each tweet_id to the keywords whose search returned it.
+def fetch_all_keywords(keywords, fetcher=None, watermarks=None, found_by=None):
+    from fetcher import BlueskyFetcher
 
-    # Save to CSV
-    df.to_csv(csv_filename, mode='w', index=False)
-    print(f"Data saved to CSV: {csv_filename}")
+    fetcher = fetcher or BlueskyFetcher()
+    all_data_dict = {}
+    start = time.monotonic()
+    cutoff_time = get_cutoff_time()  # one window for the whole run
 
-    # Save to JSON (raw data, no cleaning)
-    with open(json_filename, "w", encoding="utf-8") as json_file:
-        json.dump(data, json_file, indent=4)
-    print(f"Data saved to JSON: {json_filename}")
+    def fetch(keyword, fetcher):
+        return fetch_bluesky_posts(keyword, fetcher, watermarks, cutoff_time)
 
-# Upload CSV file to Supabase 
-def upload_to_supabase(csv_path):
-    df = pd.read_csv(csv_path)
-    df = df.fillna("")
+    try:
+        for keyword, posts_data in fetcher.map(fetch, keywords):
+            print(f"Fetched {len(posts_data)} posts for keyword: {keyword}")
+            for post in posts_data:
+                all_data_dict[post['tweet_id']] = post  # Deduplicate by tweet_id
+                if found_by is not None:
+                    found_by.setdefault(str(post['tweet_id']), set()).add(keyword)
+    finally:
+        fetcher.close()
+
+    print(f"Fetched {len(keywords)} keywords in {time.monotonic() - start:.1f}s")
+    return list(all_data_dict.values())
+
+# ---------------------------- Streaming daemon mode ----------------------------
+
+# Keyword-match stage: turn posts (or replayed records) into records, drop repeats and non-matches
+def keyword_stage(items, from_post=True, recent_ids=100000):
+    seen = OrderedDict()
+    for item in items:
+        record = post_to_record(item) if from_post else dict(item)
+        tweet_id = record["tweet_id"]
+        if tweet_id in seen:
+            continue
+        seen[tweet_id] = True
+        if len(seen) > recent_ids:
+            seen.popitem(last=False)
+        if match_keywords(record) is not None:
+            yield record
+
+
+# Cleaning stage: same cleaning as save_data; the raw text rides along for sentiment
+def clean_stage(records):
+    for record in records:
+        cleaned = clean_texts([record["tweet_text"]])[0]
+        if cleaned is None:
+            continue  # invalid or non-English data
+        record["_raw_text"] = record["tweet_text"]
+        record["tweet_text"] = cleaned
+        yield record
 
-    records = df.to_dict(orient="records")
 
+# Sentiment stage: scored on the raw text, as in the batch path
+def sentiment_stage(records, scorer=None):
+    scorer = scorer or get_scorer()
     for record in records:
-        try:
-            clean_record = {k: ("" if pd.isna(v) else v) for k, v in record.items()}
-            response = supabase.table("bluesky_api_data").upsert(clean_record, on_conflict="tweet_id").execute()
-
-            if response.error:
-                print(f"Insert failed for record {record.get('tweet_id', 'Unknown')}: {response.error}")
-        except Exception as e:
-            print(f"Insert failed for record {record.get('tweet_id', 'Unknown')}: {e}")
+        record["sentiment_score"] = scorer.score(record.pop("_raw_text"))
+        yield record
+
+
+def run_daemon(source_name="jetstream", sink_name="supabase", replay_glob=None,
+               poll_interval=300, queue_size=1000, batch_size=200, flush_interval=5.0):
+    stop = threading.Event()
+
+    if source_name == "jetstream":
+        source = jetstream_source(stop=stop)
+    elif source_name == "poll":
+        from fetcher import BlueskyFetcher
+
+        fetcher = BlueskyFetcher()
+        # Searches advance search_marks as they finish; a keyword's mark is only copied into the
+        # saved watermarks once the posts of that search have been stored. If one of them fails,
+        # the keyword's saved watermark is held until restart, so the next start searches them again.
+        search_marks = WatermarkStore(watermark_filename)
+        watermarks = WatermarkStore(watermark_filename)
+        held = set()
+
+        def searched(keyword):
+            mark = search_marks.get(keyword)
+
+            def commit(stored):
+                if not stored and keyword not in held:
+                    held.add(keyword)
+                    print(f"Posts found for '{keyword}' failed to store; holding its watermark until restart")
+                if mark is not None and keyword not in held:
+                    watermarks.update(keyword, mark)
+                    watermarks.save()
+            return commit
+
+        source = polling_source(
+            lambda keyword: iter_search_posts(keyword, fetcher, search_marks),
+            get_keywords()[0], interval=poll_interval, stop=stop, on_searched=searched,
+        )
+    elif source_name == "replay":
+        source = replay_source(replay_glob or os.path.join(json_directory, "bluesky_raw_data_*.json"))
+    else:
+        raise ValueError(f"Unknown source: {source_name}")
+
+    writer = PartitionedWriter(output_directory, "posts", OUTPUT_COMPRESS) if sink_name in ("supabase", "files") else None
+
+    def sink(batch):
+        if writer is not None:
+            writer.write_many(batch)
+        if sink_name == "supabase":
+            _, failed = upload_records(batch)
+            return failed_records(batch, failed)
+
+    stages = [
+        ("match", lambda items: keyword_stage(items, from_post=source_name != "replay")),
+        ("clean", clean_stage),
+        ("dedup", lambda records: mark_near_duplicates(records, NearDuplicateDetector())),
+        ("sentiment", sentiment_stage),
+    ]
+    print(f"Starting daemon: source={source_name}, sink={sink_name}")
+    try:
+        stats = run_pipeline(source, stages, sink, queue_size=queue_size, batch_size=batch_size,
+                             flush_interval=flush_interval, stop=stop)
+    finally:
+        if writer is not None:
+            writer.close()
+    print(f"Daemon stopped: {stats.summary()}")
+    return stats
 
-# Main execution
-if __name__ == "__main__":
-    all_data_dict = {}
 
-    for keyword in disaster_keywords:
-        print(f"Searching for posts with keyword: {keyword}")
-        posts_data = fetch_bluesky_posts(keyword)
+def run_batch():
+    # Searches advance search_marks; a keyword's mark is only saved once all of its posts are stored
+    search_marks = WatermarkStore(watermark_filename)
+    watermarks = WatermarkStore(watermark_filename)
+    disaster_keywords, _ = get_keywords()
+    found_by = {}
+    all_data = fetch_all_keywords(disaster_keywords, watermarks=search_marks, found_by=found_by)
 
-        for post in posts_data:
-            all_data_dict[post['tweet_id']] = post  # Deduplicate by tweet_id
+    # Score sentiment once per surviving post (identical texts hit the cache)
+    add_sentiment(all_data)
 
-        time.sleep(1)
+    failed_ids = set()
 
-    all_data = list(all_data_dict.values())
+    def upload(batch):
+        _, failed = upload_records(batch)
+        failed_ids.update(str(record.get("tweet_id")) for record in failed)
 
     if all_data:
-        save_data(all_data)
-        upload_to_supabase(csv_filename)
+        save_data(all_data, sink=upload)
     else:
         print("No disaster-related posts were found.")
+
+    held = {keyword for tweet_id in failed_ids for keyword in found_by.get(tweet_id, ())}
+    for keyword in disaster_keywords:
+        mark = search_marks.get(keyword)
+        if mark is not None and keyword not in held:
+            watermarks.update(keyword, mark)
+    if held:
+        print(f"Keeping the watermarks of {len(held)} keywords with posts that failed to upload: {', '.join(sorted(held))}")
+    watermarks.save()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Collect disaster-related Bluesky posts.")
+    parser.add_argument("--daemon", action="store_true", help="consume posts continuously instead of one batch run")
+    parser.add_argument("--source", choices=["jetstream", "poll", "replay"], default="jetstream")
+    parser.add_argument("--sink", choices=["supabase", "files", "null"], default="supabase",
+                        help="supabase (or STORAGE_BACKEND) also appends to the partitioned output; "
+                             "files only writes the output")
+    parser.add_argument("--replay-glob", help="raw JSON dumps or NDJSON partitions to replay "
+                                              "(default: tweet_analysis_app/public/json)")
+    parser.add_argument("--poll-interval", type=float, default=300, help="seconds between keyword polls")
+    args = parser.parse_args(argv)
+
+    if args.daemon:
+        run_daemon(args.source, args.sink, args.replay_glob, args.poll_interval)
+    else:
+        run_batch()
+
+
+# Main execution
+if __name__ == "__main__":
+    main()
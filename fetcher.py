@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Defaults stay under the public AppView limit (3000 requests / 5 minutes per IP)
+DEFAULT_RATE = float(os.getenv("BLUESKY_RATE_LIMIT", "5"))
+DEFAULT_BURST = int(os.getenv("BLUESKY_BURST", "10"))
+DEFAULT_WORKERS = int(os.getenv("BLUESKY_MAX_WORKERS", "8"))
+DEFAULT_TIMEOUT = float(os.getenv("BLUESKY_TIMEOUT", "10"))
+DEFAULT_RETRIES = int(os.getenv("BLUESKY_MAX_RETRIES", "3"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `capacity` banked."""
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        # Block until `tokens` are available, then consume them
+        if tokens > self.capacity:
+            raise ValueError(f"cannot acquire {tokens} tokens from a bucket holding at most {self.capacity}")
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Keep-alive session whose connection pool matches the number of worker threads
+def build_session(pool_size=DEFAULT_WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": "BlueskyDisasterAnalysis/1.0"})
+    return session
+
+
+class BlueskyFetcher:
+    """Rate-limited, retrying HTTP client that keeps many requests in flight."""
+
+    def __init__(
+        self,
+        rate=DEFAULT_RATE,
+        burst=DEFAULT_BURST,
+        max_workers=DEFAULT_WORKERS,
+        timeout=DEFAULT_TIMEOUT,
+        max_retries=DEFAULT_RETRIES,
+        backoff=0.5,
+        session=None,
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = session or build_session(max_workers)
+
+    def get_json(self, url, params=None):
+        # Every attempt (including retries) spends a token, so retries cannot exceed the limit
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                    delay = self._retry_delay(attempt, response.headers.get("Retry-After"))
+                    print(f"HTTP {response.status_code} for {url}, retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                response.raise_for_status()
+                return response.json()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt)
+                print(f"{type(e).__name__} for {url}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    def map(self, fn, items):
+        # Run fn(item, self) concurrently and yield (item, result) pairs as they complete
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(fn, item, self): item for item in items}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def close(self):
+        self.session.close()
+
+    def _retry_delay(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        # Exponential backoff with full jitter
+        return random.uniform(0, self.backoff * (2 ** attempt))
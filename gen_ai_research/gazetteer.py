@@ -0,0 +1,264 @@
+"""Offline place-name index over a GeoNames dump, consulted before Nominatim.
+
+Download a cities file (cities15000.txt, or cities1000.txt / a country file
+for smaller places) with admin1CodesASCII.txt and countryInfo.txt from
+https://download.geonames.org/export/dump/ into state/gazetteer/. Names are
+keyed with geocache.normalize_location, so "Houston, TX." and "houston, texas"
+resolve alike. Ambiguous names go to the most populous place, unless the
+location's qualifiers ("Paris, Texas", "London, Ontario, Canada") name the
+admin region or country of a less populous one.
+
+    python gen_ai_research/gazetteer.py "Houston, TX" "Kerala, India"
+"""
+from __future__ import annotations
+import argparse
+import math
+import os
+import time
+from array import array
+from bisect import bisect_left
+
+from geocache import normalize_location
+
+GAZETTEER_FILE = os.getenv(
+    "GAZETTEER_FILE",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "state",
+        "gazetteer",
+        "cities15000.txt",
+    ),
+)
+# Region names, read from next to GAZETTEER_FILE unless set
+GAZETTEER_ADMIN1_FILE = os.getenv("GAZETTEER_ADMIN1_FILE", "")
+GAZETTEER_COUNTRY_FILE = os.getenv("GAZETTEER_COUNTRY_FILE", "")
+
+# GeoNames feature codes kept from the dump besides populated places (class P)
+ADMIN1_CODES = {"ADM1"}
+COUNTRY_CODES = {"PCL", "PCLD", "PCLF", "PCLI", "PCLIX", "PCLS"}
+# Shorter alternate names are mostly codes (airports, abbreviations) that collide with other places
+MIN_ALTERNATE_LENGTH = 4
+
+
+def _region_names(path: str, name_columns: tuple[int, ...], code_column: int = 0) -> dict[str, list[str]]:
+    # {"US.TX": ["Texas"], "US": ["United States"]} from admin1CodesASCII.txt or countryInfo.txt
+    names = {}
+    with open(path, encoding="utf-8") as region_file:
+        for line in region_file:
+            if line.startswith("#") or not line.strip():
+                continue
+            fields = line.rstrip("\n").split("\t")
+            names[fields[code_column]] = [fields[column] for column in name_columns if fields[column]]
+    return names
+
+
+def _centroid(points: list[tuple[float, float, int]]) -> tuple[float, float]:
+    # Population-weighted centre of (latitude, longitude, population); longitudes averaged on the circle
+    weights = [max(population, 1) for _, _, population in points]
+    total = sum(weights)
+    latitude = sum(point[0] * weight for point, weight in zip(points, weights)) / total
+    x = sum(math.cos(math.radians(point[1])) * weight for point, weight in zip(points, weights))
+    y = sum(math.sin(math.radians(point[1])) * weight for point, weight in zip(points, weights))
+    return latitude, math.degrees(math.atan2(y, x))
+
+
+class Gazetteer:
+    """Sorted array of normalised place names, each pointing at its candidate places.
+
+    `_names` is sorted and unique; the places of `_names[i]` are
+    `_places[_starts[i]:_starts[i + 1]]`, primary names before alternate names
+    and each group by descending population. Places are rows of the parallel
+    `_latitudes`, `_longitudes`, `_populations` and `_regions` arrays, where a
+    region is an index into `_region_codes` ("US.TX" for a city or state,
+    "US" for a country). Admin regions and countries are places too, at their
+    GeoNames coordinates or, if the dump has none, the population-weighted
+    centre of their cities. `hits` and `misses` count `resolve` calls.
+    """
+
+    def __init__(self, path: str = GAZETTEER_FILE, admin1_path: str = "", country_path: str = "") -> None:
+        directory = os.path.dirname(os.path.abspath(path))
+        admin1_path = admin1_path or GAZETTEER_ADMIN1_FILE or os.path.join(directory, "admin1CodesASCII.txt")
+        country_path = country_path or GAZETTEER_COUNTRY_FILE or os.path.join(directory, "countryInfo.txt")
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._latitudes = array("f")
+        self._longitudes = array("f")
+        self._populations = array("q")
+        self._regions = array("i")
+        self._region_codes: list[str] = []
+        self._region_ids: dict[str, int] = {}
+        # Qualifier ("texas", "united states") -> region codes it can mean
+        self._qualifiers: dict[str, set[str]] = {}
+        self._normalized: dict[str, str] = {}  # while building: many places share names
+
+        admin1_names = _region_names(admin1_path, (1, 2)) if os.path.exists(admin1_path) else {}
+        country_names = _region_names(country_path, (4,)) if os.path.exists(country_path) else {}
+        country_populations = {}
+        if os.path.exists(country_path):
+            with open(country_path, encoding="utf-8") as country_file:
+                for line in country_file:
+                    if not line.startswith("#") and line.strip():
+                        fields = line.split("\t")
+                        country_populations[fields[0]] = int(fields[7] or 0)
+
+        entries = []  # (name, is_alternate, -population, place)
+        members: dict[str, list[tuple[float, float, int]]] = {}
+        features: dict[str, tuple[float, float, int, list[str]]] = {}
+        with open(path, encoding="utf-8") as dump:
+            for line in dump:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) < 15:
+                    continue
+                feature_class, feature_code, country = fields[6], fields[7], fields[8]
+                latitude, longitude, population = float(fields[4]), float(fields[5]), int(fields[14] or 0)
+                region = f"{country}.{fields[10]}" if fields[10] else country
+                names = [fields[1], fields[2]] + [
+                    name for name in fields[3].split(",") if name.isascii() and len(name) >= MIN_ALTERNATE_LENGTH
+                ]
+                if feature_class == "A" and feature_code in ADMIN1_CODES | COUNTRY_CODES:
+                    code = country if feature_code in COUNTRY_CODES else region
+                    features[code] = (latitude, longitude, population, names)
+                    continue
+                if feature_class != "P":
+                    continue
+                place = self._add_place(latitude, longitude, population, region)
+                self._add_names(entries, names, population, place)
+                members.setdefault(region, []).append((latitude, longitude, population))
+                if region != country:
+                    members.setdefault(country, []).append((latitude, longitude, population))
+
+        self._first_region = len(self._latitudes)
+        for code in sorted(set(members) | set(features)):
+            if code in features:
+                latitude, longitude, population, names = features[code]
+            else:
+                latitude, longitude = _centroid(members[code])
+                population = country_populations.get(code) or sum(point[2] for point in members[code])
+                names = []
+            names = (admin1_names.get(code) or country_names.get(code) or []) + names
+            if not names:
+                continue
+            if not population:
+                population = country_populations.get(code) or sum(point[2] for point in members.get(code, []))
+            place = self._add_place(latitude, longitude, population, code)
+            self._add_names(entries, names, population, place)
+            for name in names:
+                key = normalize_location(name)
+                if key:
+                    self._qualifiers.setdefault(key, set()).add(code)
+
+        entries.sort()
+        self._names: list[str] = []
+        self._starts = array("i")
+        self._places = array("i")
+        for name, _, _, place in entries:
+            if not self._names or self._names[-1] != name:
+                self._names.append(name)
+                self._starts.append(len(self._places))
+            self._places.append(place)
+        self._starts.append(len(self._places))
+        del self._normalized
+
+    def _add_place(self, latitude: float, longitude: float, population: int, region: str) -> int:
+        if region not in self._region_ids:
+            self._region_ids[region] = len(self._region_codes)
+            self._region_codes.append(region)
+        self._latitudes.append(latitude)
+        self._longitudes.append(longitude)
+        self._populations.append(population)
+        self._regions.append(self._region_ids[region])
+        return len(self._latitudes) - 1
+
+    def _add_names(self, entries: list, names: list[str], population: int, place: int) -> None:
+        keys = {}
+        for rank, name in enumerate(names):
+            key = self._normalized.get(name)
+            if key is None:
+                key = self._normalized[name] = normalize_location(name)
+            if key and key not in keys:
+                keys[key] = rank >= 2  # name and asciiname are primary, the rest alternate
+        for key, is_alternate in keys.items():
+            entries.append((key, is_alternate, -population, place))
+
+    def candidates(self, name: str) -> array:
+        # Places called `name` (already normalised), best first
+        index = bisect_left(self._names, name)
+        if index == len(self._names) or self._names[index] != name:
+            return self._places[0:0]
+        return self._places[self._starts[index]:self._starts[index + 1]]
+
+    def _pick(self, candidates: array, qualifiers: list[str]) -> int | None:
+        # The candidate inside the most qualifying regions, or the first; None if qualifiers all disagree.
+        # A region does not qualify itself: "New York, NY" is the city, not the state.
+        known = [self._qualifiers[qualifier] for qualifier in qualifiers if qualifier in self._qualifiers]
+        if not known:
+            return candidates[0]
+        best, best_score = None, 0
+        for place in candidates:
+            region = self._region_codes[self._regions[place]]
+            country = region.split(".")[0]
+            is_region = place >= self._first_region
+            score = sum(
+                1 for codes in known
+                if (region in codes and not is_region) or (country in codes and country != region)
+            )
+            if score > best_score:
+                best, best_score = place, score
+        return best
+
+    def resolve(self, location: str) -> tuple[float, float] | None:
+        """(latitude, longitude) of an LLM-extracted location, or None if the index cannot place it.
+
+        The longest leading run of parts that names a place is the place; the
+        remaining parts qualify it ("houston" in "houston, texas, united states").
+        """
+        parts = normalize_location(location).split(", ")
+        for count in range(len(parts), 0, -1):
+            candidates = self.candidates(", ".join(parts[:count]))
+            if len(candidates):
+                place = self._pick(candidates, parts[count:])
+                if place is None:
+                    break
+                self.hits += 1
+                return round(self._latitudes[place], 5), round(self._longitudes[place], 5)
+        self.misses += 1
+        return None
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "names": len(self._names),
+            "places": len(self._latitudes),
+        }
+
+
+def load_gazetteer(path: str = GAZETTEER_FILE) -> Gazetteer | None:
+    # The index of a GeoNames dump, or None (every name goes to the geocoder) if none is installed
+    if not os.path.exists(path):
+        print(f"No gazetteer at {path}; geocoding every location online.")
+        return None
+    return Gazetteer(path)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Resolve locations with the offline gazetteer.")
+    parser.add_argument("locations", nargs="+")
+    parser.add_argument("--file", default=GAZETTEER_FILE, help="GeoNames dump (default GAZETTEER_FILE)")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.file):
+        parser.error(f"no GeoNames dump at {args.file} (see https://download.geonames.org/export/dump/)")
+
+    start = time.perf_counter()
+    gazetteer = Gazetteer(args.file)
+    stats = gazetteer.stats()
+    print(f"Indexed {stats['names']} names of {stats['places']} places in {time.perf_counter() - start:.1f}s")
+    for location in args.locations:
+        print(f"{location}: {gazetteer.resolve(location)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from llm import OllamaClient, Model
+from gazetteer import load_gazetteer
 import csv
 from supabase import create_client, Client
 import pandas as pd
@@ -9,8 +10,14 @@ import re
 
 llm = Model.LLAMA_3_2
 client = OllamaClient(llm)
+gazetteer = load_gazetteer()
 
 def get_location_data(city_name):
+    # Names the offline gazetteer knows never reach geocode.xyz
+    if gazetteer is not None:
+        place = gazetteer.resolve(city_name)
+        if place is not None:
+            return {'latt': str(place[0]), 'longt': str(place[1])}
     url = f"https://geocode.xyz/{city_name}?json=1"
     response = requests.get(url)
     
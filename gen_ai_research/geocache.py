@@ -0,0 +1,150 @@
+from __future__ import annotations
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+GEOCODE_CACHE_FILE = os.getenv(
+    "GEOCODE_CACHE_FILE",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "state",
+        "geocode_cache.sqlite",
+    ),
+)
+# Found places are kept for 90 days; names that resolved to nothing are retried after 7
+GEOCODE_TTL = float(os.getenv("GEOCODE_TTL", str(90 * 86400)))
+GEOCODE_NEGATIVE_TTL = float(os.getenv("GEOCODE_NEGATIVE_TTL", str(7 * 86400)))
+
+US_STATES = {
+    "al": "alabama", "ak": "alaska", "az": "arizona", "ar": "arkansas", "ca": "california",
+    "co": "colorado", "ct": "connecticut", "de": "delaware", "fl": "florida", "ga": "georgia",
+    "hi": "hawaii", "id": "idaho", "il": "illinois", "in": "indiana", "ia": "iowa",
+    "ks": "kansas", "ky": "kentucky", "la": "louisiana", "me": "maine", "md": "maryland",
+    "ma": "massachusetts", "mi": "michigan", "mn": "minnesota", "ms": "mississippi", "mo": "missouri",
+    "mt": "montana", "ne": "nebraska", "nv": "nevada", "nh": "new hampshire", "nj": "new jersey",
+    "nm": "new mexico", "ny": "new york", "nc": "north carolina", "nd": "north dakota", "oh": "ohio",
+    "ok": "oklahoma", "or": "oregon", "pa": "pennsylvania", "ri": "rhode island", "sc": "south carolina",
+    "sd": "south dakota", "tn": "tennessee", "tx": "texas", "ut": "utah", "vt": "vermont",
+    "va": "virginia", "wa": "washington", "wv": "west virginia", "wi": "wisconsin", "wy": "wyoming",
+    "dc": "district of columbia", "pr": "puerto rico",
+}
+# Whole-part aliases, applied after the state codes
+ALIASES = {
+    "us": "united states", "usa": "united states", "u s": "united states", "u s a": "united states",
+    "united states of america": "united states", "america": "united states",
+    "uk": "united kingdom", "u k": "united kingdom", "great britain": "united kingdom",
+    "nyc": "new york city", "new york ny": "new york city",
+    "sf": "san francisco", "philly": "philadelphia", "socal": "southern california",
+    "norcal": "northern california", "uae": "united arab emirates", "drc": "democratic republic of the congo",
+}
+_ELIDED = re.compile(r"[.'\u2019]")  # "St. Louis" -> "st louis", "Hawai'i" -> "hawaii"
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_SEPARATORS = re.compile(r"\s*(?:,|;|/|\band\b|&)\s*")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_location(location: str) -> str:
+    """Cache key for a location string: "Los Angeles, CA." and "los angeles,  california" match.
+
+    Lowercases, folds accents, drops punctuation and repeated whitespace, and
+    expands US state codes and common aliases part by part (parts are split on
+    commas, semicolons, slashes and "and").
+    """
+    text = unicodedata.normalize("NFKD", location)
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    text = _ELIDED.sub("", text).replace("-", " ")
+    parts = []
+    for part in _SEPARATORS.split(text):
+        part = _SPACES.sub(" ", _PUNCTUATION.sub(" ", part)).strip()
+        if part.startswith("the "):
+            part = part[4:]
+        if not part:
+            continue
+        # A bare two-letter code is a state only after a place name ("Los Angeles, LA" but not "LA")
+        if parts and part in US_STATES:
+            part = US_STATES[part]
+        parts.append(ALIASES.get(part, part))
+    return ", ".join(parts)
+
+
+class GeocodeCache:
+    """Persistent geocoding results in SQLite, keyed by `normalize_location`.
+
+    Found places expire after `ttl` seconds and misses (stored with no
+    coordinates) after `negative_ttl`. `get` returns (latitude, longitude),
+    (None, None) for a cached miss, or None if the name is not cached. `hits`,
+    `negative_hits` and `misses` count lookups made through this instance.
+    """
+
+    def __init__(
+        self,
+        path: str = GEOCODE_CACHE_FILE,
+        ttl: float = GEOCODE_TTL,
+        negative_ttl: float = GEOCODE_NEGATIVE_TTL,
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS places ("
+            "key TEXT PRIMARY KEY, latitude REAL, longitude REAL, source TEXT, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, location: str) -> tuple[float | None, float | None] | None:
+        key = normalize_location(location)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT latitude, longitude, expires_at FROM places WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[2] < time.time():
+                self.misses += 1
+                return None
+            if row[0] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return row[0], row[1]
+
+    def put(
+        self,
+        location: str,
+        latitude: float | None,
+        longitude: float | None,
+        source: str = "nominatim",
+    ) -> None:
+        ttl = self.negative_ttl if latitude is None else self.ttl
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO places (key, latitude, longitude, source, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (normalize_location(location), latitude, longitude, source, time.time() + ttl),
+            )
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.negative_hits + self.misses
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,137 @@
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable
+
+JOB_LEDGER_FILE = os.getenv(
+    "JOB_LEDGER_FILE",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "state",
+        "job_ledger.sqlite",
+    ),
+)
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobLedger:
+    """Per-tweet classification status in SQLite, so an interrupted run can resume.
+
+    Each job is pending, in_progress, done or failed, with an attempt count and
+    the pipeline version (model, mode and prompt version) that produced its
+    result. Every start counts as an attempt, so a job left in_progress by a
+    crash is retried like a failure, until it runs out of attempts.
+    """
+
+    def __init__(self, path: str = JOB_LEDGER_FILE) -> None:
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "tweet_id TEXT PRIMARY KEY, run_date TEXT, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, version TEXT, error TEXT, updated_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_run_date ON jobs (run_date)")
+
+    def register(self, tweet_ids: Iterable[str], run_date: str | None = None) -> None:
+        # Add new tweets as pending; tweets already in the ledger keep their state
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO jobs (tweet_id, run_date, status, updated_at) VALUES (?, ?, ?, ?)",
+                [(str(tweet_id), run_date, PENDING, time.time()) for tweet_id in tweet_ids],
+            )
+
+    def start(self, tweet_id: str) -> None:
+        self._update(
+            "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE tweet_id = ?",
+            (IN_PROGRESS, time.time(), str(tweet_id)),
+        )
+
+    def complete(self, tweet_ids: Iterable[str], version: str) -> None:
+        with self._lock:
+            self._db.executemany(
+                "UPDATE jobs SET status = ?, version = ?, error = NULL, updated_at = ? WHERE tweet_id = ?",
+                [(DONE, version, time.time(), str(tweet_id)) for tweet_id in tweet_ids],
+            )
+
+    def fail(self, tweet_id: str, error: str) -> None:
+        self._update(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE tweet_id = ?",
+            (FAILED, error[:500], time.time(), str(tweet_id)),
+        )
+
+    def needs_work(
+        self,
+        tweet_ids: Iterable[str],
+        version: str | None = None,
+        max_attempts: int = MAX_ATTEMPTS,
+    ) -> set[str]:
+        """The given tweets that still need classifying.
+
+        That is every tweet not done, except failed or in_progress ones that
+        have used up `max_attempts` (a tweet that keeps crashing the process
+        stays in_progress); with a `version`, done tweets from any other version too.
+        """
+        tweet_ids = [str(tweet_id) for tweet_id in tweet_ids]
+        with self._lock:
+            known = {}
+            for start in range(0, len(tweet_ids), 500):
+                chunk = tweet_ids[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT tweet_id, status, attempts, version FROM jobs "
+                    f"WHERE tweet_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                known.update((row[0], row[1:]) for row in rows)
+
+        needed = set()
+        for tweet_id in tweet_ids:
+            status, attempts, job_version = known.get(tweet_id, (PENDING, 0, None))
+            if status == DONE:
+                if version is not None and job_version != version:
+                    needed.add(tweet_id)
+            elif status == PENDING or attempts < max_attempts:
+                needed.add(tweet_id)
+        return needed
+
+    def counts(self, run_date: str | None = None) -> dict[str, int]:
+        query = "SELECT status, COUNT(*) FROM jobs"
+        params: tuple = ()
+        if run_date is not None:
+            query += " WHERE run_date = ?"
+            params = (run_date,)
+        with self._lock:
+            return dict(self._db.execute(query + " GROUP BY status", params).fetchall())
+
+    def versions(self, run_date: str | None = None) -> dict[str, int]:
+        # Done jobs per pipeline version
+        query = "SELECT version, COUNT(*) FROM jobs WHERE status = ?"
+        params: tuple = (DONE,)
+        if run_date is not None:
+            query += " AND run_date = ?"
+            params += (run_date,)
+        with self._lock:
+            return dict(self._db.execute(query + " GROUP BY version", params).fetchall())
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _update(self, query: str, params: tuple) -> None:
+        with self._lock:
+            self._db.execute(query, params)
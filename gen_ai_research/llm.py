@@ -1,10 +1,47 @@
 from __future__ import annotations
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
 from enum import Enum
 from chat import ChatMessage, UserMessage
+from llm_cache import LLMCache, cache_key
+from scheduler import AIMDLimiter
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Any
 import json
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "3"))
+OLLAMA_MAX_IN_FLIGHT = int(os.getenv("OLLAMA_MAX_IN_FLIGHT", "16"))
+# Seconds a model that failed is skipped in favour of its fallbacks
+OLLAMA_FALLBACK_COOLDOWN = float(os.getenv("OLLAMA_FALLBACK_COOLDOWN", "60"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Failures that put a model aside for OLLAMA_FALLBACK_COOLDOWN: the server is overloaded or failing,
+# or (404) the model is not pulled. Other errors are about one request, not the model.
+COOLDOWN_STATUSES = RETRY_STATUSES | {404}
+
+# Tool definitions per schema class (weak keys, so schemas defined per call don't pile up)
+_toolsets: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+class OllamaHTTPError(ValueError):
+    """Ollama answered with an error status (after retries, for retryable ones)."""
+
+    def __init__(self, status_code: int, text: str) -> None:
+        super().__init__(f"(Status {status_code}) {text}")
+        self.status_code = status_code
+
+
+class InvalidResponseError(ValueError):
+    """The model answered, but without a tool call that fits the requested schema."""
+
 
 class Model(str, Enum):
     MISTRAL_7B = "mistral"
@@ -14,93 +51,160 @@ class Model(str, Enum):
     LLAMA_3_2 = "llama3.2"
 
 
-class OllamaClient:
+def parse_routes(spec: str) -> dict[str, list[Model]]:
+    """Task routes from "task=model[,fallback...];..." (e.g. "genuine=llama3.2;severity=mistral-nemo,llama3.2")."""
+    routes: dict[str, list[Model]] = {}
+    for entry in spec.split(";"):
+        if not entry.strip():
+            continue
+        task, _, models = entry.partition("=")
+        routes[task.strip()] = [Model(model.strip()) for model in models.split(",") if model.strip()]
+    return routes
+
+
+class _OllamaBase:
+    """What OllamaClient and AsyncOllamaClient share: payloads, cache lookups, response
+    checks, retry delays, task routes with model cooldowns, and usage accounting."""
+
     def __init__(
-        self, model: Model, url: str = "http://localhost:11434"
+        self,
+        model: Model,
+        url: str,
+        timeout: float,
+        max_retries: int,
+        backoff: float,
+        cache: LLMCache | None,
+        routes: dict[str, list[Model]] | None,
+        fallback_cooldown: float,
     ) -> None:
         self._url = url
         self._model = model
+        self._routes = routes or {}
+        self._fallback_cooldown = fallback_cooldown
+        self._down_until: dict[Model, float] = {}
+        self._model_stats: dict[str, dict[str, float]] = {}
+        self._cache = cache
+        self.usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._usage_lock = threading.Lock()
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._backoff = backoff
 
-    def chat(
-        self,
-        prompt: str,
-        history: list[ChatMessage] | None = None,
-        system_prompt: str | None = None,
-        temperature: float = 0.1,
-        top_p: float = 1.0,
-        max_tokens: int | None = None,
-        stop: list[str] | None = None,
-    ) -> str:
-        response = requests.post(
-            url=f"{self._url}/v1/chat/completions",
-            json={
-                "model": self._model.value,
-                "messages": self._format_chat_messages(
-                    prompt=prompt, history=history, system_prompt=system_prompt
-                ),
-                "temperature": temperature,
-                "top_p": top_p,
-                "max_tokens": max_tokens,
-                "stop": stop,
-            },
-        )
-        if not response.ok:
-            raise ValueError(f"(Status {response.status_code}) {response.text}")
-        response_json = response.json()
-        response_text: str = (
-            response_json["choices"][0]["message"]["content"] or ""
-        )
-        return response_text
+    def models_for(self, task: str | None) -> list[Model]:
+        return self._routes.get(task) or [self._model]
 
-    def generate_json(
+    def describe_routes(self, tasks: list[str]) -> str:
+        # The model name if every task uses it first, else "task:model,..." per task
+        primaries = {task: self.models_for(task)[0].value for task in tasks}
+        if set(primaries.values()) == {self._model.value}:
+            return self._model.value
+        return ",".join(f"{task}:{model}" for task, model in primaries.items())
+
+    def model_stats(self) -> dict[str, dict[str, float]]:
+        with self._usage_lock:
+            stats = {model: dict(counts) for model, counts in self._model_stats.items()}
+        for counts in stats.values():
+            counts["mean_seconds"] = counts["seconds"] / counts["calls"] if counts["calls"] else 0.0
+        return stats
+
+    def _try_order(self, models: list[Model]) -> list[Model]:
+        now = time.monotonic()
+        with self._usage_lock:
+            down_until = dict(self._down_until)
+        # Models cooling down after a failure go last rather than being dropped
+        order = [m for m in models if down_until.get(m, 0) <= now]
+        return order + [m for m in models if m not in order]
+
+    def _record_failure(self, model: Model, models: list[Model], seconds: float, error: Exception) -> None:
+        self._record_call(model, seconds, ok=False, fallback=model != models[0])
+        if self._is_unavailable(error):
+            with self._usage_lock:
+                self._down_until[model] = time.monotonic() + self._fallback_cooldown
+
+    @staticmethod
+    def _is_unavailable(error: Exception) -> bool:
+        # The model cannot serve anything right now, as opposed to failing on this one prompt
+        if isinstance(error, (requests.RequestException, httpx.TransportError)):
+            return True
+        return isinstance(error, OllamaHTTPError) and error.status_code in COOLDOWN_STATUSES
+
+    def _tool_request(
         self,
+        model: Model,
         prompt: str,
         schema: BaseModel,
-        history: list[ChatMessage] | None = None,
-        system_prompt: str | None = None,
-        temperature: float = 0.1,
-        top_p: float = 1.0,
-        max_tokens: int | None = None,
-    ) -> dict[str, Any]:
-        response = requests.post(
-            url=f"{self._url}/v1/chat/completions",
-            json={
-                "model": self._model.value,
-                "messages": self._format_chat_messages(
-                    prompt=prompt, history=history, system_prompt=system_prompt
-                ),
-                "temperature": temperature,
-                "top_p": top_p,
-                "max_tokens": max_tokens,
-                "tools": self._convert_schema_to_toolset(schema),
-            },
+        history: list[ChatMessage] | None,
+        system_prompt: str | None,
+        temperature: float,
+        top_p: float,
+        max_tokens: int | None,
+    ) -> tuple[dict[str, Any], str | None, list[dict[str, Any]] | None]:
+        # The payload to send, its cache key, and the cached answer if there is a valid one
+        payload = self._chat_payload(
+            prompt, history, system_prompt, temperature, top_p, max_tokens
         )
-        if not response.ok:
-            raise ValueError(f"(Status {response.status_code}) {response.text}")
-        response_json = response.json()
+        payload["model"] = model.value
+        payload["tools"] = self._convert_schema_to_toolset(schema)
+        if self._cache is None:
+            return payload, None, None
+        key = cache_key(payload)
+        cached = self._cache.get(key)
+        if cached is not None:
+            try:
+                return payload, key, self._check_tool_calls(cached, schema)
+            except InvalidResponseError:
+                pass  # written before answers were checked; ask again and overwrite it
+        return payload, key, None
+
+    def _read_tool_calls(
+        self, response_json: dict[str, Any], model: Model, schema: BaseModel, key: str | None
+    ) -> list[dict[str, Any]]:
         tool_calls: list[dict[str, Any]] = [
             tool_call["function"]
-            for tool_call in response_json["choices"][0]["message"][
+            for tool_call in response_json["choices"][0]["message"].get(
                 "tool_calls"
-            ]
+            ) or []
         ]
         for tool_call in tool_calls:
-            tool_call["arguments"] = json.loads(tool_call["arguments"])
+            try:
+                tool_call["arguments"] = json.loads(tool_call["arguments"])
+            except (TypeError, ValueError) as e:
+                raise InvalidResponseError(f"Unreadable tool call arguments from {model.value}: {e}") from e
+        # Only answers that fit the schema are cached: the key is deterministic, so a bad one would replay forever
+        self._check_tool_calls(tool_calls, schema)
+        if key is not None:
+            self._cache.put(key, tool_calls)
         return tool_calls
 
-    def embed(self, texts: list[str]) -> list[list[float]]:
-        response = requests.post(
-            url=f"{self._url}/v1/embeddings",
-            json={
-                "model": self._model.value,
-                "input": texts,
-                "encoding_format": "float",
-            },
-        )
-        if not response.ok:
-            raise ValueError(f"(Status {response.status_code}) {response.text}")
-        response_json = response.json()
-        return [embedding["embedding"] for embedding in response_json["data"]]
+    @staticmethod
+    def _check_tool_calls(tool_calls: Any, schema: BaseModel) -> list[dict[str, Any]]:
+        # Callers read tool_calls[0]["arguments"], so that one has to exist and validate
+        if not tool_calls:
+            raise InvalidResponseError(f"No {schema.__name__} tool call in the response")
+        try:
+            schema.model_validate(tool_calls[0]["arguments"])
+        except (TypeError, KeyError, ValidationError) as e:
+            raise InvalidResponseError(f"Tool call does not match {schema.__name__}: {e}") from e
+        return tool_calls
+
+    def _chat_payload(
+        self,
+        prompt: str,
+        history: list[ChatMessage] | None,
+        system_prompt: str | None,
+        temperature: float,
+        top_p: float,
+        max_tokens: int | None,
+    ) -> dict[str, Any]:
+        return {
+            "model": self._model.value,
+            "messages": self._format_chat_messages(
+                prompt=prompt, history=history, system_prompt=system_prompt
+            ),
+            "temperature": temperature,
+            "top_p": top_p,
+            "max_tokens": max_tokens,
+        }
 
     def _format_chat_messages(
         self,
@@ -124,9 +228,56 @@ class OllamaClient:
         messages.append(new_message)
         return [message.to_dict() for message in messages]
 
+    def _read_response(
+        self, response: requests.Response | httpx.Response, payload: dict[str, Any], last_attempt: bool
+    ) -> dict[str, Any] | None:
+        # The response body, or None if the request should be retried
+        if response.status_code < 400:
+            response_json = response.json()
+            self._record_usage(response_json.get("usage") or {}, payload["model"])
+            return response_json
+        if response.status_code not in RETRY_STATUSES or last_attempt:
+            raise OllamaHTTPError(response.status_code, response.text)
+        return None
+
+    def _retry_delay(self, attempt: int) -> float:
+        return self._backoff * 2**attempt * random.uniform(0.5, 1.5)
+
+    def _record_usage(self, usage: dict[str, Any], model: str | None = None) -> None:
+        with self._usage_lock:
+            for counts in (self.usage, self._stats_for(model or self._model.value)):
+                counts["requests"] += 1
+                counts["prompt_tokens"] += usage.get("prompt_tokens") or 0
+                counts["completion_tokens"] += usage.get("completion_tokens") or 0
+
+    def _record_call(self, model: Model, seconds: float, ok: bool, fallback: bool) -> None:
+        # One generate_json attempt on `model`; cache hits count as calls without requests
+        with self._usage_lock:
+            counts = self._stats_for(model.value)
+            counts["calls"] += 1
+            counts["seconds"] += seconds
+            counts["failures"] += not ok
+            counts["fallbacks"] += fallback and ok
+
+    def _stats_for(self, model: str) -> dict[str, float]:
+        counts = self._model_stats.get(model)
+        if counts is None:
+            counts = self._model_stats[model] = {
+                "calls": 0, "failures": 0, "fallbacks": 0, "seconds": 0.0,
+                "requests": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            }
+        return counts
+
     def _convert_schema_to_toolset(
         self, schema: BaseModel
     ) -> list[dict[str, Any]]:
+        # Building the JSON schema costs more than a cache lookup, so it is done once per schema
+        toolset = _toolsets.get(schema)
+        if toolset is None:
+            toolset = _toolsets[schema] = self._build_toolset(schema)
+        return toolset
+
+    def _build_toolset(self, schema: BaseModel) -> list[dict[str, Any]]:
         json_schema = schema.model_json_schema()
         return [
             {
@@ -141,4 +292,285 @@ class OllamaClient:
                     },
                 },
             }
-        ]
\ No newline at end of file
+        ]
+
+
+class OllamaClient(_OllamaBase):
+    """Ollama client over a persistent keep-alive session.
+
+    The session's connection pool holds `pool_size` connections, so one client
+    can be shared by that many threads. Connection errors, timeouts and
+    429/5xx responses are retried with jittered exponential backoff. With a
+    `cache`, `generate_json` answers repeated requests from it. With a
+    `limiter`, every request waits for a slot, and its latency (against other
+    requests for the same model and task) and outcome adjust the limit. `usage` totals the requests and tokens the server reported.
+
+    `routes` maps a task name to the models to try for it, in order; calls made
+    with that `task` go to the first model not cooling down, and fall back to
+    the next one if it fails. A model cools down after a transport error or a
+    COOLDOWN_STATUSES response, not after a bad answer to one prompt. Other
+    calls use `model`.
+    `model_stats()` has requests, failures, fallbacks, latency and tokens per model.
+    """
+
+    def __init__(
+        self,
+        model: Model,
+        url: str = OLLAMA_URL,
+        timeout: float = OLLAMA_TIMEOUT,
+        max_retries: int = OLLAMA_MAX_RETRIES,
+        backoff: float = 0.5,
+        pool_size: int = OLLAMA_MAX_IN_FLIGHT,
+        session: requests.Session | None = None,
+        cache: LLMCache | None = None,
+        limiter: AIMDLimiter | None = None,
+        routes: dict[str, list[Model]] | None = None,
+        fallback_cooldown: float = OLLAMA_FALLBACK_COOLDOWN,
+    ) -> None:
+        super().__init__(model, url, timeout, max_retries, backoff, cache, routes, fallback_cooldown)
+        self._limiter = limiter
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self._session = session
+
+    def chat(
+        self,
+        prompt: str,
+        history: list[ChatMessage] | None = None,
+        system_prompt: str | None = None,
+        temperature: float = 0.1,
+        top_p: float = 1.0,
+        max_tokens: int | None = None,
+        stop: list[str] | None = None,
+    ) -> str:
+        payload = self._chat_payload(
+            prompt, history, system_prompt, temperature, top_p, max_tokens
+        )
+        payload["stop"] = stop
+        response_json = self._post("/v1/chat/completions", payload)
+        response_text: str = (
+            response_json["choices"][0]["message"]["content"] or ""
+        )
+        return response_text
+
+    def generate_json(
+        self,
+        prompt: str,
+        schema: BaseModel,
+        history: list[ChatMessage] | None = None,
+        system_prompt: str | None = None,
+        temperature: float = 0.1,
+        top_p: float = 1.0,
+        max_tokens: int | None = None,
+        task: str | None = None,
+    ) -> dict[str, Any]:
+        models = self.models_for(task)
+        error: Exception | None = None
+        for model in self._try_order(models):
+            start = time.monotonic()
+            try:
+                result = self._generate_json(
+                    model, prompt, schema, history, system_prompt, temperature, top_p, max_tokens, task
+                )
+            except (requests.RequestException, ValueError, KeyError) as e:
+                self._record_failure(model, models, time.monotonic() - start, e)
+                error = e
+                continue
+            self._record_call(model, time.monotonic() - start, ok=True, fallback=model != models[0])
+            return result
+        raise error
+
+    def _generate_json(
+        self,
+        model: Model,
+        prompt: str,
+        schema: BaseModel,
+        history: list[ChatMessage] | None,
+        system_prompt: str | None,
+        temperature: float,
+        top_p: float,
+        max_tokens: int | None,
+        task: str | None = None,
+    ) -> dict[str, Any]:
+        payload, key, cached = self._tool_request(
+            model, prompt, schema, history, system_prompt, temperature, top_p, max_tokens
+        )
+        if cached is not None:
+            return cached
+        response_json = self._post("/v1/chat/completions", payload, task)
+        return self._read_tool_calls(response_json, model, schema, key)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        response_json = self._post(
+            "/v1/embeddings",
+            {
+                "model": self._model.value,
+                "input": texts,
+                "encoding_format": "float",
+            },
+        )
+        return [embedding["embedding"] for embedding in response_json["data"]]
+
+    def close(self) -> None:
+        self._session.close()
+
+    def __enter__(self) -> OllamaClient:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _post(self, path: str, payload: dict[str, Any], task: str | None = None) -> dict[str, Any]:
+        for attempt in range(self._max_retries + 1):
+            last_attempt = attempt == self._max_retries
+            try:
+                response = self._send(f"{self._url}{path}", payload, task)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+            else:
+                response_json = self._read_response(response, payload, last_attempt)
+                if response_json is not None:
+                    return response_json
+            time.sleep(self._retry_delay(attempt))
+
+    def _send(self, url: str, payload: dict[str, Any], task: str | None = None) -> requests.Response:
+        if self._limiter is None:
+            return self._session.post(url=url, json=payload, timeout=self._timeout)
+        self._limiter.acquire()
+        start = time.monotonic()
+        ok = False
+        try:
+            response = self._session.post(
+                url=url, json=payload, timeout=self._timeout
+            )
+            ok = response.status_code not in RETRY_STATUSES
+            return response
+        finally:
+            # Latency is judged against earlier requests to the same model for the same task
+            self._limiter.release(time.monotonic() - start, ok, (payload["model"], task))
+
+
+class AsyncOllamaClient(_OllamaBase):
+    """Ollama client for asyncio, over one httpx.AsyncClient.
+
+    Requests are sent from the event loop, without worker threads. At most
+    `max_in_flight` are open at once, one per pooled keep-alive connection;
+    further calls wait for a free one. Retries, the cache, task routes and
+    fallbacks, usage and `model_stats()` work as in OllamaClient. Close it with
+    `await client.aclose()` or `async with`.
+    """
+
+    def __init__(
+        self,
+        model: Model,
+        url: str = OLLAMA_URL,
+        max_in_flight: int = OLLAMA_MAX_IN_FLIGHT,
+        timeout: float = OLLAMA_TIMEOUT,
+        max_retries: int = OLLAMA_MAX_RETRIES,
+        backoff: float = 0.5,
+        cache: LLMCache | None = None,
+        routes: dict[str, list[Model]] | None = None,
+        fallback_cooldown: float = OLLAMA_FALLBACK_COOLDOWN,
+    ) -> None:
+        super().__init__(model, url, timeout, max_retries, backoff, cache, routes, fallback_cooldown)
+        limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+        self._session = httpx.AsyncClient(limits=limits, timeout=timeout)
+        # Calls queue here rather than in the pool, where waiting would count against the timeout
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    async def chat(
+        self,
+        prompt: str,
+        history: list[ChatMessage] | None = None,
+        system_prompt: str | None = None,
+        temperature: float = 0.1,
+        top_p: float = 1.0,
+        max_tokens: int | None = None,
+        stop: list[str] | None = None,
+    ) -> str:
+        payload = self._chat_payload(
+            prompt, history, system_prompt, temperature, top_p, max_tokens
+        )
+        payload["stop"] = stop
+        response_json = await self._post("/v1/chat/completions", payload)
+        return response_json["choices"][0]["message"]["content"] or ""
+
+    async def generate_json(
+        self,
+        prompt: str,
+        schema: BaseModel,
+        history: list[ChatMessage] | None = None,
+        system_prompt: str | None = None,
+        temperature: float = 0.1,
+        top_p: float = 1.0,
+        max_tokens: int | None = None,
+        task: str | None = None,
+    ) -> dict[str, Any]:
+        models = self.models_for(task)
+        error: Exception | None = None
+        for model in self._try_order(models):
+            start = time.monotonic()
+            try:
+                payload, key, cached = self._tool_request(
+                    model, prompt, schema, history, system_prompt, temperature, top_p, max_tokens
+                )
+                if cached is not None:
+                    result = cached
+                else:
+                    response_json = await self._post("/v1/chat/completions", payload)
+                    result = self._read_tool_calls(response_json, model, schema, key)
+            except (httpx.HTTPError, ValueError, KeyError) as e:
+                self._record_failure(model, models, time.monotonic() - start, e)
+                error = e
+                continue
+            self._record_call(model, time.monotonic() - start, ok=True, fallback=model != models[0])
+            return result
+        raise error
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        response_json = await self._post(
+            "/v1/embeddings",
+            {
+                "model": self._model.value,
+                "input": texts,
+                "encoding_format": "float",
+            },
+        )
+        return [embedding["embedding"] for embedding in response_json["data"]]
+
+    async def aclose(self) -> None:
+        await self._session.aclose()
+
+    def close(self) -> None:
+        raise TypeError("AsyncOllamaClient is closed with `await client.aclose()`")
+
+    def __enter__(self) -> AsyncOllamaClient:
+        raise TypeError("use `async with AsyncOllamaClient(...)`, not `with`")
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+    async def __aenter__(self) -> AsyncOllamaClient:
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.aclose()
+
+    async def _post(self, path: str, payload: dict[str, Any]) -> dict[str, Any]:
+        for attempt in range(self._max_retries + 1):
+            last_attempt = attempt == self._max_retries
+            try:
+                async with self._slots:
+                    response = await self._session.post(f"{self._url}{path}", json=payload)
+            except httpx.TransportError:
+                if last_attempt:
+                    raise
+            else:
+                response_json = self._read_response(response, payload, last_attempt)
+                if response_json is not None:
+                    return response_json
+            await asyncio.sleep(self._retry_delay(attempt))
@@ -0,0 +1,129 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+
+LLM_CACHE_FILE = os.getenv(
+    "LLM_CACHE_FILE",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "state",
+        "llm_cache.sqlite",
+    ),
+)
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "100000"))
+
+
+def cache_key(request: dict[str, Any]) -> str:
+    # Content address of one request body: model, messages, tool schema and sampling parameters
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Size-bounded on-disk cache of LLM responses in SQLite.
+
+    Entries are keyed by `cache_key` and evicted least recently used first
+    once there are more than `max_entries`. The entry count is kept in the
+    file by triggers, so processes sharing it evict against the same number.
+    `hits` and `misses` count lookups made through this instance.
+    """
+
+    def __init__(
+        self, path: str = LLM_CACHE_FILE, max_entries: int = LLM_CACHE_SIZE
+    ) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+        )
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.execute("CREATE TABLE IF NOT EXISTS entry_count (entries INTEGER NOT NULL)")
+            if self._db.execute("SELECT COUNT(*) FROM entry_count").fetchone()[0] == 0:
+                self._db.execute("INSERT INTO entry_count SELECT COUNT(*) FROM responses")
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses "
+                "BEGIN UPDATE entry_count SET entries = entries + 1; END"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses "
+                "BEGIN UPDATE entry_count SET entries = entries - 1; END"
+            )
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?",
+                (time.time(), key),
+            )
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            # One write transaction, so another process cannot evict between the count and the delete
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT INTO responses (key, value, last_used) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value, last_used = excluded.last_used",
+                    (key, json.dumps(value), time.time()),
+                )
+                excess = self._entries() - self.max_entries
+                if excess > 0:
+                    self._db.execute(
+                        "DELETE FROM responses WHERE key IN ("
+                        "SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                        (excess,),
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _entries(self) -> int:
+        return self._db.execute("SELECT entries FROM entry_count").fetchone()[0]
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
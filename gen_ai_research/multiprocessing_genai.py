@@ -1,20 +1,52 @@
-import csv
-import pandas as pd
+import argparse
+import hashlib
+import itertools
+import json
 import requests
 import time
 import re
 import os
-from dotenv import load_dotenv
+import sys
+import threading
+from collections import OrderedDict
 from pydantic import BaseModel, Field
-from supabase import create_client, Client
-from llm import OllamaClient, Model
-from multiprocessing import Pool
+from llm import OllamaClient, Model, OLLAMA_MAX_IN_FLIGHT, parse_routes
+from llm_cache import LLMCache, LLM_CACHE_FILE
+from job_ledger import JobLedger, JOB_LEDGER_FILE
+from geocache import GeocodeCache, GEOCODE_CACHE_FILE, normalize_location
+from gazetteer import load_gazetteer, GAZETTEER_FILE
+from prefilter import load_prefilter
+from scheduler import AIMDLimiter, run_work_queue
 from datetime import date
+from typing import NamedTuple
+
+# Shared ingestion modules (storage, ...) live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage import open_storage, FETCH_PAGE_SIZE, POSTS_TABLE, RESULTS_TABLE
 
 llm = Model.LLAMA_3_2
-client = OllamaClient(llm)
+# Model per prompt, with fallbacks: the small model handles the high-volume genuine-disaster gate,
+# and the larger one only the severity assessments of the tweets that pass it
+MODEL_ROUTES = parse_routes(os.getenv(
+    "OLLAMA_ROUTES", "genuine=llama3.2;disaster=llama3.2;severity=mistral-nemo,llama3.2;combined=llama3.2"
+))
+# Structured outputs are cached on disk (set LLM_CACHE_FILE="" to disable)
+llm_cache = LLMCache(LLM_CACHE_FILE) if LLM_CACHE_FILE else None
+# Requests in flight to Ollama adapt to its latency and errors, up to OLLAMA_MAX_IN_FLIGHT
+limiter = AIMDLimiter(maximum=OLLAMA_MAX_IN_FLIGHT)
+client = OllamaClient(llm, cache=llm_cache, limiter=limiter, routes=MODEL_ROUTES)
+# Local classifier that screens out obvious non-disaster tweets (None until trained)
+prefilter = load_prefilter()
+# Per-tweet job status, so an interrupted run can resume (set JOB_LEDGER_FILE="" to disable)
+ledger = JobLedger(JOB_LEDGER_FILE) if JOB_LEDGER_FILE else None
+# Geocoding results, found and not found, kept across runs (set GEOCODE_CACHE_FILE="" to disable)
+geocode_cache = GeocodeCache(GEOCODE_CACHE_FILE) if GEOCODE_CACHE_FILE else None
+# Offline GeoNames index resolved before the cache and Nominatim (None until a dump is installed)
+gazetteer = load_gazetteer(GAZETTEER_FILE) if GAZETTEER_FILE else None
 
 def get_supabase_client():
+    from supabase import create_client  # only the Supabase storage backend needs it
+
     # Get Supabase credentials from environment variables
     SUPABASE_URL = os.getenv("SUPABASE_URL")
     SUPABASE_KEY = os.getenv("SUPABASE_KEY")
@@ -28,64 +60,82 @@ def get_supabase_client():
 
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
-def fetch_from_supabase(input_date):
-    supabase = get_supabase_client()
-    
-    response = (
-        supabase
-        .table("bluesky_api_data")
-        .select("*")
-        .gte("timestamp", f"{input_date}T00:00:00+00:00")
-        .lt("timestamp", f"{input_date}T23:59:59+00:00")
-        .execute()
+# The pipeline tables in STORAGE_BACKEND: Supabase by default, or a local SQLite file (STORAGE_FILE)
+def get_storage():
+    return open_storage(get_supabase_client)
+
+class Tweet(NamedTuple):
+    tweet_id: str
+    timestamp: str
+    tweet_text: str
+    hashtags: str = ""
+    duplicate_of: str | None = None  # canonical tweet_id if data.py marked this a near-duplicate
+
+# Stream the day's posts one page at a time, so classification starts on the first page and
+# only one page is held in memory
+def fetch_tweets(input_date, page_size=FETCH_PAGE_SIZE, storage=None):
+    storage = storage or get_storage()
+    count = 0
+    rows = storage.scan(
+        POSTS_TABLE,
+        f"{input_date}T00:00:00+00:00",
+        f"{input_date}T23:59:59+00:00",
+        columns="tweet_id, timestamp, tweet_text, hashtags, duplicate_of",
+        page_size=page_size,
     )
+    for row in rows:
+        count += 1
+        yield Tweet(
+            str(row["tweet_id"]),
+            str(row["timestamp"]),
+            row.get("tweet_text") or "",
+            row.get("hashtags") or "",
+            str(row["duplicate_of"]) if row.get("duplicate_of") else None,
+        )
+    print(f"Fetched {count} tweets for {input_date}")
 
-    data = response.data
-    df = pd.DataFrame(data)
-    df.to_csv("test.csv", index=False, encoding='utf-8')
-
-    # Use proper encoding when reading the CSV file
-    with open('test.csv', newline='', encoding='utf-8') as csvfile:
-        reader = csv.reader(csvfile)
-        row_count = sum(1 for row in reader) - 1
-        print("Number of rows:", row_count)
-
-    with open("test.csv", "r", encoding='utf-8') as csvfile:
-        csv_reader = csv.reader(csvfile)
-        tweet_list = list(map(tuple, csv_reader))
-    
-    # Clean up temporary file
-    os.remove("test.csv")
-    
-    return row_count, tweet_list
-
-def safe_generate_json(prompt, schema, max_retries=3):
+def safe_generate_json(prompt, schema, max_retries=3, max_tokens=None, task=None):
     for attempt in range(max_retries):
         try:
-            response = client.generate_json(prompt=prompt, schema=schema)
+            response = client.generate_json(prompt=prompt, schema=schema, max_tokens=max_tokens, task=task)
             return response
         except Exception as e:
             print(f"Retrying... Error: {e}")
             time.sleep(1)  # Wait a bit before retrying
     return None  # Return None if all retries fail
 
-# ---------------------------- Core Classification Function ----------------------------
-
-def classify_tweet(tweet_data):
-    print(tweet_data)
-    tweet_id = tweet_data[0]
-    timestamp = tweet_data[1]
-    hashtags = tweet_data[5]
-    tweet_text = tweet_data[2] + f" {hashtags}"
-    print(tweet_text)
-
-    class ClassifyDisaster(BaseModel):
-        genuine_disaster: bool
-
-    prompt0 = f"""
-    You are a social media analyst who is an expert on natural disaster recovery.  
-    Determine whether the following tweet genuinely reports an ongoing or recent natural disaster.  
-    
+class NoAnswerError(RuntimeError):
+    """Every attempt at a prompt the classification cannot do without failed."""
+
+# Arguments of the first tool call in a safe_generate_json response. A None response (out of retries,
+# e.g. an answer cut off by its token budget) raises, so the tweet is recorded as failed, not as not genuine.
+def required_arguments(response, task, tweet_id):
+    if not response:
+        raise NoAnswerError(f"No {task} answer for tweet {tweet_id}")
+    return response[0]["arguments"]
+
+# ---------------------------- Prompts ----------------------------
+
+# "sequential" sends the genuine / type+location / severity prompts one after another;
+# "combined" asks for all of it in a single structured call
+CLASSIFY_MODE = os.getenv("CLASSIFY_MODE", "sequential")
+# "fast" asks the severity prompt for the four scores only; "full" also has the model justify
+# each score first (more tokens, same stored severity_score), which is useful for audits
+SEVERITY_MODE = os.getenv("SEVERITY_MODE", "fast")
+# Longer tweet text is cut at a word boundary before it goes into a prompt
+MAX_PROMPT_CHARS = int(os.getenv("MAX_PROMPT_CHARS", "1000"))
+# Completion token budget per prompt, a little above what a complete answer needs,
+# so a model that starts rambling is cut off instead of generating until the timeout
+MAX_TOKENS = {
+    "genuine": 48,
+    "disaster": 128,
+    "severity_fast": 96,
+    "severity_full": 768,
+    "combined": 192,
+}
+
+# Rules and examples for the genuine-disaster decision, shared by both modes
+GENUINE_RULES = """\
     ### Classification Rules:  
     ✅ **Classify as True** if the tweet:  
     - Provides specific details about an ongoing or recent natural disaster, including locations, victims, warnings, emergency response, aid efforts, or official updates.  
@@ -112,21 +162,132 @@ def classify_tweet(tweet_data):
     4. **Tweet:** "the day over and the adrenaline of a job well done flooding their bodies and minds the sisters celebrate"  
        **Output:** False ❌ *(No disaster details—just symbolic language)* 
     
-    ### Final Classification Task:  
+"""
+
+# ---------------------------- Prompt Templates ----------------------------
+# str.format templates; PROMPT_VERSION hashes them with the output schemas
+
+GENUINE_PROMPT = """
+    You are a social media analyst who is an expert on natural disaster recovery.  
+    Determine whether the following tweet genuinely reports an ongoing or recent natural disaster.  
+    
+{rules}    ### Final Classification Task:  
     Now, classify the following tweet:  
-    **Tweet:** "{tweet_text}"  
+    **Tweet:** "{tweet}"  
     **Output:** (True/False)
     """
-    genuine_response = safe_generate_json(prompt=prompt0, schema=ClassifyDisaster)
-    genuine = str(genuine_response[0]["arguments"]["genuine_disaster"])
 
-    print(genuine)
+DISASTER_PROMPT = (
+    "You are a social media analyst who is an expert on natural disaster recovery."
+    "\nA user inputted this tweet:\n"
+    "'{tweet}' "
+    "\n\nBased on only the tweet information, answer the following questions:"
+    "\n1. What type of natural disaster occurred? You must provide a brief justification first. "
+    "If a disaster type is specified in the tweet text, output the disaster type, else output 'Not Specified'."
+    "\n2. What is the location of the natural disaster? You must provide a brief justification first. "
+    "If a location is specified in the tweet text, output a map-friendly location, else output 'Not Specified'. "
+    "\nDo not make up facts. Only analyze based on the tweet text provided. "
+)
+
+SEVERITY_PROMPT = (
+    "You are a social media analyst who is an expert on natural disaster recovery. "
+    "Do not make up facts. Only analyze based on the tweet text provided. "
+    "\nA user inputted this tweet:\n"
+    "'{tweet}'"
+    "\n\nNatural Disaster Type: {disaster_type}. "
+    "\nBased on only the tweet information, answer the following questions:"
+)
+SEVERITY_FAST_SUFFIX = "\nRespond with the four integer scores only."
+
+COMBINED_PROMPT = """
+    You are a social media analyst who is an expert on natural disaster recovery.  
+    Analyze the following tweet and fill in every field of the response.  
+
+    1. **genuine_disaster**: Does the tweet genuinely report an ongoing or recent natural disaster?  
+{rules}
+    2. **disaster_type**: If a disaster type is specified in the tweet text, output the disaster type, else output 'Not Specified'.  
+    3. **disaster_location**: If a location is specified in the tweet text, output a map-friendly location, else output 'Not Specified'.  
+    4. **daily_living_impact_score**: Impact on daily living from 0 (no impact) to 10 (complete disruption of daily life).  
+    5. **infrastructure_impact_score**: Impact on infrastructure from 0 (no impact) to 10 (life-threatening infrastructure damage).  
+    6. **loss_of_life_score**: Loss of life from 0 (no loss of life) to 10 (a death toll greater than 5; if the death toll is greater than 5, the score must be 10).  
+    7. **emergency_response_score**: Need for emergency response from 0 (none) to 10 (mandatory evacuations and rescue efforts).  
+
+    If the tweet is not a genuine disaster report, output 'Not Specified' and 0 for the remaining fields.  
+    Do not make up facts. Only analyze based on the tweet text provided.  
+
+    **Tweet:** "{tweet}"  
+    """
+
+# ---------------------------- Output Schemas ----------------------------
+# Defined once at module level so the client builds (and caches) each tool definition once
+
+class ClassifyDisaster(BaseModel):
+    genuine_disaster: bool
+
+class DisasterSchema(BaseModel):
+    disaster_type: str = Field(..., min_length=1)
+    disaster_location: str = Field(..., min_length=1)
+
+class SeverityScoreSchema(BaseModel):
+    daily_living_impact_justification: str
+    daily_living_impact_score: int
+    infrastructure_impact_justification: str
+    infrastructure_impact_score: int
+    loss_of_life_justification: str
+    loss_of_life_score: int
+    emergency_response_justification: str
+    emergency_response_score: int
+
+class SeverityScoresOnlySchema(BaseModel):
+    daily_living_impact_score: int
+    infrastructure_impact_score: int
+    loss_of_life_score: int
+    emergency_response_score: int
+
+class CombinedClassificationSchema(BaseModel):
+    genuine_disaster: bool
+    disaster_type: str = Field(..., min_length=1)
+    disaster_location: str = Field(..., min_length=1)
+    daily_living_impact_score: int
+    infrastructure_impact_score: int
+    loss_of_life_score: int
+    emergency_response_score: int
+
+# ---------------------------- Core Classification Function ----------------------------
+
+# Cut text longer than MAX_PROMPT_CHARS at the last word boundary
+def truncate_text(text, max_chars=None):
+    max_chars = max_chars or MAX_PROMPT_CHARS
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + " ..."
+
+# Severity score (0-10, as a string) from the four sub-scores; 5 each if they are missing or malformed
+def severity_from_scores(arguments):
+    try:
+        daily_living_score_int = int(arguments["daily_living_impact_score"])
+        infrastructure_score_int = int(arguments["infrastructure_impact_score"])
+        loss_of_life_score_int = int(arguments["loss_of_life_score"])
+        emergency_response_score_int = int(arguments["emergency_response_score"])
+    except (ValueError, KeyError, TypeError) as e:
+        daily_living_score_int = 5
+        infrastructure_score_int = 5
+        loss_of_life_score_int = 5
+        emergency_response_score_int = 5
+
+    severity_score = ((daily_living_score_int + infrastructure_score_int + loss_of_life_score_int + emergency_response_score_int) / 40) * 10
+    return str(severity_score)
+
+def classify_tweet(tweet, mode=None, severity=None):
+    print(tweet)
+    tweet_text = tweet.tweet_text + f" {tweet.hashtags}"
+    print(tweet_text)
 
     result = {
-        "tweet_id": int(tweet_id),
-        "timestamp": timestamp,
+        "tweet_id": int(tweet.tweet_id),
+        "timestamp": tweet.timestamp,
         "tweet_text": tweet_text,
-        "genuine_disaster": genuine.lower() == "true",
+        "genuine_disaster": False,
         "disaster_type": "None",
         "location": "None",
         "severity_score": "None",
@@ -134,29 +295,33 @@ def classify_tweet(tweet_data):
         "longitude": None
     }
 
+    # Tweets the local prefilter is confident are not about a disaster skip the LLM
+    if prefilter is not None and prefilter.skip(tweet_text):
+        print("False (prefilter)")
+        return result
+
+    prompt_text = truncate_text(tweet_text)
+    if (mode or CLASSIFY_MODE) == "combined":
+        return classify_combined(prompt_text, result)
+
+    prompt0 = GENUINE_PROMPT.format(rules=GENUINE_RULES, tweet=prompt_text)
+    genuine_response = safe_generate_json(prompt=prompt0, schema=ClassifyDisaster, max_tokens=MAX_TOKENS["genuine"], task="genuine")
+    genuine = str(required_arguments(genuine_response, "genuine", tweet.tweet_id)["genuine_disaster"])
+
+    print(genuine)
+
+    result["genuine_disaster"] = genuine.lower() == "true"
+
     if genuine.lower() != "true":
         return result
 
     if genuine.lower() == "true":
-        class DisasterSchema(BaseModel):
-            disaster_type: str = Field(..., min_length=1)
-            disaster_location: str = Field(..., min_length=1)
-
-        prompt1 = (
-                "You are a social media analyst who is an expert on natural disaster recovery."
-                "\nA user inputted this tweet:\n"
-                f"'{tweet_text}' "
-                "\n\nBased on only the tweet information, answer the following questions:"
-                "\n1. What type of natural disaster occurred? You must provide a brief justification first. "
-                "If a disaster type is specified in the tweet text, output the disaster type, else output 'Not Specified'."
-                "\n2. What is the location of the natural disaster? You must provide a brief justification first. "
-                "If a location is specified in the tweet text, output a map-friendly location, else output 'Not Specified'. "
-                "\nDo not make up facts. Only analyze based on the tweet text provided. "
-            )
-        response = safe_generate_json(prompt=prompt1, schema=DisasterSchema)
-
-        disaster_type = response[0]["arguments"]["disaster_type"]
-        disaster_location = response[0]["arguments"]["disaster_location"]
+        prompt1 = DISASTER_PROMPT.format(tweet=prompt_text)
+        response = safe_generate_json(prompt=prompt1, schema=DisasterSchema, max_tokens=MAX_TOKENS["disaster"], task="disaster")
+
+        arguments = required_arguments(response, "disaster", tweet.tweet_id)
+        disaster_type = arguments["disaster_type"]
+        disaster_location = arguments["disaster_location"]
 
         print(disaster_type)
         print(disaster_location)
@@ -167,166 +332,374 @@ def classify_tweet(tweet_data):
         if disaster_type.lower() == "not specified":
             return result
 
-        class SeverityScoreSchema(BaseModel):
-            daily_living_impact_justification: str
-            daily_living_impact_score: int
-            infrastructure_impact_justification: str
-            infrastructure_impact_score: int
-            loss_of_life_justification: str
-            loss_of_life_score: int
-            emergency_response_justification: str
-            emergency_response_score: int
+        result["severity_score"] = classify_severity(prompt_text, disaster_type, severity)
 
-        try:
-            prompt2 = (
-                        "You are a social media analyst who is an expert on natural disaster recovery. "
-                        "Do not make up facts. Only analyze based on the tweet text provided. "
-                        "\nA user inputted this tweet:\n"
-                        f"'{tweet_text}'"
-                        f"\n\nNatural Disaster Type: {disaster_type}. "
-                        "\nBased on only the tweet information, answer the following questions:"
-                        "\n1. Assess the impact of the natural disaster specified in the tweet on daily living on a scale from 0 to 10 where 0 is no impact "
-                        "and 10 is complete disruption of daily life. You must provide a concise justification on the impact on daily living first before providing the score. "
-                        "\n2. Assess the impact of the natural disaster specified in the tweet on infrastructure from 0 to 10 where 0 is no impact "
-                        "and 10 is life-threatening infrastructure damage. You must provide a concise justification on the impact on infrastructure first before providing the score. "
-                        "\n3. Assess the loss of life specified in the tweet on a scale from 0 to 10 where 0 is no loss of life and 10 is a death toll greater than 5. "
-                        "This means that if the death toll is greater than 5, the score must be 10. "
-                        "You must provide a concise justification on the loss of life first before providing the score. "
-                        "\n4. Assess the need for emergency response measures on a scale from 0 to 10 where 0 is no need for emergency responses "
-                        "and 10 involves mandatory evacuations and rescue efforts. You must provide a concise justification on the emergency responses score first before providing the score. "
-                    )
-            response = safe_generate_json(prompt=prompt2, schema=SeverityScoreSchema)
-
-            daily_living_score_int = int(response[0]["arguments"]["daily_living_impact_score"])
-            infrastructure_score_int = int(response[0]["arguments"]["infrastructure_impact_score"])
-            loss_of_life_score_int = int(response[0]["arguments"]["loss_of_life_score"])
-            emergency_response_score_int = int(response[0]["arguments"]["emergency_response_score"])
-        except (ValueError, KeyError, TypeError) as e:
-            daily_living_score_int = 5
-            infrastructure_score_int = 5
-            loss_of_life_score_int = 5
-            emergency_response_score_int = 5
-
-        severity_score = ((daily_living_score_int + infrastructure_score_int + loss_of_life_score_int + emergency_response_score_int) / 40) * 10
-        result["severity_score"] = str(severity_score)
+        return result
 
+# The four severity questions, each with the justification "full" mode asks for before the score
+SEVERITY_QUESTIONS = [
+    ("Assess the impact of the natural disaster specified in the tweet on daily living on a scale from 0 to 10 where 0 is no impact "
+     "and 10 is complete disruption of daily life. ",
+     "You must provide a concise justification on the impact on daily living first before providing the score. "),
+    ("Assess the impact of the natural disaster specified in the tweet on infrastructure from 0 to 10 where 0 is no impact "
+     "and 10 is life-threatening infrastructure damage. ",
+     "You must provide a concise justification on the impact on infrastructure first before providing the score. "),
+    ("Assess the loss of life specified in the tweet on a scale from 0 to 10 where 0 is no loss of life and 10 is a death toll greater than 5. "
+     "This means that if the death toll is greater than 5, the score must be 10. ",
+     "You must provide a concise justification on the loss of life first before providing the score. "),
+    ("Assess the need for emergency response measures on a scale from 0 to 10 where 0 is no need for emergency responses "
+     "and 10 involves mandatory evacuations and rescue efforts. ",
+     "You must provide a concise justification on the emergency responses score first before providing the score. "),
+]
+
+# Severity score for a genuine tweet. "full" asks for a justification before each sub-score;
+# "fast" asks for the four sub-scores only, which is most of the saving in generated tokens.
+def classify_severity(tweet_text, disaster_type, severity=None):
+    full = (severity or SEVERITY_MODE) == "full"
+    prompt2 = SEVERITY_PROMPT.format(tweet=tweet_text, disaster_type=disaster_type)
+    for number, (question, justification) in enumerate(SEVERITY_QUESTIONS, start=1):
+        prompt2 += f"\n{number}. {question}" + (justification if full else "")
+    if full:
+        response = safe_generate_json(prompt=prompt2, schema=SeverityScoreSchema, max_tokens=MAX_TOKENS["severity_full"], task="severity")
+    else:
+        prompt2 += SEVERITY_FAST_SUFFIX
+        response = safe_generate_json(prompt=prompt2, schema=SeverityScoresOnlySchema, max_tokens=MAX_TOKENS["severity_fast"], task="severity")
+    return severity_from_scores(response[0]["arguments"] if response else None)
+
+# Single-call mode: genuine flag, type, location and the four severity sub-scores in one tool call
+def classify_combined(tweet_text, result):
+    prompt = COMBINED_PROMPT.format(rules=GENUINE_RULES, tweet=tweet_text)
+    response = safe_generate_json(prompt=prompt, schema=CombinedClassificationSchema, max_tokens=MAX_TOKENS["combined"], task="combined")
+    arguments = required_arguments(response, "combined", result["tweet_id"])
+
+    genuine = str(arguments["genuine_disaster"])
+    print(genuine)
+    result["genuine_disaster"] = genuine.lower() == "true"
+    if genuine.lower() != "true":
+        return result
+
+    result["disaster_type"] = arguments["disaster_type"]
+    result["location"] = arguments["disaster_location"]
+    print(result["disaster_type"])
+    print(result["location"])
+    if result["disaster_type"].lower() == "not specified":
+        return result
+
+    result["severity_score"] = severity_from_scores(arguments)
+    return result
+
+# Hash of what the model is asked, the prompt templates and output schemas, recorded with every
+# result in the job ledger. Edits to the surrounding code (logging, control flow) leave it alone.
+PROMPT_VERSION = hashlib.sha256(json.dumps([
+    GENUINE_RULES, GENUINE_PROMPT, DISASTER_PROMPT, SEVERITY_PROMPT, SEVERITY_FAST_SUFFIX,
+    SEVERITY_QUESTIONS, COMBINED_PROMPT,
+    [schema.model_json_schema() for schema in (ClassifyDisaster, DisasterSchema, SeverityScoreSchema,
+                                               SeverityScoresOnlySchema, CombinedClassificationSchema)],
+], sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+# ---------------------------- Work Queue ----------------------------
+
+# Upsert a batch of classification results; returns the records that could not be written
+def store_results(results, storage=None):
+    storage = storage or get_storage()
+    written, failed = storage.upsert(RESULTS_TABLE, results, on_conflict="tweet_id")
+    print(f"Stored {written} results ({len(failed)} failed)")
+    return failed
+
+# Identifies what produced a result: the model(s), the classify and severity modes and PROMPT_VERSION.
+# Editing a prompt changes it, so --reprocess-outdated picks up rows from before the edit.
+def pipeline_version(mode=None, severity=None):
+    mode = mode or CLASSIFY_MODE
+    tasks = ["combined"] if mode == "combined" else ["genuine", "disaster", "severity"]
+    if mode != "combined":
+        mode += f"-{severity or SEVERITY_MODE}"
+    return f"{client.describe_routes(tasks)}/{mode}/{PROMPT_VERSION}"
+
+# Wrap the work and sink functions so every tweet's status is recorded in the ledger:
+# in_progress when a worker picks it up, done once its result is stored, failed otherwise
+def track_jobs(ledger, version, sink):
+    def work(tweet):
+        ledger.start(tweet.tweet_id)
+        try:
+            result = classify_tweet(tweet)
+        except Exception as e:
+            ledger.fail(tweet.tweet_id, str(e))
+            raise
+        if result is None:
+            ledger.fail(tweet.tweet_id, "no result")
         return result
 
-# ---------------------------- Multiprocessing for Batch ----------------------------
+    def tracked_sink(results):
+        failed = {str(record["tweet_id"]) for record in sink(results) or []}
+        ledger.complete([result["tweet_id"] for result in results if str(result["tweet_id"]) not in failed], version)
+        for tweet_id in failed:
+            ledger.fail(tweet_id, "store failed")
+
+    return work, tracked_sink
 
-def run_multiprocessing(start, end, tweet_list, batch_size=5):
+# Canonical tweet results are remembered this far back for near-duplicates that come after them
+DUPLICATE_WINDOW = int(os.getenv("NEAR_DUPLICATE_WINDOW", "100000"))
+# What a near-duplicate takes from its canonical tweet's result
+COPIED_FIELDS = ("genuine_disaster", "disaster_type", "location", "severity_score")
+
+class DuplicateCopier:
+    """Classifies each near-duplicate cluster once by copying the canonical tweet's result.
+
+    `canonical(tweets)` passes on tweets without `duplicate_of` and holds the
+    duplicates back. `sink` wraps a results sink: it stores each batch along with
+    copies for the duplicates whose canonical result is in it (or was, within
+    the last `window` results). `finish()` stores copies still waiting and returns
+    the duplicates whose canonical tweet got no result in this run, to be classified.
+    """
+
+    def __init__(self, sink, window=DUPLICATE_WINDOW):
+        self._sink = sink
+        self._window = window
+        self._lock = threading.Lock()  # canonical() runs on the work queue's reader thread
+        self._held = {}  # canonical tweet_id -> duplicates waiting for its result
+        self._ready = []  # copies of results that were in before their duplicate was read
+        self._results = OrderedDict()  # canonical tweet_id -> COPIED_FIELDS of its result
+        self.copied = 0
+
+    def canonical(self, tweets):
+        for tweet in tweets:
+            if not tweet.duplicate_of:
+                yield tweet
+                continue
+            with self._lock:
+                fields = self._results.get(tweet.duplicate_of)
+                if fields is None:
+                    self._held.setdefault(tweet.duplicate_of, []).append(tweet)
+                else:
+                    self._ready.append(self._copy(fields, tweet))
+
+    def sink(self, results):
+        with self._lock:
+            copies, self._ready = self._ready, []
+            for result in results:
+                tweet_id = str(result["tweet_id"])
+                fields = {field: result[field] for field in COPIED_FIELDS}
+                self._results[tweet_id] = fields
+                if len(self._results) > self._window:
+                    self._results.popitem(last=False)
+                copies += [self._copy(fields, tweet) for tweet in self._held.pop(tweet_id, [])]
+        self.copied += len(copies)
+        return self._sink(results + copies)
+
+    def finish(self):
+        with self._lock:
+            copies, self._ready = self._ready, []
+            orphans = [tweet for tweets in self._held.values() for tweet in tweets]
+            self._held.clear()
+        if copies:
+            self.copied += len(copies)
+            self._sink(copies)
+        return orphans
+
+    @staticmethod
+    def _copy(fields, tweet):
+        return {
+            "tweet_id": int(tweet.tweet_id),
+            "timestamp": tweet.timestamp,
+            "tweet_text": tweet.tweet_text + f" {tweet.hashtags}",
+            **fields,
+            "latitude": None,
+            "longitude": None,
+        }
+
+# Register tweets in the ledger a page at a time as they stream past. With skip_finished, drop
+# the ones it says are done (or out of attempts); with a version, done ones from another version
+# are kept for reclassifying.
+def register_jobs(ledger, tweets, run_date, skip_finished=False, version=None, page_size=FETCH_PAGE_SIZE):
+    tweets = iter(tweets)
+    seen = needed = 0
+    while page := list(itertools.islice(tweets, page_size)):
+        ids = [tweet.tweet_id for tweet in page]
+        ledger.register(ids, run_date)
+        seen += len(page)
+        if skip_finished:
+            pending = ledger.needs_work(ids, version=version)
+            page = [tweet for tweet in page if str(tweet.tweet_id) in pending]
+        needed += len(page)
+        yield from page
+    if skip_finished:
+        print(f"Ledger: {needed} of {seen} tweets needed classifying ({version or 'any version'})")
+
+# Classify every tweet through one continuous work queue; results are stored as they finish.
+# `tweets` can be a generator such as fetch_tweets(): it is read lazily as workers free up.
+# The AIMD limiter in the client decides how many requests are actually in flight.
+# Near-duplicates get a copy of their canonical tweet's result (DuplicateCopier); those whose
+# canonical tweet is not classified in this run are classified after the rest.
+# With the ledger, resume=True skips tweets already done (and failures out of attempts), and
+# reprocess_outdated=True also redoes done tweets whose results came from another pipeline_version().
+def classify_all(tweets, workers=OLLAMA_MAX_IN_FLIGHT, sink=None, run_date=None, resume=False, reprocess_outdated=False):
+    if sink is None:
+        storage = get_storage()
+        sink = lambda results: store_results(results, storage)
+    work = classify_tweet
+    if ledger is not None:
+        version = pipeline_version()
+        tweets = register_jobs(ledger, tweets, run_date, skip_finished=resume or reprocess_outdated,
+                               version=version if reprocess_outdated else None)
+        work, sink = track_jobs(ledger, version, sink)
+    copier = DuplicateCopier(sink)
+    stats = run_work_queue(copier.canonical(tweets), work, copier.sink, workers=workers)
+    orphans = copier.finish()
+    if orphans:
+        extra = run_work_queue(orphans, work, sink, workers=workers)
+        stats.submitted += extra.submitted
+        stats.completed += extra.completed
+        stats.failed += extra.failed
+        stats.batches += extra.batches
+        stats.finished = extra.finished
+    print(f"Classified {stats.summary()}; {copier.copied} near-duplicates copied, "
+          f"{len(orphans)} classified without their canonical tweet; Ollama limiter: {limiter.stats()}")
+    return stats
+
+# Classify tweets start..end (inclusive) of tweet_list
+def run_multiprocessing(start, end, tweet_list, batch_size=OLLAMA_MAX_IN_FLIGHT):
     print(f"Start: {start}, End: {end}")
-    data_to_process = tweet_list[start:end]  # skip header
-    with Pool(processes=batch_size) as pool:
-        results = pool.map(classify_tweet, data_to_process)
-    
-    # Store results in Supabase database
-    supabase = get_supabase_client()
-    for result in results:
-        if result:
-            try:
-                supabase.table("multiprocessing_gen_ai_output").upsert(result).execute()
-                print(f"Stored data for tweet ID: {result['tweet_id']}")
-            except Exception as e:
-                print(f"Error storing data for tweet ID {result['tweet_id']}: {e}")
+    return classify_all(tweet_list[start:end + 1], workers=batch_size)
 
 # ---------------------------- Geocoding Locations ----------------------------
 
+# Nominatim server to geocode with, and the pause after each request (the public server allows 1 request/s)
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org")
+NOMINATIM_DELAY = float(os.getenv("NOMINATIM_DELAY", "1"))
+
+class GeocoderUnavailable(Exception):
+    """Nominatim gave no answer (network error, rate limit, server error): nothing is known about the name."""
+
+# Nominatim's best match for a name, or {} if it has none. Anything but a 200 with a JSON list raises
+# GeocoderUnavailable, so a throttled or failing server is never mistaken for "not found".
 def get_location_data(city_name):
-    url = f"https://nominatim.openstreetmap.org/search?q={city_name}&format=json&limit=1"
-    response = requests.get(url, headers={'User-Agent': 'BlueskyDisasterAnalysis/1.0'})
-    if response.status_code == 200 and response.json():
-        return response.json()[0]
-    return {}
-
-def enrich_location(input_date):
-    supabase = get_supabase_client()
-    # Select only records where latitude IS NULL and location is potentially valid
-    # AND timestamp matches the input_date
-    start_timestamp = f"{input_date}T00:00:00+00:00"
-    end_timestamp = f"{input_date}T23:59:59+00:00"
- 
-    response = (
-        supabase.table("multiprocessing_gen_ai_output")
-        .select("tweet_id, location")  # Only select needed columns
-        .gte("timestamp", start_timestamp) # Filter by date start
-        .lt("timestamp", end_timestamp)   # Filter by date end
-        .is_("latitude", "null")       # Filter for null latitude
-        .neq("location", "None")       # Filter out invalid locations
-        .neq("location", "not specified")
-        .execute()
-    )
-    records = response.data
+    url = f"{NOMINATIM_URL}/search?q={city_name}&format=json&limit=1"
+    try:
+        response = requests.get(url, headers={'User-Agent': 'BlueskyDisasterAnalysis/1.0'}, timeout=30)
+    except requests.RequestException as e:
+        raise GeocoderUnavailable(f"Nominatim request for {city_name!r} failed: {e}") from e
+    if response.status_code != 200:
+        raise GeocoderUnavailable(f"(Status {response.status_code}) Nominatim could not look up {city_name!r}")
+    try:
+        results = response.json()
+    except ValueError as e:
+        raise GeocoderUnavailable(f"Nominatim sent a non-JSON response for {city_name!r}") from e
+    return results[0] if results else {}
+
+# (latitude, longitude) of one name from the gazetteer or cache, else from Nominatim; (None, None)
+# if not found. Only lookups that reach Nominatim pause for NOMINATIM_DELAY. If Nominatim does not
+# answer, GeocoderUnavailable propagates and nothing is cached. With use_cache=False the gazetteer
+# and cache are neither read nor written, and the caller decides what to cache.
+def lookup_location(name, use_cache=True):
+    if use_cache and gazetteer is not None:
+        place = gazetteer.resolve(name)
+        if place is not None:
+            return place
+    if use_cache and geocode_cache is not None:
+        cached = geocode_cache.get(name)
+        if cached is not None:
+            return cached
+    try:
+        location_data = get_location_data(name)
+    finally:
+        time.sleep(NOMINATIM_DELAY)  # be respectful of Nominatim's usage policy
+    latitude = float(location_data['lat']) if location_data.get('lat') else None
+    longitude = float(location_data['lon']) if location_data.get('lon') else None
+    if use_cache and geocode_cache is not None:
+        geocode_cache.put(name, latitude, longitude)
+    return latitude, longitude
+
+# Geocode an LLM-extracted location: the whole string, then its first and last parts
+# ("Houston, Texas and Louisiana" -> "Houston" -> "Louisiana"). Whatever the chain finds
+# is also cached under the whole string, so the next run needs a single lookup. Names the
+# gazetteer resolves never reach the cache or Nominatim. The whole string is cached only once
+# the chain has finished: if Nominatim does not answer any lookup in it, GeocoderUnavailable
+# propagates and nothing is cached for the whole string.
+def geocode(location):
+    if gazetteer is not None:
+        place = gazetteer.resolve(location)
+        if place is not None:
+            return place
+    if geocode_cache is not None:
+        cached = geocode_cache.get(location)
+        if cached is not None:
+            return cached
+    location_parts = re.split(r", | and ", location)
+    candidates = [location] + [part for part in (location_parts[0], location_parts[-1]) if part != location]
+    latitude, longitude = None, None
+    for candidate in dict.fromkeys(candidates):
+        latitude, longitude = lookup_location(candidate, use_cache=candidate != location)
+        if latitude is not None:
+            break
+    if geocode_cache is not None:
+        geocode_cache.put(location, latitude, longitude)
+    return latitude, longitude
+
+def enrich_location(input_date, storage=None):
+    storage = storage or get_storage()
+    # Records of input_date with a location but no coordinates yet
+    records = storage.pending_geocodes(f"{input_date}T00:00:00+00:00", f"{input_date}T23:59:59+00:00")
 
     if not records:
         print(f"No records found needing geocoding for date {input_date}.")
         return
     
-    print(f"Found {len(records)} records to geocode for date {input_date}.")
-
+    # Tweets about the same place are geocoded once (under the group's first spelling) and updated together
+    groups = {}
     for record in records:
-        tweet_id = record['tweet_id']
-        location = record['location']
-        
-        latitude, longitude = None, None
-        location_data = get_location_data(location)
-        
-        if location_data:
-            latitude = float(location_data.get('lat')) if location_data.get('lat') else None
-            longitude = float(location_data.get('lon')) if location_data.get('lon') else None
-            
-            if not latitude:
-                location_parts = re.split(r", | and ", location)
-                first_item = location_parts[0]
-                last_item = location_parts[-1]
-                first_location_data = get_location_data(first_item)
-                last_location_data = get_location_data(last_item)
-                print(first_item)
-                print(last_item)
-
-                if first_location_data:
-                    latitude = float(first_location_data.get('lat')) if first_location_data.get('lat') else None
-                    longitude = float(first_location_data.get('lon')) if first_location_data.get('lon') else None
-                    if not latitude and last_location_data:
-                        latitude = float(last_location_data.get('lat')) if last_location_data.get('lat') else None
-                        longitude = float(last_location_data.get('lon')) if last_location_data.get('lon') else None
-                        
-            print(f"Location: {location}, Latitude: {latitude}, Longitude: {longitude}\n")
-            
-            # Update the database record with the geocoding information
-            try:
-                supabase.table("multiprocessing_gen_ai_output").update({
-                    "latitude": latitude,
-                    "longitude": longitude
-                }).eq("tweet_id", tweet_id).execute()
-                print(f"Updated geocoding for tweet ID: {tweet_id}")
-            except Exception as e:
-                print(f"Error updating geocoding for tweet ID {tweet_id}: {e}")
-                
-            time.sleep(1)  # Reduced sleep time for Nominatim - be respectful of their usage policy
+        _, tweet_ids = groups.setdefault(normalize_location(record['location']), (record['location'], []))
+        tweet_ids.append(record['tweet_id'])
+    print(f"Found {len(records)} records ({len(groups)} distinct locations) to geocode for date {input_date}.")
+
+    for location, tweet_ids in groups.values():
+        try:
+            latitude, longitude = geocode(location)
+        except GeocoderUnavailable as e:
+            # Left without coordinates, so the next run tries the group again
+            print(f"Skipping {location} ({len(tweet_ids)} tweets): {e}")
+            continue
+        print(f"Location: {location}, Latitude: {latitude}, Longitude: {longitude} ({len(tweet_ids)} tweets)\n")
+        if latitude is None:
+            continue
+
+        # Update the group's records with the geocoding information
+        try:
+            storage.update(RESULTS_TABLE, {"latitude": latitude, "longitude": longitude}, tweet_ids)
+            print(f"Updated geocoding for {len(tweet_ids)} tweets at {location}")
+        except Exception as e:
+            print(f"Error updating geocoding for tweets at {location}: {e}")
+
+    if gazetteer is not None:
+        print(f"Gazetteer: {gazetteer.stats()}")
+    if geocode_cache is not None:
+        print(f"Geocode cache: {geocode_cache.stats()}")
 
 # ---------------------------- Run All ----------------------------
 
 if __name__ == "__main__":
-    input_date = date.today().strftime("%Y-%m-%d")
-    print(f"Using today's date: {input_date}")
-    row_count, tweet_list = fetch_from_supabase(input_date)
-    
-    start = 1
-    end = start + 99
-    
-    # Handle case when row_count is small
-    if end > row_count:
-        end = row_count
-        
-    while start <= row_count:
-        if end > row_count:
-            end = row_count
-        print(f"Processing tweets from {start} to {end} of {row_count}...")
-        run_multiprocessing(start, end, tweet_list, batch_size=5)
-        start = end + 1
-        end = start + 99
-        time.sleep(30)  # Reduced sleep time
-    
-    enrich_location(input_date)
+    parser = argparse.ArgumentParser(description="Classify and geocode a day of Bluesky posts")
+    parser.add_argument("--date", default=date.today().strftime("%Y-%m-%d"), help="day to process (default: today)")
+    parser.add_argument("--resume", action="store_true", help="only classify tweets the job ledger has not finished")
+    parser.add_argument("--reprocess-outdated", action="store_true",
+                        help="also reclassify tweets done by another model, mode or prompt version")
+    args = parser.parse_args()
+
+    input_date = args.date
+    print(f"Using date: {input_date}")
+    print(f"Processing tweets from {input_date}...")
+    storage = get_storage()
+    classify_all(fetch_tweets(input_date, storage=storage), sink=lambda results: store_results(results, storage),
+                 run_date=input_date, resume=args.resume, reprocess_outdated=args.reprocess_outdated)
+
+    if llm_cache is not None:
+        print(f"LLM cache: {llm_cache.stats()}")
+    for model, stats in client.model_stats().items():
+        print(f"Model {model}: {stats}")
+    if prefilter is not None:
+        print(f"Prefilter skipped {prefilter.skipped} of {prefilter.checked} tweets")
+    if ledger is not None:
+        print(f"Job ledger for {input_date}: {ledger.counts(input_date)}")
+
+    enrich_location(input_date, storage)
+    storage.close()
     print("Database updated successfully!")
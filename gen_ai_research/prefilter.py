@@ -0,0 +1,177 @@
+"""Cheap local relevance classifier that runs before the genuine-disaster LLM call.
+
+Logistic regression over hashed word uni/bigrams and character 4-grams, trained
+with NumPy on the CrisisMMD humanitarian task in processed-data/ (every label
+except not_humanitarian counts as disaster-relevant). Posts the model is
+confident are not relevant skip the LLM.
+
+    python gen_ai_research/prefilter.py train    # writes PREFILTER_MODEL
+"""
+from __future__ import annotations
+import argparse
+import csv
+import os
+import re
+import zlib
+from typing import Iterable
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROCESSED_DATA_DIR = os.path.join(REPO_DIR, "processed-data")
+PREFILTER_MODEL = os.getenv(
+    "PREFILTER_MODEL", os.path.join(REPO_DIR, "gen_ai_research", "prefilter_model.npz")
+)
+# Skip the LLM when P(disaster-relevant) is below this
+PREFILTER_THRESHOLD = float(os.getenv("PREFILTER_THRESHOLD", "0.1"))
+# The model is trained on CrisisMMD's humanitarian label, not the pipeline's genuine-disaster one,
+# so the pipeline only filters when one of these is set explicitly
+PREFILTER_ENABLED = bool(os.getenv("PREFILTER_MODEL") or os.getenv("PREFILTER_THRESHOLD"))
+
+N_FEATURES = 2**18
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+NEGATIVE_LABEL = "not_humanitarian"
+
+
+def _grams(text: str) -> list[str]:
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    grams = [f"w {token}" for token in tokens]
+    grams += [f"b {a} {b}" for a, b in zip(tokens, tokens[1:])]
+    # Character 4-grams catch run-together hashtags ("hurricaneharvey") and word forms
+    for token in tokens:
+        padded = f"<{token}>"
+        grams += [f"c {padded[i:i + 4]}" for i in range(len(padded) - 3)]
+    return grams
+
+
+def hash_features(
+    texts: Iterable[str], n_features: int = N_FEATURES
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sparse (row ids, column ids, values) of L2-normalised binary hashed n-gram features."""
+    rows, columns, values = [], [], []
+    for row, text in enumerate(texts):
+        indices = {zlib.crc32(gram.encode("utf-8")) % n_features for gram in _grams(text or "")}
+        if not indices:
+            continue
+        rows.extend([row] * len(indices))
+        columns.extend(indices)
+        values.extend([1.0 / len(indices) ** 0.5] * len(indices))
+    return (
+        np.asarray(rows, dtype=np.int64),
+        np.asarray(columns, dtype=np.int64),
+        np.asarray(values, dtype=np.float32),
+    )
+
+
+class PrefilterModel:
+    def __init__(self, weights: np.ndarray, bias: float) -> None:
+        self.weights = weights
+        self.bias = bias
+
+    @property
+    def n_features(self) -> int:
+        return len(self.weights)
+
+    def predict_proba(self, texts: list[str]) -> np.ndarray:
+        rows, columns, values = hash_features(texts, self.n_features)
+        logits = np.bincount(rows, weights=values * self.weights[columns], minlength=len(texts))
+        return 1.0 / (1.0 + np.exp(-(logits + self.bias)))
+
+    @classmethod
+    def train(
+        cls,
+        texts: list[str],
+        labels: np.ndarray,
+        n_features: int = N_FEATURES,
+        epochs: int = 300,
+        learning_rate: float = 0.05,
+        l2: float = 1e-5,
+    ) -> PrefilterModel:
+        # Full-batch Adam on class-balanced log loss
+        rows, columns, values = hash_features(texts, n_features)
+        labels = np.asarray(labels, dtype=np.float64)
+        positive_rate = labels.mean()
+        sample_weights = np.where(labels == 1, 0.5 / positive_rate, 0.5 / (1 - positive_rate)) / len(labels)
+
+        weights = np.zeros(n_features)
+        bias = 0.0
+        moments = [np.zeros(n_features), np.zeros(n_features), 0.0, 0.0]
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        for step in range(1, epochs + 1):
+            logits = np.bincount(rows, weights=values * weights[columns], minlength=len(labels)) + bias
+            errors = (1.0 / (1.0 + np.exp(-logits)) - labels) * sample_weights
+            weight_grad = np.bincount(columns, weights=values * errors[rows], minlength=n_features) + l2 * weights
+            bias_grad = errors.sum()
+
+            moments[0] = beta1 * moments[0] + (1 - beta1) * weight_grad
+            moments[1] = beta2 * moments[1] + (1 - beta2) * weight_grad**2
+            moments[2] = beta1 * moments[2] + (1 - beta1) * bias_grad
+            moments[3] = beta2 * moments[3] + (1 - beta2) * bias_grad**2
+            correction1, correction2 = 1 - beta1**step, 1 - beta2**step
+            weights -= learning_rate * (moments[0] / correction1) / (np.sqrt(moments[1] / correction2) + eps)
+            bias -= learning_rate * (moments[2] / correction1) / ((moments[3] / correction2) ** 0.5 + eps)
+
+        return cls(weights.astype(np.float32), float(bias))
+
+    def save(self, path: str = PREFILTER_MODEL) -> None:
+        np.savez_compressed(path, weights=self.weights, bias=np.float32(self.bias))
+
+    @classmethod
+    def load(cls, path: str = PREFILTER_MODEL) -> PrefilterModel:
+        with np.load(path) as data:
+            return cls(data["weights"], float(data["bias"]))
+
+
+class Prefilter:
+    """Decides which posts can skip the LLM; counts what it skipped."""
+
+    def __init__(self, model: PrefilterModel, threshold: float = PREFILTER_THRESHOLD) -> None:
+        self.model = model
+        self.threshold = threshold
+        self.checked = 0
+        self.skipped = 0
+
+    def skip(self, text: str) -> bool:
+        skip = bool(self.model.predict_proba([text])[0] < self.threshold)
+        self.checked += 1
+        self.skipped += skip
+        return skip
+
+
+def load_prefilter(
+    path: str = PREFILTER_MODEL, threshold: float = PREFILTER_THRESHOLD, enabled: bool = PREFILTER_ENABLED
+) -> Prefilter | None:
+    # The trained prefilter, or None (every post goes to the LLM) if it is off or no model has been trained
+    if not enabled:
+        return None
+    if not os.path.exists(path):
+        print(f"No prefilter model at {path}; sending every tweet to the LLM.")
+        return None
+    return Prefilter(PrefilterModel.load(path), threshold)
+
+
+def load_split(split: str) -> tuple[list[str], np.ndarray]:
+    # (texts, 1 = disaster-relevant) for one CrisisMMD humanitarian split: train, dev or test
+    path = os.path.join(PROCESSED_DATA_DIR, f"cleaned_humanitarian_{split}.csv")
+    texts, labels = [], []
+    with open(path, newline="", encoding="utf-8") as data_file:
+        for row in csv.DictReader(data_file):
+            texts.append(row["tweet_text"])
+            labels.append(row["label_text"] != NEGATIVE_LABEL)
+    return texts, np.asarray(labels, dtype=np.int8)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Train the LLM prefilter on CrisisMMD.")
+    parser.add_argument("command", choices=["train"])
+    parser.add_argument("--output", default=PREFILTER_MODEL)
+    args = parser.parse_args(argv)
+
+    texts, labels = load_split("train")
+    model = PrefilterModel.train(texts, labels)
+    model.save(args.output)
+    print(f"Trained on {len(texts)} CrisisMMD tweets; model saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
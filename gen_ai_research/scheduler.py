@@ -0,0 +1,208 @@
+from __future__ import annotations
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Hashable, Iterable
+
+OLLAMA_INITIAL_IN_FLIGHT = int(os.getenv("OLLAMA_INITIAL_IN_FLIGHT", "4"))
+
+_DONE = object()
+
+
+class AIMDLimiter:
+    """Adaptive cap on concurrent requests: additive increase, multiplicative decrease.
+
+    Every success grows the limit by 1/limit (about +1 per round of requests).
+    An error, or a smoothed latency above `tolerance` times the best smoothed
+    latency seen so far (requests queueing on the server), multiplies it by
+    `decrease`, at most once per round. Latency is smoothed and compared per
+    `key` passed to `release` (the client uses model and task), so a slower
+    model or a longer prompt is not mistaken for congestion.
+    """
+
+    def __init__(
+        self,
+        initial: int = OLLAMA_INITIAL_IN_FLIGHT,
+        minimum: int = 1,
+        maximum: int = 64,
+        decrease: float = 0.5,
+        tolerance: float = 2.0,
+        smoothing: float = 0.2,
+    ) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self.successes = 0
+        self.errors = 0
+        self.decreases = 0
+        self.peak_limit = self.limit
+        self._latency: dict[Hashable, float] = {}
+        self._baseline: dict[Hashable, float] = {}
+        self._cooldown = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, ok: bool, key: Hashable = None) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self._cooldown = max(0, self._cooldown - 1)
+            if ok:
+                self.successes += 1
+                congested = self._observe(latency, key)
+            else:
+                self.errors += 1
+                congested = True
+            if congested:
+                self._back_off()
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self.peak_limit = max(self.peak_limit, self.limit)
+            self._condition.notify_all()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "peak_limit": int(self.peak_limit),
+            "successes": self.successes,
+            "errors": self.errors,
+            "decreases": self.decreases,
+        }
+
+    def _observe(self, latency: float, key: Hashable) -> bool:
+        # True if the smoothed latency of this kind of request shows requests queueing on the server
+        smoothed = self._latency.get(key)
+        smoothed = latency if smoothed is None else smoothed + self.smoothing * (latency - smoothed)
+        self._latency[key] = smoothed
+        if key not in self._baseline or smoothed < self._baseline[key]:
+            self._baseline[key] = smoothed
+        return smoothed > self.tolerance * self._baseline[key]
+
+    def _back_off(self) -> None:
+        if self._cooldown:
+            return  # already backed off for this round of requests
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        self.decreases += 1
+        self._cooldown = max(1, self.in_flight)
+        # Let the smoothed latencies recover toward their baselines before judging again
+        for key, smoothed in self._latency.items():
+            self._latency[key] = min(smoothed, self.tolerance * self._baseline[key])
+
+
+class WorkQueueStats:
+    def __init__(self) -> None:
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.batches = 0
+        self.started = time.monotonic()
+        self.finished: float | None = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def summary(self) -> str:
+        rate = self.completed / self.elapsed if self.elapsed else 0.0
+        return (
+            f"{self.completed} done, {self.failed} failed of {self.submitted} in "
+            f"{self.elapsed:.1f}s ({rate:.1f}/s), {self.batches} sink batches"
+        )
+
+
+def run_work_queue(
+    items: Iterable[Any],
+    work: Callable[[Any], Any],
+    sink: Callable[[list[Any]], None],
+    workers: int = 64,
+    batch_size: int = 50,
+    flush_interval: float = 2.0,
+) -> WorkQueueStats:
+    """Run `work` over `items` on `workers` threads and stream results to `sink`.
+
+    There are no chunk barriers: a worker takes the next item as soon as it
+    finishes one, so how many requests are really in flight is left to the
+    limiter inside the client. Items are read lazily through a bounded queue.
+    `sink(batch)` gets up to `batch_size` finished results at a time, at least
+    every `flush_interval` seconds. Items whose `work` raises are counted as
+    failed and skipped; None results are dropped. If reading `items` raises,
+    the items already read are still finished and sunk, then the error is
+    re-raised, so a partial run does not pass for a complete one.
+    """
+    stats = WorkQueueStats()
+    tasks: queue.Queue = queue.Queue(maxsize=workers * 2)
+    results: queue.Queue = queue.Queue()
+    source_errors: list[Exception] = []
+
+    def produce() -> None:
+        try:
+            for item in items:
+                tasks.put(item)
+                stats.submitted += 1
+        except Exception as e:
+            source_errors.append(e)
+        finally:
+            for _ in range(workers):
+                tasks.put(_DONE)
+
+    def consume() -> None:
+        while True:
+            item = tasks.get()
+            if item is _DONE:
+                results.put(_DONE)
+                return
+            try:
+                results.put(work(item))
+            except Exception as e:
+                print(f"Error processing item: {e}")
+                results.put(e)
+
+    threads = [threading.Thread(target=produce, daemon=True)]
+    threads += [threading.Thread(target=consume, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    batch: list[Any] = []
+    deadline = time.monotonic() + flush_interval
+    running = workers
+
+    def flush() -> None:
+        nonlocal batch, deadline
+        if batch:
+            sink(batch)
+            stats.batches += 1
+            batch = []
+        deadline = time.monotonic() + flush_interval
+
+    while running:
+        try:
+            result = results.get(timeout=max(0.01, deadline - time.monotonic()))
+        except queue.Empty:
+            flush()
+            continue
+        if result is _DONE:
+            running -= 1
+            continue
+        if isinstance(result, Exception):
+            stats.failed += 1
+            continue
+        stats.completed += 1
+        if result is not None:
+            batch.append(result)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    stats.finished = time.monotonic()
+    if source_errors:
+        print(f"Stopped reading items after {stats.submitted}: {source_errors[0]}")
+        raise source_errors[0]
+    return stats
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import re
+
+# Inflections and derivations a keyword may carry and still count as a whole-word
+# match: "hurricanes", "flooded", "rescuers", "evacu" -> "evacuation", "recover" -> "recovery".
+# Anything else glued to the end ("fire" in "firefox") is not a match.
+KEYWORD_SUFFIXES = (
+    "s", "es", "d", "ed", "ing", "er", "ers", "r", "rs", "y", "ies", "ly", "al",
+    "ion", "ions", "ation", "ations", "ate", "ated", "ates", "ee", "ees", "ment", "ments", "ous",
+)
+
+
+# Build a regex alternation factored into a character trie, so the regex engine
+# walks shared prefixes once instead of trying every keyword at every position
+def _trie_regex(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Optional tails are greedy, so the longest keyword at a position is tried first
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Matches several keyword lists against a text in a single compiled pass.
+
+    A keyword matches when it starts a word and either ends it or is followed by
+    one of KEYWORD_SUFFIXES. Inside hashtags any word prefix counts, so compound
+    tags like "#hurricaneharvey" still match "hurricane".
+    """
+
+    def __init__(self, keyword_groups):
+        self.groups = {name: list(keywords) for name, keywords in keyword_groups.items()}
+
+        # keyword -> [(group, index in that group's list)]
+        self._owners = {}
+        for name, keywords in self.groups.items():
+            for index, keyword in enumerate(keywords):
+                if keyword:
+                    self._owners.setdefault(keyword.lower(), []).append((name, index))
+
+        keywords = sorted(self._owners)
+        # Shorter keywords that start the longer one ("storm" for "storm surge")
+        self._prefixes = {
+            keyword: [other for other in keywords if other != keyword and keyword.startswith(other)]
+            for keyword in keywords
+        }
+
+        trie = _trie_regex(keywords) or "(?!)"
+        suffixes = f"(?:{_trie_regex(KEYWORD_SUFFIXES)})?"
+        self._end = re.compile(f"{suffixes}(?!\\w)")
+        self._pattern = re.compile(
+            f"(?<=#)(?=({trie}))"  # hashtag: prefix match
+            f"|(?<!\\w)(?=({trie}){suffixes}(?!\\w))"  # word start, whole word (+ suffix)
+        )
+
+    def match(self, text):
+        # Returns {group: [matched keywords]}, each list in its keyword-file order
+        found = {name: set() for name in self.groups}
+        text = text.lower()
+
+        for hit in self._pattern.finditer(text):
+            in_hashtag = hit.group(1) is not None
+            keyword = hit.group(1) if in_hashtag else hit.group(2)
+            start = hit.start()
+            for name, index in self._owners[keyword]:
+                found[name].add(index)
+            for shorter in self._prefixes[keyword]:
+                if in_hashtag or self._end.match(text, start + len(shorter)):
+                    for name, index in self._owners[shorter]:
+                        found[name].add(index)
+
+        return {
+            name: [self.groups[name][index] for index in sorted(indices)]
+            for name, indices in found.items()
+        }
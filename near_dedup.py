@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import os
+import zlib
+from collections import OrderedDict
+
+DEFAULT_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+DEFAULT_MAX_ITEMS = int(os.getenv("NEAR_DUPLICATE_WINDOW", "100000"))
+
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+# Pick LSH bands x rows (bands * rows == num_perm) whose S-curve midpoint is closest to the threshold
+def _lsh_shape(threshold, num_perm):
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        midpoint = (1 / bands) ** (1 / rows)
+        if best is None or abs(midpoint - threshold) < best[0]:
+            best = (abs(midpoint - threshold), bands, rows)
+    return best[1], best[2]
+
+
+class NearDuplicateDetector:
+    """Streaming near-duplicate detection with MinHash signatures and LSH banding.
+
+    Texts are compared by the Jaccard similarity of their character shingles.
+    `check(item_id, text)` returns the id of the earlier canonical item the text
+    duplicates (estimated similarity >= threshold), or None if the item is itself
+    canonical. Only the most recent `max_items` signatures are kept, so memory
+    stays bounded on an endless stream.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=64, shingle_size=5,
+                 max_items=DEFAULT_MAX_ITEMS, seed=8):
+        import numpy as np
+
+        self._np = np
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.max_items = max_items
+        self.bands, self.rows = _lsh_shape(threshold, num_perm)
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+        self._items = OrderedDict()  # item_id -> (signature, canonical_id, band_keys)
+        self._buckets = {}  # band key -> set of item ids
+        self.canonical = 0
+        self.duplicates = 0
+
+    def signature(self, text):
+        np = self._np
+        text = " ".join(text.split())
+        size = self.shingle_size
+        if len(text) <= size:
+            shingles = {text}
+        else:
+            shingles = {text[i:i + size] for i in range(len(text) - size + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8", "surrogatepass")) for s in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        # (a * x + b) mod p for every permutation and shingle, minimum per permutation
+        return ((np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME).min(axis=0).astype(np.uint32)
+
+    def check(self, item_id, text):
+        signature = self.signature(text)
+        # One small int per band keeps the index compact
+        band_bytes = signature.tobytes()
+        width = self.rows * 4
+        band_keys = tuple(
+            hash((band, band_bytes[band * width:(band + 1) * width])) for band in range(self.bands)
+        )
+
+        candidates = set()
+        for key in band_keys:
+            candidates.update(self._buckets.get(key, ()))
+        candidates.discard(item_id)  # an id seen again is not its own duplicate
+
+        best_id, best_similarity = None, self.threshold
+        for candidate in candidates:
+            candidate_signature, candidate_canonical, _ = self._items[candidate]
+            similarity = float((candidate_signature == signature).mean())
+            if similarity >= best_similarity:
+                best_id = candidate if candidate_canonical is None else candidate_canonical
+                best_similarity = similarity
+
+        self._remember(item_id, signature, best_id, band_keys)
+        if best_id is None:
+            self.canonical += 1
+        else:
+            self.duplicates += 1
+        return best_id
+
+    def _remember(self, item_id, signature, canonical_id, band_keys):
+        if item_id in self._items:
+            self._forget(item_id)
+        self._items[item_id] = (signature, canonical_id, band_keys)
+        for key in band_keys:
+            self._buckets.setdefault(key, set()).add(item_id)
+        while len(self._items) > self.max_items:
+            self._forget(next(iter(self._items)))
+
+    def _forget(self, item_id):
+        _, _, band_keys = self._items.pop(item_id)
+        for key in band_keys:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(item_id)
+                if not bucket:
+                    del self._buckets[key]
+
+
+# Batch form: canonical id (or None) for each (id, text), earliest timestamp first wins
+def find_near_duplicates(ids, texts, timestamps=None, detector=None):
+    detector = detector or NearDuplicateDetector()
+    order = range(len(ids))
+    if timestamps is not None:
+        order = sorted(order, key=lambda i: str(timestamps[i]))
+    result = [None] * len(ids)
+    for i in order:
+        if texts[i]:
+            result[i] = detector.check(ids[i], texts[i])
+    return result
+
+
+# Streaming form: set `duplicate_of` on each record: None for canonical posts, else the canonical tweet_id
+def mark_near_duplicates(records, detector=None, text_field="tweet_text"):
+    detector = detector or NearDuplicateDetector()
+    for record in records:
+        text = record.get(text_field)
+        record["duplicate_of"] = detector.check(record["tweet_id"], text) if text else None
+        yield record
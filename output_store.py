@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import glob
+import gzip
+import json
+import os
+import re
+from collections import OrderedDict
+from datetime import datetime
+
+# Record timestamps are "%Y-%m-%d %H:%M:%S"; the partition is read straight off the string
+PARTITION_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2})[ T](\d{2})")
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str).encode
+
+
+def _partition(timestamp):
+    # (date, hour) of a record timestamp; unparseable timestamps fall back to now
+    match = PARTITION_PATTERN.match(timestamp) if isinstance(timestamp, str) else None
+    if match:
+        return match.group(1), match.group(2)
+    moment = datetime.utcnow()
+    return moment.strftime("%Y-%m-%d"), moment.strftime("%H")
+
+
+def partition_path(root, dataset, date, hour, compress=False):
+    extension = ".ndjson.gz" if compress else ".ndjson"
+    return os.path.join(root, dataset, f"date={date}", f"hour={hour}", f"part{extension}")
+
+
+class PartitionedWriter:
+    """Append-only newline-delimited JSON, partitioned by date and hour.
+
+    Records go to <root>/<dataset>/date=YYYY-MM-DD/hour=HH/part.ndjson[.gz] as
+    they are written, so nothing accumulates in memory and earlier partitions are
+    never rewritten. Gzip output appends a new gzip member per session, which
+    gzip readers treat as one stream.
+    """
+
+    def __init__(self, root, dataset, compress=False, timestamp_field="timestamp", max_open=8):
+        self.root = root
+        self.dataset = dataset
+        self.compress = compress
+        self.timestamp_field = timestamp_field
+        self.max_open = max_open
+        self.records_written = 0
+        self._files = OrderedDict()  # path -> open file, least recently used first
+
+    def write(self, record):
+        date, hour = _partition(record.get(self.timestamp_field))
+        handle = self._handle(partition_path(self.root, self.dataset, date, hour, self.compress))
+        handle.write(_encode(record) + "\n")
+        self.records_written += 1
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+        self.flush()
+
+    def flush(self):
+        for handle in self._files.values():
+            handle.flush()
+
+    def close(self):
+        while self._files:
+            _, handle = self._files.popitem(last=False)
+            handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _handle(self, path):
+        handle = self._files.get(path)
+        if handle is not None:
+            self._files.move_to_end(path)
+            return handle
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.compress:
+            handle = gzip.open(path, "at", encoding="utf-8")
+        else:
+            handle = open(path, "a", encoding="utf-8")
+        self._files[path] = handle
+        while len(self._files) > self.max_open:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+        return handle
+
+
+def read_records(path):
+    # Stream records from one partition file (plain or gzip), one line at a time
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def partition_files(root, dataset, date="*", hour="*"):
+    # Partition files for a date (YYYY-MM-DD) and/or hour (HH), oldest first
+    pattern = os.path.join(root, dataset, f"date={date}", f"hour={hour}", "part.ndjson*")
+    return sorted(glob.glob(pattern))
+
+
+def read_partition(root, dataset, date, hour="*"):
+    for path in partition_files(root, dataset, date, hour):
+        yield from read_records(path)
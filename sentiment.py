@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", "100000"))
+DEFAULT_PROCESSES = int(os.getenv("SENTIMENT_PROCESSES", "0"))
+# Below this many uncached texts, starting worker processes costs more than it saves
+MIN_POOL_BATCH = 2000
+
+_analyzer = None
+
+
+def get_analyzer():
+    global _analyzer
+    if _analyzer is None:
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+        _analyzer = SentimentIntensityAnalyzer()
+    return _analyzer
+
+
+def _compound_score(text):
+    return get_analyzer().polarity_scores(text)["compound"]
+
+
+def text_key(text):
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+class SentimentScorer:
+    """VADER compound scores with an LRU cache keyed on a hash of the text.
+
+    With `processes` > 0, large batches of uncached texts are scored in a
+    process pool, since VADER is pure Python and CPU bound.
+    """
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, processes=DEFAULT_PROCESSES):
+        self.cache_size = cache_size
+        self.processes = processes
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def score(self, text):
+        return self.score_many([text])[0]
+
+    def score_many(self, texts):
+        keys = [text_key(text) for text in texts]
+        scores = [None] * len(texts)
+        pending = {}  # key -> (text, positions)
+
+        with self._lock:
+            for position, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[position] = self._cache[key]
+                    self.hits += 1
+                elif key in pending:
+                    pending[key][1].append(position)
+                    self.hits += 1  # identical text earlier in this batch
+                else:
+                    pending[key] = (texts[position], [position])
+                    self.misses += 1
+
+        if pending:
+            unique_texts = [text for text, _ in pending.values()]
+            for (key, (_, positions)), score in zip(pending.items(), self._compute(unique_texts)):
+                for position in positions:
+                    scores[position] = score
+                self._store(key, score)
+
+        return scores
+
+    def _compute(self, texts):
+        if self.processes and len(texts) >= MIN_POOL_BATCH:
+            from concurrent.futures import ProcessPoolExecutor
+
+            chunksize = max(1, len(texts) // (self.processes * 4))
+            with ProcessPoolExecutor(max_workers=self.processes) as executor:
+                return list(executor.map(_compound_score, texts, chunksize=chunksize))
+        return [_compound_score(text) for text in texts]
+
+    def _store(self, key, score):
+        with self._lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+_default_scorer = None
+
+
+def get_scorer():
+    global _default_scorer
+    if _default_scorer is None:
+        _default_scorer = SentimentScorer()
+    return _default_scorer
+
+
+# Fill in `sentiment_score` for already filtered and deduplicated records
+def add_sentiment(records, scorer=None):
+    scorer = scorer or get_scorer()
+    scores = scorer.score_many([record["tweet_text"] for record in records])
+    for record, score in zip(records, scores):
+        record["sentiment_score"] = score
+    return records
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""Where the pipeline tables live: Supabase, or a local SQLite file.
+
+Both backends offer the four operations the pipeline needs: bulk upsert,
+time-range scan, update of rows by tweet_id, and the query for results still
+waiting to be geocoded. STORAGE_BACKEND picks one ("supabase" by default,
+"sqlite" for STORAGE_FILE), so the whole pipeline can run, be load-tested and be
+profiled without a network hop.
+"""
+import abc
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from bulk_upsert import DEFAULT_CHUNK_SIZE, upsert_records
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+STORAGE_FILE = os.getenv(
+    "STORAGE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "state", "pipeline.sqlite")
+)
+# Rows per page of a time-range scan; Supabase caps a response at 1000 rows by default
+FETCH_PAGE_SIZE = int(os.getenv("FETCH_PAGE_SIZE", "1000"))
+# Tweet IDs per Supabase update; they travel in the request URL, so keep it well under its length limit
+SUPABASE_UPDATE_CHUNK = int(os.getenv("SUPABASE_UPDATE_CHUNK", "200"))
+
+POSTS_TABLE = "bluesky_api_data"
+RESULTS_TABLE = "multiprocessing_gen_ai_output"
+# Locations the classifier writes when a tweet names no place
+NO_LOCATION = ("None", "not specified")
+
+# Columns of the SQLite tables; columns a record brings that are not listed are added on first write
+SCHEMAS = {
+    POSTS_TABLE: {
+        "tweet_id": "TEXT PRIMARY KEY",
+        "timestamp": "TEXT",
+        "tweet_text": "TEXT",
+        "matched_disaster_keywords": "TEXT",
+        "matched_crisis_keywords": "TEXT",
+        "hashtags": "TEXT",
+        "post_url": "TEXT",
+        "sentiment_score": "REAL",
+        "duplicate_of": "TEXT",
+    },
+    RESULTS_TABLE: {
+        "tweet_id": "TEXT PRIMARY KEY",
+        "timestamp": "TEXT",
+        "tweet_text": "TEXT",
+        "genuine_disaster": "INTEGER",
+        "disaster_type": "TEXT",
+        "location": "TEXT",
+        "severity_score": "TEXT",
+        "latitude": "REAL",
+        "longitude": "REAL",
+    },
+}
+# tweet_id, the primary key, is indexed already
+INDEXES = (
+    f"CREATE INDEX IF NOT EXISTS posts_timestamp ON {POSTS_TABLE} (timestamp, tweet_id)",
+    f"CREATE INDEX IF NOT EXISTS results_timestamp ON {RESULTS_TABLE} (timestamp)",
+    # Partial index over the rows with latitude IS NULL: the pending-geocode query reads only these
+    f"CREATE INDEX IF NOT EXISTS results_pending_geocode ON {RESULTS_TABLE} (timestamp) WHERE latitude IS NULL",
+)
+
+
+# Timestamps as Supabase returns them ("2025-03-01T12:00:00+00:00") so they compare as strings;
+# naive times are UTC, and values that do not parse are kept as they are
+def normalize_timestamp(value):
+    if not isinstance(value, str):
+        return value
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).isoformat()
+
+
+class Storage(abc.ABC):
+    """What a backend provides. Rows are dicts; every table is keyed by tweet_id.
+
+    upsert(table, records, on_conflict, chunk_size) -> (rows_written, failed_records)
+    scan_page(table, start, end, after, columns, page_size) -> up to page_size rows with
+        start <= timestamp < end, in the backend's scan order, following `after`: the last
+        row of the previous page (None for the first page)
+    update(table, values, tweet_ids) -> rows asked to change; sets `values` on those rows
+    pending_geocodes(start, end) -> [{"tweet_id", "location"}] of results with a location but no latitude
+
+    A backend missing any of the four cannot be constructed.
+    """
+
+    @abc.abstractmethod
+    def upsert(self, table, records, on_conflict="tweet_id", chunk_size=DEFAULT_CHUNK_SIZE):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def scan_page(self, table, start, end, after=None, columns="*", page_size=FETCH_PAGE_SIZE):
+        raise NotImplementedError
+
+    # Every row with start <= timestamp < end, one page at a time (keyset pagination: `columns`
+    # must include tweet_id and timestamp). Reads until a page comes back empty: Supabase may
+    # return fewer rows than asked for even when more remain.
+    def scan(self, table, start, end, columns="*", page_size=FETCH_PAGE_SIZE):
+        after = None
+        while True:
+            rows = self.scan_page(table, start, end, after, columns, page_size)
+            if not rows:
+                return
+            after = rows[-1]
+            yield from rows
+
+    @abc.abstractmethod
+    def update(self, table, values, tweet_ids):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def pending_geocodes(self, start, end):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SupabaseStorage(Storage):
+    """The pipeline tables in Supabase, through a supabase-py client."""
+
+    def __init__(self, client, update_chunk=SUPABASE_UPDATE_CHUNK):
+        self.client = client
+        self.update_chunk = update_chunk
+
+    def upsert(self, table, records, on_conflict="tweet_id", chunk_size=DEFAULT_CHUNK_SIZE):
+        return upsert_records(self.client, table, records, on_conflict=on_conflict, chunk_size=chunk_size)
+
+    def scan_page(self, table, start, end, after=None, columns="*", page_size=FETCH_PAGE_SIZE):
+        query = self.client.table(table).select(columns).gte("timestamp", start).lt("timestamp", end)
+        if after is not None:
+            query = query.gt("tweet_id", after["tweet_id"])
+        return query.order("tweet_id").limit(page_size).execute().data
+
+    def update(self, table, values, tweet_ids):
+        tweet_ids = list(tweet_ids)
+        for start in range(0, len(tweet_ids), self.update_chunk):
+            self.client.table(table).update(values).in_("tweet_id", tweet_ids[start:start + self.update_chunk]).execute()
+        return len(tweet_ids)
+
+    # Paged like scan_page, since Supabase truncates a response at its row cap without saying so
+    def pending_geocodes(self, start, end, page_size=FETCH_PAGE_SIZE):
+        records, after = [], None
+        while True:
+            query = (
+                self.client.table(RESULTS_TABLE)
+                .select("tweet_id, location")
+                .gte("timestamp", start)
+                .lt("timestamp", end)
+                .is_("latitude", "null")
+            )
+            for location in NO_LOCATION:
+                query = query.neq("location", location)
+            if after is not None:
+                query = query.gt("tweet_id", after)
+            rows = query.order("tweet_id").limit(page_size).execute().data
+            if not rows:
+                return records
+            records.extend(rows)
+            after = rows[-1]["tweet_id"]
+
+
+class SQLiteStorage(Storage):
+    """The pipeline tables in one local SQLite file, with the indexes their queries need.
+
+    Timestamps are stored normalised (`normalize_timestamp`) and tweet IDs as
+    text, so scans and updates behave as they do against Supabase.
+    """
+
+    def __init__(self, path=STORAGE_FILE):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._columns = {}
+        for table, schema in SCHEMAS.items():
+            columns = ", ".join(f"{column} {kind}" for column, kind in schema.items())
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+            self._columns[table] = {row["name"] for row in self._db.execute(f"PRAGMA table_info({table})")}
+        for index in INDEXES:
+            self._db.execute(index)
+
+    def _add_columns(self, table, columns):
+        for column in sorted(set(columns) - self._columns[table]):
+            self._db.execute(f'ALTER TABLE {table} ADD COLUMN "{column}"')
+            self._columns[table].add(column)
+
+    # Insert or update (only the given columns) in one transaction per chunk. A chunk that fails
+    # is retried row by row, so one bad row only costs itself. Returns (rows_written, failed_records).
+    def upsert(self, table, records, on_conflict="tweet_id", chunk_size=DEFAULT_CHUNK_SIZE):
+        records = list({str(record.get(on_conflict)): record for record in records}.values())
+        written, failed = 0, []
+        with self._lock:
+            self._add_columns(table, {column for record in records for column in record})
+            for start in range(0, len(records), chunk_size):
+                chunk = records[start:start + chunk_size]
+                try:
+                    self._write(table, chunk, on_conflict)
+                    written += len(chunk)
+                except sqlite3.Error:
+                    for record in chunk:
+                        try:
+                            self._write(table, [record], on_conflict)
+                            written += 1
+                        except sqlite3.Error as e:
+                            print(f"Insert failed for record {record.get(on_conflict, 'Unknown')}: {e}")
+                            failed.append(record)
+        return written, failed
+
+    def _write(self, table, records, on_conflict):
+        groups = {}  # records with the same columns share one statement
+        for record in records:
+            groups.setdefault(tuple(record), []).append(record)
+        self._db.execute("BEGIN")
+        try:
+            for columns, group in groups.items():
+                names = ", ".join(f'"{column}"' for column in columns)
+                updates = ", ".join(f'"{column}" = excluded."{column}"' for column in columns if column != on_conflict)
+                action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+                self._db.executemany(
+                    f"INSERT INTO {table} ({names}) VALUES ({', '.join('?' * len(columns))}) "
+                    f"ON CONFLICT({on_conflict}) {action}",
+                    [[self._value(column, record[column]) for column in columns] for record in group],
+                )
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _value(column, value):
+        if column == "tweet_id":
+            return str(value)
+        if column == "timestamp":
+            return normalize_timestamp(value)
+        return value
+
+    # Pages follow the (timestamp, tweet_id) index, so each one is a range read rather than a sort of the day
+    def scan_page(self, table, start, end, after=None, columns="*", page_size=FETCH_PAGE_SIZE):
+        start = normalize_timestamp(start)
+        after = (start, "") if after is None else (after["timestamp"], str(after["tweet_id"]))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {columns} FROM {table} WHERE timestamp >= ? AND timestamp < ? "
+                f"AND (timestamp, tweet_id) > (?, ?) ORDER BY timestamp, tweet_id LIMIT ?",
+                (max(start, after[0]), normalize_timestamp(end), *after, page_size),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def update(self, table, values, tweet_ids):
+        tweet_ids = [str(tweet_id) for tweet_id in tweet_ids]
+        assignments = ", ".join(f'"{column}" = ?' for column in values)
+        updated = 0
+        with self._lock:
+            for start in range(0, len(tweet_ids), 500):
+                chunk = tweet_ids[start:start + 500]
+                updated += self._db.execute(
+                    f"UPDATE {table} SET {assignments} WHERE tweet_id IN ({','.join('?' * len(chunk))})",
+                    [*values.values(), *chunk],
+                ).rowcount
+        return updated
+
+    def pending_geocodes(self, start, end):
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT tweet_id, location FROM {RESULTS_TABLE} "
+                f"WHERE latitude IS NULL AND timestamp >= ? AND timestamp < ? "
+                f"AND location NOT IN ({','.join('?' * len(NO_LOCATION))})",
+                (normalize_timestamp(start), normalize_timestamp(end), *NO_LOCATION),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# The STORAGE_BACKEND storage; `get_client` makes the Supabase client and is only called for that backend
+def open_storage(get_client, backend=STORAGE_BACKEND, path=STORAGE_FILE):
+    if backend == "sqlite":
+        return SQLiteStorage(path)
+    if backend == "supabase":
+        return SupabaseStorage(get_client())
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
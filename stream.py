@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+import glob
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from output_store import read_records
+
+JETSTREAM_URL = "wss://jetstream2.us-east.bsky.network/subscribe?wantedCollections=app.bsky.feed.post"
+
+_DONE = object()
+
+
+class Checkpoint:
+    """Marker a source yields between items: `callback(stored)` runs once every item before it has been sunk.
+
+    `stored` is False if the sink failed to store one of the checkpoint's own
+    items, the ones between the previous checkpoint and this one.
+
+    Checkpoints bypass the stages but keep their place in the stream, so a
+    stage must yield each item's output before it reads the next item (all
+    the stages here do; one that batches internally would let a checkpoint
+    overtake the items it holds).
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+
+# ---------------------------- Sources ----------------------------
+# Every source yields post dicts shaped like searchPosts results
+# ({"uri", "author": {"handle"}, "record": {"text"}, "indexedAt"}), except
+# replay_source, which yields saved output records.
+
+def jetstream_post(event):
+    # Convert a Jetstream commit event into a search-result-shaped post, or None
+    commit = event.get("commit") or {}
+    if event.get("kind") != "commit" or commit.get("operation") != "create":
+        return None
+    if commit.get("collection") != "app.bsky.feed.post":
+        return None
+    record = commit.get("record") or {}
+    if not record.get("text"):
+        return None
+    indexed_at = datetime.fromtimestamp(event["time_us"] / 1e6, tz=timezone.utc)
+    return {
+        "uri": f"at://{event['did']}/app.bsky.feed.post/{commit['rkey']}",
+        "author": {"handle": event["did"]},  # Jetstream carries the DID, which bsky.app URLs accept
+        "record": {"text": record["text"]},
+        "indexedAt": indexed_at.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+    }
+
+
+def jetstream_source(url=JETSTREAM_URL, stop=None, reconnect_delay=5):
+    # Firehose of new posts over a Jetstream websocket; reconnects until `stop` is set
+    try:
+        import websocket
+    except ImportError:
+        raise RuntimeError("The jetstream source needs the websocket-client package") from None
+
+    cursor = None
+    while stop is None or not stop.is_set():
+        connect_url = f"{url}&cursor={cursor}" if cursor else url
+        try:
+            connection = websocket.create_connection(connect_url, timeout=30)
+            print(f"Connected to Jetstream: {url}")
+            try:
+                while stop is None or not stop.is_set():
+                    event = json.loads(connection.recv())
+                    cursor = event.get("time_us", cursor)  # resume point after a reconnect
+                    post = jetstream_post(event)
+                    if post is not None:
+                        yield post
+            finally:
+                connection.close()
+        except (OSError, websocket.WebSocketException, ValueError) as e:
+            print(f"Jetstream connection lost ({e}), reconnecting in {reconnect_delay}s")
+            time.sleep(reconnect_delay)
+
+
+def polling_source(search_fn, keywords, interval=60, stop=None, on_searched=None):
+    # Re-run the watermarked keyword search every `interval` seconds, yielding only new posts.
+    # After each keyword's search, on_searched(keyword) gives the callback of a Checkpoint that
+    # follows its posts (e.g. to save the keyword's watermark once they are stored), so the
+    # checkpoint's own items are exactly that search's posts.
+    while stop is None or not stop.is_set():
+        started = time.monotonic()
+        for keyword in keywords:
+            for post, _ in search_fn(keyword):
+                yield post
+            if on_searched is not None:
+                yield Checkpoint(on_searched(keyword))
+        remaining = interval - (time.monotonic() - started)
+        if remaining > 0:
+            if stop is not None:
+                stop.wait(remaining)
+            else:
+                time.sleep(remaining)
+
+
+def _saved_records(path):
+    if ".ndjson" in path:
+        # Partition files are streamed; each holds an hour of records in arrival order
+        return read_records(path)
+    with open(path, "r", encoding="utf-8") as json_file:
+        records = json.load(json_file)
+    return sorted(records, key=lambda r: r.get("timestamp", ""))
+
+
+def replay_source(pattern, speed=None):
+    # Replay saved bluesky_raw_data_*.json dumps or NDJSON output partitions;
+    # `speed` > 0 paces records by their timestamps
+    previous = None
+    for path in sorted(glob.glob(pattern)):
+        for record in _saved_records(path):
+            if speed:
+                try:
+                    current = datetime.strptime(record["timestamp"], "%Y-%m-%d %H:%M:%S")
+                    if previous is not None and current > previous:
+                        time.sleep((current - previous).total_seconds() / speed)
+                    previous = current
+                except (KeyError, ValueError):
+                    pass
+            yield dict(record)
+
+
+# ---------------------------- Pipeline ----------------------------
+
+class PipelineStats:
+    def __init__(self, names):
+        self.counts = {name: 0 for name in names}
+        self.max_depth = {name: 0 for name in names}
+        self.batches = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()  # every step's thread records into the same stats
+
+    def record(self, name, depth):
+        with self._lock:
+            self.counts[name] += 1
+            self.max_depth[name] = max(self.max_depth[name], depth)
+
+    def add_batch(self):
+        with self._lock:
+            self.batches += 1
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        with self._lock:
+            counts = ", ".join(f"{name}={count}" for name, count in self.counts.items())
+            batches = self.batches
+        return f"{counts}; {batches} sink batches in {elapsed:.1f}s"
+
+
+def _put(q, item, stop):
+    # Blocking put that gives up once the pipeline is stopping (a full queue is the backpressure)
+    while True:
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            if stop.is_set():
+                return False
+
+
+def _drain(q, stop, outbox=None):
+    # A Checkpoint is passed straight on to `outbox`: the stage is asking for its next item,
+    # so everything it made from the items before the checkpoint is already there
+    while True:
+        try:
+            item = q.get(timeout=0.5)
+        except queue.Empty:
+            if stop.is_set():
+                return
+            continue
+        if item is _DONE:
+            return
+        if isinstance(item, Checkpoint):
+            _put(outbox, item, stop)
+            continue
+        yield item
+
+
+def run_pipeline(source, stages, sink, queue_size=1000, batch_size=200, flush_interval=5.0, stop=None):
+    """Run source -> stages -> sink with one thread per step and bounded queues between them.
+
+    `stages` is a list of (name, fn) where fn takes an iterator of items and yields
+    items (a generator stage can filter, transform or batch internally). When a
+    queue fills up, the step feeding it blocks until the consumer catches up.
+    `sink(batch)` receives lists of up to `batch_size` items, at least every
+    `flush_interval` seconds while items are flowing, and may return the items
+    of the batch it failed to store. A Checkpoint from the source runs its
+    callback after the batch holding the items before it is sunk, with
+    stored=False if any of its own items is among the failed ones.
+    """
+    stop = stop or threading.Event()
+    names = ["source"] + [name for name, _ in stages]
+    stats = PipelineStats(names)
+    queues = [queue.Queue(maxsize=queue_size) for _ in names]
+    errors = []
+
+    def pump(name, items, outbox):
+        try:
+            for item in items:
+                if not isinstance(item, Checkpoint):
+                    stats.record(name, outbox.qsize())
+                if not _put(outbox, item, stop):
+                    break
+                if stop.is_set():
+                    break
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(outbox, _DONE, stop)
+
+    threads = [threading.Thread(target=pump, args=("source", source, queues[0]), daemon=True)]
+    for index, (name, fn) in enumerate(stages):
+        items = fn(_drain(queues[index], stop, queues[index + 1]))
+        threads.append(threading.Thread(target=pump, args=(name, items, queues[index + 1]), daemon=True))
+    for thread in threads:
+        thread.start()
+
+    batch = []
+    checkpoints = []  # (items before it in `batch`, checkpoint); their items are in `batch` or already sunk
+    unstored = False  # an item since the last checkpoint that ran failed to store
+    deadline = time.monotonic() + flush_interval
+
+    def flush():
+        nonlocal batch, deadline, unstored
+        failed = set()
+        if batch:
+            failed = {id(item) for item in sink(batch) or ()}
+            stats.add_batch()
+        start = 0
+        for position, checkpoint in checkpoints:
+            unstored = unstored or any(id(item) in failed for item in batch[start:position])
+            checkpoint.callback(not unstored)
+            unstored, start = False, position
+        unstored = unstored or any(id(item) in failed for item in batch[start:])
+        checkpoints.clear()
+        batch = []
+        deadline = time.monotonic() + flush_interval
+
+    try:
+        while True:
+            try:
+                item = queues[-1].get(timeout=max(0.01, deadline - time.monotonic()))
+            except queue.Empty:
+                flush()
+                if stop.is_set() and not any(thread.is_alive() for thread in threads):
+                    break
+                continue
+            if item is _DONE:
+                break
+            if isinstance(item, Checkpoint):
+                checkpoints.append((len(batch), item))
+                continue
+            batch.append(item)
+            if len(batch) >= batch_size:
+                flush()
+    except KeyboardInterrupt:
+        print("Stopping pipeline...")
+    finally:
+        stop.set()
+        flush()
+
+    if errors:
+        raise errors[0]
+    return stats
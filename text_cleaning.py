@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import re
+
+URL_PATTERN = re.compile(r"http\S+|www\S+|https\S+", flags=re.MULTILINE)
+MENTION_PATTERN = re.compile(r'@\w+')
+HASHTAG_PATTERN = re.compile(r'#\w+')
+SPECIAL_CHAR_PATTERN = re.compile(r'[^\w\s]')
+
+# Mentions, hashtags and special characters removed in one pass. Equivalent to
+# running the three patterns above in order: a removed "@name"/"#tag" always ends
+# before a non-word character, so no removal can create a new match. URLs stay a
+# separate first pass because "@http..." or "x@www..." would otherwise be read as mentions.
+MARKUP_PATTERN = re.compile(r'[@#]\w+|[^\w\s]')
+
+
+# Function to check if the string contains only English characters
+def isEnglish(s):
+    try:
+        s.encode(encoding='utf-8').decode('ascii')
+    except UnicodeDecodeError:
+        return False
+    else:
+        return True
+
+# Function to clean tweet text
+def clean_text(text):
+    try:
+        # First, check if the text is English using the isEnglish function
+        if not isEnglish(text):
+            # If it's not English, remove non-English characters
+            text = ''.join([char for char in text if char.isascii()])  # Remove non-ASCII characters
+
+        # Convert emojis to text
+        import emoji
+        text = emoji.demojize(text, delimiters=("", " "))
+
+        # Remove URLs, mentions, and special characters
+        text = URL_PATTERN.sub('', text)  # URLs
+        text = MENTION_PATTERN.sub('', text)  # Mentions
+        text = HASHTAG_PATTERN.sub('', text)  # Hashtags
+        text = SPECIAL_CHAR_PATTERN.sub('', text)  # Special characters
+
+        # Standardize text: Lowercase, strip whitespace
+        text = text.lower().strip()
+
+        return text if text else None
+    except Exception as e:
+        print(f"Error cleaning text: {e}")
+        return None
+
+
+# Make a text ASCII-only the way clean_text does, or return None where clean_text would fail
+def _to_ascii(text):
+    if not isinstance(text, str):
+        return None
+    if text.isascii():
+        return text
+    try:
+        text.encode('utf-8')  # lone surrogates make clean_text fail
+    except UnicodeEncodeError as e:
+        print(f"Error cleaning text: {e}")
+        return None
+    # Every emoji is non-ASCII, so once the text is ASCII there is nothing left for
+    # emoji.demojize to convert: skipping it here is the emoji fast path.
+    return text.encode('ascii', 'ignore').decode('ascii')
+
+
+# Batch version of clean_text with identical output
+def clean_texts(texts):
+    url_sub = URL_PATTERN.sub
+    markup_sub = MARKUP_PATTERN.sub
+    cleaned = []
+    for text in texts:
+        text = _to_ascii(text)
+        if text is not None:
+            text = markup_sub('', url_sub('', text)).lower().strip() or None
+        cleaned.append(text)
+    return cleaned
+
+
+# pandas version of clean_text: vectorized string ops over a Series, same output
+def clean_series(series):
+    import pandas as pd
+
+    text = series.map(_to_ascii)
+    valid = text.notna()
+    cleaned = (
+        text[valid].astype(str)
+        .str.replace(URL_PATTERN, '', regex=True)
+        .str.replace(MARKUP_PATTERN, '', regex=True)
+        .str.lower()
+        .str.strip()
+    )
+    result = pd.Series(None, index=series.index, dtype=object)
+    result[valid] = cleaned.where(cleaned != '', None)
+    return result
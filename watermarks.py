@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import threading
+from datetime import datetime
+
+TIMESTAMP_FORMATS = ("%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%SZ")
+
+
+# Parse a Bluesky `indexedAt` value; returns None when the format is unknown
+def parse_indexed_at(raw_timestamp):
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(raw_timestamp, fmt)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class WatermarkStore:
+    """Per-keyword high-water marks (newest `indexedAt` seen), persisted as JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._marks = {}
+        try:
+            with open(path, "r", encoding="utf-8") as state_file:
+                for keyword, raw_timestamp in json.load(state_file).items():
+                    timestamp = parse_indexed_at(raw_timestamp)
+                    if timestamp is not None:
+                        self._marks[keyword] = timestamp
+        except FileNotFoundError:
+            pass
+        except (ValueError, AttributeError) as e:
+            print(f"Ignoring unreadable watermark file {path}: {e}")
+
+    def get(self, keyword):
+        with self._lock:
+            return self._marks.get(keyword)
+
+    def update(self, keyword, timestamp):
+        # Watermarks only ever move forward
+        with self._lock:
+            current = self._marks.get(keyword)
+            if current is None or timestamp > current:
+                self._marks[keyword] = timestamp
+
+    def save(self):
+        with self._lock:
+            state = {
+                keyword: timestamp.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+                for keyword, timestamp in sorted(self._marks.items())
+            }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write-then-rename so a crash never leaves a half-written state file
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as state_file:
+            json.dump(state, state_file, indent=2)
+        os.replace(tmp_path, self.path)